@@ -1,134 +1,57 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import random
+import numpy as np
+import plotly.graph_objects as go
+import datetime
+import dataclasses
+import functools
+import hashlib
+import secrets
+import time
 
-def generate_synthetic_control_data(num_records):
-    """
-    Generates synthetic control data for simulation purposes.
-
-    Args:
-        num_records (int): Number of records to generate.
-
-    Returns:
-        pd.DataFrame: A DataFrame containing synthetic control data.
-    """
-    control_types = ["Preventative", "Detective"]
-    key_nonkey_options = ["Key", "Non-Key"]
-    manual_automated_options = ["Manual", "Automated"]
-    risk_level_options = ["High", "Medium", "Low"]
-    implementation_quality_ratings = [1, 2, 3, 4, 5]
-
-    data = {
-        "Control Type": [random.choice(control_types) for _ in range(num_records)],
-        "Key/Non-Key": [random.choice(key_nonkey_options) for _ in range(num_records)],
-        "Manual/Automated": [random.choice(manual_automated_options) for _ in range(num_records)],
-        "Risk Level": [random.choice(risk_level_options) for _ in range(num_records)],
-        "Implementation Quality Rating": [random.choice(implementation_quality_ratings) for _ in range(num_records)],
-        "Implementation Frequency": [random.randint(1, 5) for _ in range(num_records)],
-        "Design Quality Rating": [random.randint(1, 5) for _ in range(num_records)],
-        "Control ID": [f'CTRL_{i:03d}' for i in range(1, num_records + 1)]
-    }
+from application_pages.scoring import (
+    SUBSTANTIATION_EFFORT,
+    SUBSTANTIATION_METHODS,
+    current_weights,
+    score_controls,
+    suggest_substantiation_methods,
+)
+from application_pages.control_data import (
+    DEFAULT_CHUNK_SIZE,
+    EXPECTED_VALUES,
+    FILE_EXTENSIONS,
+    FILE_MIME_TYPES,
+    ControlEditSession,
+    ControlTableIndex,
+    detect_file_format,
+    generate_synthetic_control_data,
+    ingest_control_chunks,
+    iter_control_chunks,
+    read_control_file,
+    summarize_controls,
+    summarize_testing_effort,
+    validate_controls,
+    write_control_file,
+)
+from application_pages.assessment_store import open_store
+from application_pages.evaluation import REDESIGN_SCORE, STRONG_DESIGN_SCORE, scale_score
+from application_pages.audit_plan import NOT_TESTED, plan_testing
+from application_pages.jobs import FINAL_STATES, JOB_CANCELLED, JOB_DONE, JOB_FAILED, JobRunner, analyze_control_file
+from application_pages.parallel_scoring import default_workers, ingest_control_chunks_parallel, score_controls_parallel
+from application_pages.simulation import (
+    INTERVENTIONS,
+    SIMULATION_METRICS,
+    apply_shifts,
+    portfolio_distribution,
+    simulate_portfolios,
+)
+from application_pages.performance import start_performance_recording, track_cache_misses
 
-    return pd.DataFrame(data)
-
-def validate_uploaded_data(df):
-    """
-    Validates the uploaded dataset for required columns and data types.
-    
-    Args:
-        df (pd.DataFrame): The uploaded dataframe to validate
-    
-    Returns:
-        tuple: (is_valid, error_messages, df_processed)
-    """
-    if df is None or df.empty:
-        return False, ["Dataset is empty"], None
-    
-    # Required columns and their expected data types
-    required_columns = {
-        'Control Type': 'categorical',
-        'Key/Non-Key': 'categorical', 
-        'Manual/Automated': 'categorical',
-        'Risk Level': 'categorical',
-        'Implementation Quality Rating': 'numeric',
-        'Implementation Frequency': 'numeric',
-        'Design Quality Rating': 'numeric',
-        'Control ID': 'string'
-    }
-    
-    # Expected values for categorical columns
-    expected_values = {
-        'Control Type': ['Preventative', 'Detective'],
-        'Key/Non-Key': ['Key', 'Non-Key'],
-        'Manual/Automated': ['Manual', 'Automated'],
-        'Risk Level': ['High', 'Medium', 'Low']
-    }
-    
-    error_messages = []
-    df_processed = df.copy()
-    
-    # Check for missing required columns
-    missing_columns = [col for col in required_columns.keys() if col not in df.columns]
-    if missing_columns:
-        error_messages.append(f"Missing required columns: {', '.join(missing_columns)}")
-        return False, error_messages, None
-    
-    # Validate each column
-    for col, data_type in required_columns.items():
-        if col not in df.columns:
-            continue
-            
-        # Check for null values
-        null_count = df[col].isnull().sum()
-        if null_count > 0:
-            error_messages.append(f"Column '{col}' contains {null_count} null values")
-        
-        # Validate data types and values
-        if data_type == 'numeric':
-            # Try to convert to numeric
-            try:
-                df_processed[col] = pd.to_numeric(df[col], errors='coerce')
-                if df_processed[col].isnull().any():
-                    invalid_count = df_processed[col].isnull().sum() - null_count
-                    if invalid_count > 0:
-                        error_messages.append(f"Column '{col}' contains {invalid_count} non-numeric values")
-                
-                # Check range for rating columns
-                if 'Rating' in col or 'Frequency' in col:
-                    valid_range = df_processed[col].between(1, 5, inclusive='both')
-                    if not valid_range.all():
-                        invalid_range_count = (~valid_range).sum()
-                        error_messages.append(f"Column '{col}' contains {invalid_range_count} values outside range 1-5")
-            except:
-                error_messages.append(f"Column '{col}' cannot be converted to numeric")
-        
-        elif data_type == 'categorical':
-            # Check if values are in expected categories
-            if col in expected_values:
-                invalid_values = df[col][~df[col].isin(expected_values[col])].unique()
-                if len(invalid_values) > 0:
-                    error_messages.append(f"Column '{col}' contains invalid values: {list(invalid_values)}. Expected: {expected_values[col]}")
-        
-        elif data_type == 'string':
-            # Check for duplicate Control_IDs
-            if col == 'Control ID':
-                duplicate_count = df[col].duplicated().sum()
-                if duplicate_count > 0:
-                    error_messages.append(f"Column '{col}' contains {duplicate_count} duplicate values")
-    
-    # Additional business logic validations
-    if len(error_messages) == 0:
-        # Check minimum number of records
-        if len(df) < 5:
-            error_messages.append("Dataset must contain at least 5 records")
-        
-        # Check maximum number of records for performance
-        if len(df) > 10000:
-            error_messages.append("Dataset contains too many records (max 10,000). Please reduce dataset size.")
-    
-    is_valid = len(error_messages) == 0
-    return is_valid, error_messages, df_processed if is_valid else None
+# Chart colours shared by the dashboard figures
+CONTROL_TYPE_COLORS = {'Preventative': '#2E8B57', 'Detective': '#4682B4'}
+RISK_LEVEL_COLORS = {'High': '#DC143C', 'Medium': '#FF8C00', 'Low': '#32CD32'}
+AUTOMATION_COLORS = {'Automated': '#4CAF50', 'Manual': '#FF9800'}
+KEY_NONKEY_COLORS = {'Key': '#E91E63', 'Non-Key': '#9C27B0'}
+EFFORT_COLORS = {'High': '#DC143C', 'Medium': '#FF8C00', 'Low': '#32CD32'}
 
 def display_sample_template():
     """Display a sample template for users to understand the required format."""
@@ -157,77 +80,939 @@ def display_sample_template():
     | `Control ID` | Text | Unique values | Control identifier |
     
     **Important Notes:**
-    - File format: CSV (.csv)
-    - Minimum 5 records, maximum 10,000 records
+    - File format: CSV (.csv), Parquet (.parquet) or Arrow IPC (.arrow, .feather)
+    - Minimum 5 records; use streaming mode for files with millions of records
     - No missing values allowed
     - Control ID values must be unique
     - All numeric values must be between 1-5
     - Use exact column names as shown above (including spaces and special characters)
     """)
 
-def calculate_control_quality_score(control_type, key_nonkey, manual_automated, implementation_quality_rating):
-    """Calculates the Control Quality Score based on control attributes and implementation quality."""
-
-    if control_type not in ("Preventative", "Detective"):
-        raise ValueError("Invalid control type")
-    if key_nonkey not in ("Key", "Non-Key"):
-        raise ValueError("Invalid key/non-key type")
-    if manual_automated not in ("Manual", "Automated"):
-        raise ValueError("Invalid manual/automated type")
-    if not isinstance(implementation_quality_rating, (int, float)) or not (1 <= implementation_quality_rating <= 5):
-        raise ValueError("Implementation quality rating must be an integer or float between 1 and 5.")
-
-    score = 0
-
-    if control_type == "Preventative":
-        score += 5
-    elif control_type == "Detective":
-        score += 2
-
-    if key_nonkey == "Key":
-        score += 3
-    elif key_nonkey == "Non-Key":
-        score += 1
-
-    if manual_automated == "Automated":
-        score += 2
-    elif manual_automated == "Manual":
-        score += 1
-
-    score += implementation_quality_rating - 1
-    return score
-
-def suggest_substantiation_method(control_type, key_nonkey, manual_automated, risk_level):
-    """Suggests substantiation method based on control attributes and risk level."""
-
-    valid_control_types = ["Preventative", "Detective"]
-    valid_key_nonkey = ["Key", "Non-Key"]
-    valid_manual_automated = ["Manual", "Automated"]
-    valid_risk_levels = ["High", "Medium", "Low"]
-
-    if control_type not in valid_control_types:
-        raise ValueError(f"Invalid control type: {control_type}. Must be one of {valid_control_types}")
-    if key_nonkey not in valid_key_nonkey:
-        raise ValueError(f"Invalid key_nonkey: {key_nonkey}. Must be one of {valid_key_nonkey}")
-    if manual_automated not in valid_manual_automated:
-        raise ValueError(f"Invalid manual_automated: {manual_automated}. Must be one of {valid_manual_automated}")
-    if risk_level not in valid_risk_levels:
-        raise ValueError(f"Invalid risk_level: {risk_level}. Must be one of {valid_risk_levels}")
-
-    if control_type == "Preventative" and key_nonkey == "Key" and manual_automated == "Manual" and risk_level == "High":
-        return "Re-performance"
-    elif control_type == "Detective" and key_nonkey == "Non-Key" and manual_automated == "Automated" and risk_level == "Medium":
-        return "Examination"
-    elif control_type == "Preventative" and key_nonkey == "Key" and manual_automated == "Manual" and risk_level == "Low":
-        return "Inquiry"
-    elif control_type == "Detective" and key_nonkey == "Non-Key" and manual_automated == "Automated" and risk_level == "High":
-        return "Re-performance / Examination"
-    elif control_type == "Preventative" and key_nonkey == "Key" and manual_automated == "Manual" and risk_level == "Medium":
-        return "Examination"
+def display_validation_report(report, df, page_size=10):
+    """Displays per-rule issue counts and pages through the offending rows of one rule."""
+    issues_with_rows = [issue for issue in report.issues if issue.rows]
+    if not issues_with_rows:
+        return
+
+    st.markdown("### Offending Rows")
+    st.dataframe(report.to_frame().drop(columns="Example Rows"), hide_index=True, use_container_width=True)
+
+    labels = [f"{issue.rule} — {issue.column} ({issue.count:,} rows)" for issue in issues_with_rows]
+    selected = st.selectbox("Inspect rule", options=range(len(labels)), format_func=labels.__getitem__)
+    rows = issues_with_rows[selected].rows
+    num_pages = (len(rows) - 1) // page_size + 1
+    page = st.number_input("Page", min_value=1, max_value=num_pages, value=1, step=1)
+    st.dataframe(df.loc[rows[(page - 1) * page_size:page * page_size]], use_container_width=True)
+    st.caption(f"Page {page} of {num_pages}; showing up to the first {len(rows)} of "
+               f"{issues_with_rows[selected].count:,} offending rows")
+
+def display_table_filters(score_bounds):
+    """
+    Displays the filters shared by the table views.
+
+    Args:
+        score_bounds (tuple): Lowest and highest Control Quality Score in the data.
+
+    Returns:
+        dict: control_types, risk_levels, score_range and id_prefix query arguments; the
+            score range is None while it spans all scores.
+    """
+    col1, col2 = st.columns(2)
+    with col1:
+        control_types = st.multiselect("Control Type", EXPECTED_VALUES['Control Type'],
+                                       default=EXPECTED_VALUES['Control Type'])
+        risk_levels = st.multiselect("Risk Level", EXPECTED_VALUES['Risk Level'],
+                                     default=EXPECTED_VALUES['Risk Level'])
+    with col2:
+        low, high = score_bounds
+        score_range = st.slider("Control Quality Score", min_value=low, max_value=high,
+                                value=(low, high)) if low < high else None
+        id_prefix = st.text_input("Control ID starts with", placeholder="e.g. CTRL_01")
+    return {
+        "control_types": control_types,
+        "risk_levels": risk_levels,
+        "score_range": None if score_range == (low, high) else score_range,
+        "id_prefix": id_prefix.strip(),
+    }
+
+def display_page_selector(total, page_sizes=(25, 50, 100, 250)):
+    """Displays the page and page size inputs of a table view and returns (page, page_size)."""
+    col1, col2 = st.columns(2)
+    with col2:
+        page_size = st.selectbox("Rows per page", options=page_sizes, index=1)
+    with col1:
+        page = st.number_input("Page", min_value=1, max_value=(total - 1) // page_size + 1, value=1, step=1)
+    return page, page_size
+
+def display_control_table(index):
+    """
+    Displays one page of a scored dataset with server-side filters and sorting.
+
+    Only the rows of the current page are sent to the browser; filtering and sorting run
+    against the ControlTableIndex.
+
+    Args:
+        index (ControlTableIndex): Index over the scored dataset.
+    """
+    filters = display_table_filters(index.score_bounds)
+    col1, col2 = st.columns(2)
+    with col1:
+        sort_by = st.selectbox("Sort by", options=[None, *index.df.columns],
+                               format_func=lambda col: "Dataset order" if col is None else col)
+    with col2:
+        descending = st.toggle("Descending", value=False, disabled=sort_by is None)
+
+    positions = index.query(**filters, sort_by=sort_by, descending=descending)
+    if len(positions) == 0:
+        st.info("No controls match the selected filters")
+        return
+
+    page, page_size = display_page_selector(len(positions))
+    num_pages = (len(positions) - 1) // page_size + 1
+    st.dataframe(index.page(positions, page, page_size), use_container_width=True)
+    st.caption(f"Page {page} of {num_pages:,}; {len(positions):,} of {len(index):,} controls match")
+
+def display_stored_table(store, portfolio_id, num_controls):
+    """
+    Displays one page of a stored portfolio, filtered and paged by SQL queries.
+
+    Args:
+        store (AssessmentStore): The assessment store.
+        portfolio_id (int): The portfolio to show.
+        num_controls (int): Size of the portfolio.
+    """
+    filters = display_table_filters(store.score_bounds(portfolio_id))
+    total = store.count_controls(portfolio_id, **filters)
+    if total == 0:
+        st.info("No controls match the selected filters")
+        return
+
+    page, page_size = display_page_selector(total)
+    num_pages = (total - 1) // page_size + 1
+    page_df = store.query_portfolio(portfolio_id, **filters, limit=page_size, offset=(page - 1) * page_size)
+    st.dataframe(page_df, hide_index=True, use_container_width=True)
+    st.caption(f"Page {page} of {num_pages:,}; {total:,} of {num_controls:,} controls match, ordered by Control ID")
+
+def display_save_portfolio(df, default_name):
+    """Displays the inputs that save a scored dataset to the assessment store."""
+    col1, col2 = st.columns(2)
+    with col1:
+        name = st.text_input("Portfolio name", value=default_name)
+    with col2:
+        assessment_date = st.date_input("Assessment date")
+    if st.button("Save to Assessment Store", disabled=not name.strip()):
+        try:
+            with st.spinner(f"Saving {len(df):,} controls..."):
+                open_store().save_portfolio(df, name.strip(), assessment_date)
+        except ValueError as e:
+            st.error(f"Could not save the portfolio: {e}")
+        else:
+            st.success(f"Saved {len(df):,} controls as '{name.strip()}' ({assessment_date:%Y-%m-%d}); "
+                       f"save later assessments under the same name to follow their trend")
+
+# Session state key of the background job shown on the page
+BACKGROUND_JOB_KEY = "background_job"
+# URL query parameters that let a refreshed page find its background job again
+JOB_QUERY_PARAM = "job"
+JOB_OWNER_QUERY_PARAM = "job_owner"
+
+@st.cache_resource(show_spinner=False)
+def get_job_runner():
+    """The process-wide JobRunner; its jobs outlive script runs."""
+    return JobRunner()
+
+def job_owner():
+    """
+    Identifies this browser tab to the JobRunner, so it only finds its own jobs.
+
+    The owner is a random token kept in the page URL: refreshing the page keeps it, and
+    other sessions cannot guess it.
+    """
+    owner = st.query_params.get(JOB_OWNER_QUERY_PARAM)
+    if not owner:
+        owner = st.query_params[JOB_OWNER_QUERY_PARAM] = secrets.token_urlsafe(16)
+    return owner
+
+def forget_background_job():
+    """Drops the page's background job from the session, the URL and the JobRunner."""
+    job = st.session_state.pop(BACKGROUND_JOB_KEY, None)
+    if job is not None:
+        get_job_runner().discard(job.job_id, job_owner())
+    st.query_params.pop(JOB_QUERY_PARAM, None)
+
+@st.fragment(run_every=1.0)
+def display_job_progress(job_id):
+    """
+    Shows the progress and partial summary of a running job, refreshed every second.
+
+    Reruns the whole page once the job has finished, so its results replace this view.
+    """
+    job = get_job_runner().get(job_id, job_owner())
+    if job is None or job.finished:
+        st.rerun()
+
+    label = f"{job.name}: {job.status}, {job.rows_scored:,} records scored"
+    if job.total_rows:
+        label += f" of about {job.total_rows:,}"
+    st.progress(job.progress or 0.0, text=label)
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Rows Parsed", f"{job.rows_parsed:,}")
+    col2.metric("Rows Validated and Scored", f"{job.rows_scored:,}")
+    col3.metric("Elapsed", f"{job.elapsed_seconds:,.0f}s")
+    partial = job.partial
+    if partial is not None and partial.total:
+        st.caption(f"So far: {partial.total:,} controls, average quality score {partial.mean_score:.2f}, "
+                   f"{partial.percentage('Risk Level', 'High'):.1f}% high risk")
+    st.button("Cancel", on_click=job.cancel, key=f"cancel_job:{job_id}")
+
+def display_background_job(uploaded_file, upload_format, workers):
+    """
+    Starts or reattaches to the background analysis of an uploaded file and shows its state.
+
+    The job runs outside the script run, so it keeps going while the session uses the
+    rest of the app. Its ID and owner token are kept in the page URL, so a refreshed page
+    reattaches to it. The runner holds a finished job until it is dismissed or replaced
+    by the next one.
+
+    Args:
+        uploaded_file (UploadedFile or None): The uploaded file, if any.
+        upload_format (str): Format of the uploaded file.
+        workers (int): Worker processes for validation and scoring.
+
+    Returns:
+        Job: The job once it finished with a valid dataset, otherwise None.
+    """
+    runner = get_job_runner()
+    job = st.session_state.get(BACKGROUND_JOB_KEY)
+    if job is None and JOB_QUERY_PARAM in st.query_params:
+        job = runner.get(st.query_params[JOB_QUERY_PARAM], job_owner())
+        if job is None:
+            st.query_params.pop(JOB_QUERY_PARAM)
+        else:
+            st.session_state[BACKGROUND_JOB_KEY] = job
+    if uploaded_file is not None:
+        fingerprint = scoring_fingerprint(f"upload:{hashlib.blake2b(uploaded_file.getvalue(), digest_size=16).hexdigest()}")
+        if job is None or job.key != fingerprint:
+            if not st.button("Start Background Analysis", type="primary"):
+                return None
+            forget_background_job()
+            job = runner.submit(uploaded_file.name, fingerprint, analyze_control_file, uploaded_file.getvalue(),
+                                upload_format, DEFAULT_CHUNK_SIZE, workers, owner=job_owner())
+            st.session_state[BACKGROUND_JOB_KEY] = job
+            st.query_params[JOB_QUERY_PARAM] = job.job_id
+    if job is None:
+        st.info("Upload a file to analyze it in the background")
+        return None
+
+    if job.status not in FINAL_STATES:
+        display_job_progress(job.job_id)
+        return None
+    if job.status == JOB_CANCELLED:
+        st.warning(f"The analysis of {job.name} was cancelled after {job.rows_scored:,} records")
+    elif job.status == JOB_FAILED:
+        st.error(f"Error reading file: {job.error}")
+    elif not job.result.is_valid:
+        st.error("Dataset validation failed. Please fix the following issues:")
+        for i, error in enumerate(job.result.errors, 1):
+            st.error(f"{i}. {error}")
+    if job.status != JOB_DONE or not job.result.is_valid:
+        if st.button("Dismiss"):
+            forget_background_job()
+            st.rerun()
+        return None
+    return job
+
+def get_edit_session(fingerprint, df, aggregates):
+    """
+    Returns the session's ControlEditSession of a dataset, starting one if needed.
+
+    Only the edit session of the current dataset is kept; loading another dataset
+    discards the edits of the previous one.
+    """
+    current = st.session_state.get('control_edits')
+    if current is None or current[0] != fingerprint:
+        current = (fingerprint, ControlEditSession(df, aggregates))
+        st.session_state['control_edits'] = current
+        st.session_state.pop('control_edit_errors', None)
+    return current[1]
+
+def apply_control_edits(edits, key, positions):
+    """data_editor callback: applies the editor's pending changes to the edit session."""
+    changes = st.session_state[key]
+    report = edits.apply_changes(
+        edited_rows={positions[int(row)]: values for row, values in changes["edited_rows"].items()},
+        added_rows=changes["added_rows"],
+        deleted_rows=[positions[int(row)] for row in changes["deleted_rows"]],
+    )
+    st.session_state['control_edit_errors'] = report.messages
+
+def discard_control_edits():
+    st.session_state.pop('control_edits', None)
+    st.session_state.pop('control_edit_errors', None)
+
+def display_control_editor(edits, page_size=100):
+    """
+    Displays one page of the edit session in st.data_editor.
+
+    Each change is validated and scored on its own and folded into the running
+    aggregates; invalid changes stay in the editor with the reasons listed below it.
+
+    Args:
+        edits (ControlEditSession): The dataset being edited.
+        page_size (int): Number of rows per editor page.
+    """
+    num_pages = (len(edits.df) - 1) // page_size + 1
+    page = st.number_input("Editor page", min_value=1, max_value=num_pages, value=1, step=1,
+                           key="control_editor_page",
+                           help="New rows can be added at the bottom of any page")
+    positions = np.arange((page - 1) * page_size, min(page * page_size, len(edits.df)))
+    key = f"control_editor:{edits.version}:{page}"
+    st.data_editor(
+        edits.df.iloc[positions],
+        key=key,
+        num_rows="dynamic",
+        hide_index=True,
+        disabled=['Control Quality Score', 'Substantiation Method'],
+        use_container_width=True,
+        on_change=apply_control_edits,
+        args=(edits, key, positions),
+    )
+    for message in st.session_state.get('control_edit_errors', []):
+        st.error(f"Change not applied: {message}")
+    st.caption(f"{edits.version} change(s) applied; {len(edits.df):,} controls")
+    st.button("Discard edits", on_click=discard_control_edits, disabled=edits.version == 0)
+
+def display_dataset_summary(aggregates):
+    """Displays the headline metrics of a dataset from its ControlAggregates."""
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Total Controls", f"{aggregates.total:,}")
+    with col2:
+        st.metric("Avg Quality Score", f"{aggregates.mean_score:.2f}")
+    with col3:
+        st.metric("High Risk %", f"{aggregates.percentage('Risk Level', 'High'):.1f}%")
+    with col4:
+        st.metric("Automation %", f"{aggregates.percentage('Manual/Automated', 'Automated'):.1f}%")
+
+# DataFrames are cached as shared resources rather than copied on every hit, so the
+# frames returned by these functions must be treated as read-only.
+
+def scoring_fingerprint(source):
+    """Cache key of a dataset scored under the current weights, so that changing them rescores it."""
+    return f"{source}:weights-{current_weights().version}"
+
+@st.cache_resource(max_entries=4, show_spinner="Generating synthetic data...")
+@track_cache_misses
+def load_synthetic_control_data(num_records, seed, distributions):
+    """Cached generate_synthetic_control_data for the synthetic data source."""
+    return generate_synthetic_control_data(num_records, seed=seed, distributions=distributions)
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+@track_cache_misses
+def load_uploaded_data(fingerprint, _uploaded_file, fmt):
+    """Reads an uploaded file once per distinct file content."""
+    return read_control_file(_uploaded_file, fmt)
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+@track_cache_misses
+def validate_dataset(fingerprint, _df):
+    """Cached validate_controls of an uploaded dataset, returning (report, compact frame or None)."""
+    return validate_controls(_df)
+
+@st.cache_resource(max_entries=4, show_spinner="Scoring controls...")
+@track_cache_misses
+def score_dataset(fingerprint, _df):
+    """
+    Scores a validated dataset once per fingerprint.
+
+    Args:
+        fingerprint (str): Identifies the dataset content, e.g. a hash of the uploaded file.
+        _df (pd.DataFrame): The validated controls; excluded from Streamlit's hashing.
+
+    Returns:
+        pd.DataFrame: A new frame with 'Control Quality Score' and 'Substantiation Method' columns.
+    """
+    return _df.assign(**{
+        'Control Quality Score': score_controls(_df),
+        'Substantiation Method': suggest_substantiation_methods(_df),
+    })
+
+@st.cache_resource(max_entries=4, show_spinner="Validating and scoring in parallel...")
+@track_cache_misses
+def score_dataset_parallel(fingerprint, workers, _df):
+    """
+    Validates, scores and aggregates an uploaded dataset on a process pool, once per fingerprint.
+
+    Returns:
+        tuple: (report, scored compact frame or None, aggregates); see score_controls_parallel.
+    """
+    return score_controls_parallel(_df, workers=workers)
+
+@st.cache_data(max_entries=16, show_spinner=False)
+@track_cache_misses
+def aggregate_dataset(fingerprint, _df):
+    """Cached summarize_controls of a scored dataset."""
+    return summarize_controls(_df)
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+@track_cache_misses
+def build_table_index(fingerprint, _df):
+    """Cached ControlTableIndex of a scored dataset."""
+    return ControlTableIndex(_df)
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def build_sample_template_csv(num_records):
+    """Cached CSV bytes of the downloadable sample template, built on the first download."""
+    return write_control_file(generate_synthetic_control_data(num_records), "csv")
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def export_dataset(fingerprint, fmt, _df):
+    """
+    Serialises a scored dataset for download once per fingerprint and format.
+
+    Held as a shared resource so that the cache and Streamlit's media file store refer to
+    the same bytes object instead of each keeping a copy.
+
+    Args:
+        fingerprint (str): Identifies the scored dataset content.
+        fmt (str): 'csv', 'parquet' or 'arrow'.
+        _df (pd.DataFrame): The scored controls; excluded from Streamlit's hashing.
+
+    Returns:
+        bytes: The export file contents.
+    """
+    return write_control_file(_df, fmt)
+
+def _bar_figure(categories, colors, title, x_label, y_label):
+    figure = go.Figure(go.Bar(x=categories, marker_color=[colors[c] for c in categories]))
+    figure.update_layout(title=title, xaxis_title=x_label, yaxis_title=y_label, showlegend=False)
+    return figure
+
+def _pie_figure(categories, colors, title):
+    figure = go.Figure(go.Pie(labels=categories, marker_colors=[colors[c] for c in categories]))
+    figure.update_layout(title=title)
+    return figure
+
+@st.cache_resource(show_spinner=False)
+def build_figure_templates():
+    """
+    Builds the dashboard figures without data, once per process.
+
+    Categories, colours and titles are fixed by the schema, so only the trace values
+    differ between datasets; see dashboard_chart_data.
+
+    Returns:
+        dict: Figures keyed by chart name; treat as read-only and copy before filling.
+    """
+    templates = {
+        "control_types": _bar_figure(EXPECTED_VALUES['Control Type'], CONTROL_TYPE_COLORS,
+                                     "Distribution of Control Types", "Control Type", "Count"),
+        "risk_levels": _pie_figure(EXPECTED_VALUES['Risk Level'], RISK_LEVEL_COLORS, "Risk Level Distribution"),
+        "quality_by_type": _bar_figure(EXPECTED_VALUES['Control Type'], CONTROL_TYPE_COLORS,
+                                       "Average Control Quality Score by Type", "Control Type",
+                                       "Average Quality Score"),
+        "automation": _pie_figure(EXPECTED_VALUES['Manual/Automated'], AUTOMATION_COLORS,
+                                  "Manual vs Automated Controls Distribution"),
+        "key_nonkey": _bar_figure(EXPECTED_VALUES['Key/Non-Key'], KEY_NONKEY_COLORS,
+                                  "Key vs Non-Key Controls Distribution", "Control Classification", "Count"),
+    }
+    methods = go.Figure([
+        go.Bar(name=effort, x=[m for m in SUBSTANTIATION_METHODS if SUBSTANTIATION_EFFORT[m] == effort],
+               marker_color=EFFORT_COLORS[effort])
+        for effort in dict.fromkeys(SUBSTANTIATION_EFFORT.values())
+    ])
+    methods.update_layout(title="Recommended Substantiation Methods", xaxis_title="Substantiation Method",
+                          yaxis_title="Controls", legend_title="Effort")
+    templates["methods"] = methods
+    return templates
+
+def dashboard_chart_data(aggregates):
+    """
+    Reduces a ControlAggregates to the values plotted on the dashboard.
+
+    Args:
+        aggregates (ControlAggregates): Summary of the scored dataset.
+
+    Returns:
+        dict: For each chart name, one list of values per trace of its template figure.
+    """
+    method_counts = aggregates.method_counts()
+    return {
+        "control_types": [aggregates.value_counts('Control Type').tolist()],
+        "risk_levels": [aggregates.value_counts('Risk Level').tolist()],
+        "quality_by_type": [aggregates.mean_score_by('Control Type').tolist()],
+        "automation": [aggregates.value_counts('Manual/Automated').tolist()],
+        "key_nonkey": [aggregates.value_counts('Key/Non-Key').tolist()],
+        "methods": [
+            [int(method_counts.get(m, 0)) for m in SUBSTANTIATION_METHODS if SUBSTANTIATION_EFFORT[m] == effort]
+            for effort in dict.fromkeys(SUBSTANTIATION_EFFORT.values())
+        ],
+    }
+
+@st.cache_resource(max_entries=16, show_spinner=False)
+@track_cache_misses
+def build_dashboard_figures(digest, _aggregates):
+    """
+    Fills copies of the template figures with the values of one dataset summary.
+
+    Memoized by the digest of the aggregates rather than by the rows behind them, so the
+    cost is independent of the dataset size and a changed dataset only rewrites trace values.
+
+    Args:
+        digest (str): ControlAggregates.digest() of the summary.
+        _aggregates (ControlAggregates): Summary of the dataset; excluded from Streamlit's hashing.
+
+    Returns:
+        dict: Figures keyed by chart name; shared between reruns, so treat as read-only.
+    """
+    templates = build_figure_templates()
+    figures = {}
+    for name, trace_values in dashboard_chart_data(_aggregates).items():
+        figure = go.Figure(templates[name])
+        for trace, values in zip(figure.data, trace_values):
+            if trace.type == "pie":
+                trace.values = values
+            else:
+                trace.y = values
+        figures[name] = figure
+    return figures
+
+def display_dashboard(aggregates, figures):
+    """
+    Displays the charts, KPIs and insights of the Analyze Data page.
+
+    Everything is read from the ControlAggregates of the dataset, so the full frame is
+    never filtered or counted again here.
+
+    Args:
+        aggregates (ControlAggregates): Summary of the scored dataset.
+        figures (dict): The dataset's figures from build_dashboard_figures.
+    """
+    try:
+
+        # 1. Control Types Distribution Chart
+        st.subheader("Control Types Distribution")
+        st.markdown("""
+        **What this chart shows:** The distribution of Preventative vs Detective controls in your dataset.
+        
+        **Key insights:**
+        - **Preventative controls** are designed to prevent issues before they occur (e.g., authorization requirements, segregation of duties)
+        - **Detective controls** identify issues after they happen (e.g., reconciliations, monitoring reports)
+        - A balanced portfolio typically has more preventative controls, but the optimal mix depends on your risk appetite
+        """)
+        
+        st.plotly_chart(figures["control_types"], use_container_width=True)
+
+        # 2. Risk Level Distribution Chart
+        st.subheader("Risk Level Distribution")
+        st.markdown("""
+        **What this chart shows:** The proportion of controls categorized by risk level across your control environment.
+        
+        **Key insights:**
+        - **High Risk** controls require more rigorous testing and monitoring due to their critical nature
+        - **Medium Risk** controls need regular attention but with less intensive procedures
+        - **Low Risk** controls can often be tested less frequently or with lighter procedures
+        - An organization with many high-risk controls may need to invest more in control strengthening
+        """)
+        
+        st.plotly_chart(figures["risk_levels"], use_container_width=True)
+
+        # 3. Control Quality Score Analysis
+        st.subheader("Average Control Quality Score by Type")
+        weights = current_weights()
+        points = {col: {value: f"{p:+g} point{'' if abs(p) == 1 else 's'}" for value, p in values.items()}
+                  for col, values in weights.points.items()}
+        rating_points = sorted((0, 4 * weights.rating_points))
+        st.markdown(f"""
+        **What this chart shows:** The average Control Quality Score for each control type, helping identify which controls are performing better.
+        
+        **How Quality Score is calculated:**
+        - **Control Type:** Preventative ({points['Control Type']['Preventative']}) vs Detective ({points['Control Type']['Detective']})
+        - **Key vs Non-Key:** Key controls ({points['Key/Non-Key']['Key']}) vs Non-Key ({points['Key/Non-Key']['Non-Key']})
+        - **Automation:** Automated ({points['Manual/Automated']['Automated']}) vs Manual ({points['Manual/Automated']['Manual']})
+        - **Implementation Quality:** Rating from 1-5 (adds {rating_points[0]:g}-{rating_points[1]:g} points)
+        
+        **Key insights:**
+        - Higher scores indicate more robust and reliable controls
+        - Preventative controls typically score higher due to their proactive nature
+        - Scores help prioritize improvement efforts and resource allocation
+        """)
+        
+        st.plotly_chart(figures["quality_by_type"], use_container_width=True)
+
+        # 4. Manual vs Automated Controls Distribution
+        st.subheader("Manual vs Automated Controls")
+        st.markdown("""
+        **What this chart shows:** The split between manual and automated controls in your environment.
+        
+        **Key insights:**
+        - **Automated controls** are generally more reliable and less prone to human error
+        - **Manual controls** offer flexibility but require more oversight and training
+        - Higher automation rates typically indicate a more mature control environment
+        - Consider automation opportunities for high-frequency or error-prone manual controls
+        """)
+        
+        st.plotly_chart(figures["automation"], use_container_width=True)
+
+        # 5. Key vs Non-Key Controls Analysis
+        st.subheader("Key vs Non-Key Controls")
+        st.markdown("""
+        **What this chart shows:** The distribution of key controls versus non-key controls.
+        
+        **Key insights:**
+        - **Key controls** are critical for preventing or detecting material misstatements
+        - **Non-Key controls** provide additional layers of protection but are less critical
+        - Key controls require more rigorous testing and monitoring procedures
+        - A balanced approach ensures comprehensive coverage without over-testing
+        """)
+        
+        st.plotly_chart(figures["key_nonkey"], use_container_width=True)
+
+        # 6. Substantiation Method Mix
+        st.subheader("Substantiation Method Mix")
+        st.markdown("""
+        **What this chart shows:** The recommended testing method for every control in your portfolio and the testing effort it implies.
+        
+        **Key insights:**
+        - **Re-performance** gives the most reliable evidence but is the most time-consuming
+        - **Examination** balances effort and reliability for documented and automated controls
+        - **Inquiry** is the lightest procedure, suited to lower-risk controls
+        - Estimated hours use a planning assumption per effort level (High: 8h, Medium: 4h, Low: 1h per control)
+        """)
+        
+        effort_summary = summarize_testing_effort(aggregates.method_counts())
+        col1, col2 = st.columns([3, 2])
+        with col1:
+            st.plotly_chart(figures["methods"], use_container_width=True)
+        with col2:
+            st.metric(
+                "Estimated Testing Effort",
+                f"{effort_summary['Estimated Hours'].sum():,} hours",
+                help="Total estimated hours to test every control with its recommended method"
+            )
+            st.dataframe(effort_summary, hide_index=True, use_container_width=True)
+
+        # Key metrics in a clean layout
+        st.subheader("Key Performance Indicators")
+        st.markdown("""
+        **Summary metrics** that provide quick insights into your control environment's overall health and characteristics.
+        """)
+        
+        col1, col2, col3, col4 = st.columns(4)
+        
+        with col1:
+            avg_quality = aggregates.mean_score
+            low, high = current_weights().score_range
+            st.metric(
+                "Average Control Quality", 
+                f"{avg_quality:.2f}",
+                help=f"Higher scores indicate more robust controls (Range: {low:g}-{high:g})"
+            )
+            
+        with col2:
+            high_risk_count = aggregates.count('Risk Level', 'High')
+            high_risk_pct = aggregates.percentage('Risk Level', 'High')
+            st.metric(
+                "High Risk Controls", 
+                f"{high_risk_count:,} ({high_risk_pct:.1f}%)",
+                help="Number and percentage of high-risk controls requiring intensive monitoring"
+            )
+            
+        with col3:
+            automation_rate = aggregates.percentage('Manual/Automated', 'Automated')
+            st.metric(
+                "Automation Rate", 
+                f"{automation_rate:.1f}%",
+                help="Percentage of controls that are automated (higher is generally better)"
+            )
+            
+        with col4:
+            key_controls = aggregates.count('Key/Non-Key', 'Key')
+            key_control_pct = aggregates.percentage('Key/Non-Key', 'Key')
+            st.metric(
+                "Key Controls", 
+                f"{key_controls:,} ({key_control_pct:.1f}%)",
+                help="Number and percentage of key controls critical for risk mitigation"
+            )
+
+        # Additional insights and recommendations
+        st.subheader("Insights & Recommendations")
+        
+        # Calculate some insights
+        preventative_pct = aggregates.percentage('Control Type', 'Preventative')
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.markdown("#### **Control Mix Analysis**")
+            if preventative_pct > 60:
+                st.success(f"Good preventative control coverage ({preventative_pct:.1f}%)")
+            elif preventative_pct > 40:
+                st.warning(f"Moderate preventative control coverage ({preventative_pct:.1f}%)")
+            else:
+                st.error(f"Low preventative control coverage ({preventative_pct:.1f}%)")
+            
+            if automation_rate > 50:
+                st.success(f"Good automation rate ({automation_rate:.1f}%)")
+            else:
+                st.info(f"Consider increasing automation ({automation_rate:.1f}% current)")
+        
+        with col2:
+            st.markdown("#### **Risk Profile**")
+            if high_risk_pct > 30:
+                st.warning(f"High proportion of high-risk controls ({high_risk_pct:.1f}%)")
+                st.info("Consider control strengthening initiatives")
+            else:
+                st.success(f"Balanced risk profile ({high_risk_pct:.1f}% high-risk)")
+            
+            if avg_quality < scale_score(REDESIGN_SCORE):
+                st.warning("Below average control quality - focus on improvements")
+            elif avg_quality > scale_score(STRONG_DESIGN_SCORE):
+                st.success("Strong overall control quality")
+            else:
+                st.info("Moderate control quality - room for enhancement")
+
+    except Exception as e:
+        st.error(f"Error creating visualizations: {e}")
+
+def build_trend_figure(trend):
+    """Line chart of the average score of each Control Type across the snapshots of a series."""
+    fig = go.Figure([
+        go.Scatter(x=rows['assessment_date'], y=rows['average_score'], mode="lines+markers", name=control_type,
+                   line_color=CONTROL_TYPE_COLORS.get(control_type))
+        for control_type, rows in trend.groupby('control_type', sort=False)
+    ])
+    fig.update_layout(title="Average Control Quality Score by Type over Time", xaxis_title="Assessment Date",
+                      yaxis_title="Average Quality Score", legend_title="Control Type")
+    return fig
+
+def display_portfolio_trends(store, series, portfolio_id, first_date, latest_date):
+    """
+    Displays how a snapshot series developed, from the summaries stored at save time.
+
+    Args:
+        store (AssessmentStore): The assessment store.
+        series (str): Name shared by the snapshots.
+        portfolio_id (int): The selected snapshot, whose score changes are listed.
+        first_date (str): Assessment date of the first snapshot, as YYYY-MM-DD.
+        latest_date (str): Assessment date of the latest snapshot, as YYYY-MM-DD.
+    """
+    trend = store.trend(series)
+    st.plotly_chart(build_trend_figure(trend), use_container_width=True)
+
+    snapshots = trend.groupby(['assessment_date', 'portfolio_id'], sort=False)[
+        ['controls', 'new_controls', 'improved', 'dropped']
+    ].sum().reset_index(level='portfolio_id', drop=True)
+    st.dataframe(
+        snapshots.rename(columns={'controls': 'Controls', 'new_controls': 'New', 'improved': 'Improved',
+                                  'dropped': 'Dropped'}),
+        use_container_width=True,
+    )
+
+    direction = st.radio("Score changes in the selected snapshot", ["dropped", "improved"], horizontal=True,
+                         format_func=lambda d: f"Largest {'drops' if d == 'dropped' else 'improvements'}")
+    changes = store.score_changes(portfolio_id, direction=direction, limit=100)
+    if changes.empty:
+        st.info(f"No control's score {direction} since its previous assessment")
     else:
-        return "Inquiry"
+        st.dataframe(changes, hide_index=True, use_container_width=True)
+
+    control_id = st.text_input("Control history", placeholder="Control ID, e.g. CTRL_001",
+                               help="Every assessment of one control in this series")
+    if control_id.strip():
+        history = store.control_history(series, control_id.strip())
+        if history.empty:
+            st.info(f"No assessments of {control_id.strip()} in '{series}'")
+        else:
+            st.dataframe(history.drop(columns='portfolio_id'), hide_index=True, use_container_width=True)
+
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        as_of = st.date_input("Controls as of", value=datetime.date.fromisoformat(latest_date),
+                              min_value=datetime.date.fromisoformat(first_date),
+                              help="The latest assessment of each control on or before this date")
+    with col2:
+        ids = st.text_input("Control IDs", placeholder="All controls, or e.g. CTRL_001, CTRL_002")
+    control_ids = [control_id.strip() for control_id in ids.split(",") if control_id.strip()] or None
+    controls = store.controls_as_of(series, as_of, control_ids)
+    st.dataframe(controls, hide_index=True, use_container_width=True)
+    st.caption(f"{len(controls):,} controls as of {as_of:%Y-%m-%d}")
+
+# Fractions of the affected controls changed by the simulated scenarios, in percent
+SIMULATION_STEPS = np.arange(0, 101)
+
+@st.cache_data(max_entries=8, show_spinner="Simulating scenarios...")
+@track_cache_misses
+def simulate_what_if(fingerprint, intervention, draws, _df):
+    """
+    Simulates one intervention at every step of SIMULATION_STEPS on a scored dataset.
+
+    Returns:
+        tuple: (SimulationResult, seconds taken by the simulation)
+    """
+    shift = dataclasses.replace(INTERVENTIONS[intervention], fraction=SIMULATION_STEPS / 100)
+    start = time.perf_counter()
+    result = simulate_portfolios(apply_shifts(portfolio_distribution(_df), [shift]), len(_df), draws, seed=0)
+    return result, time.perf_counter() - start
+
+def build_simulation_figure(bands, metric, step, confidence):
+    """Line chart of one metric's mean and confidence band across the simulated steps."""
+    rows = bands[bands['Metric'] == metric]
+    fig = go.Figure([
+        go.Scatter(x=SIMULATION_STEPS, y=rows['Upper'], mode="lines", line_width=0, showlegend=False),
+        go.Scatter(x=SIMULATION_STEPS, y=rows['Lower'], mode="lines", line_width=0, fill="tonexty",
+                   fillcolor="rgba(70, 130, 180, 0.25)", name=f"{confidence:.0%} band"),
+        go.Scatter(x=SIMULATION_STEPS, y=rows['Mean'], mode="lines", line_color="#4682B4", name="Mean"),
+    ])
+    fig.add_vline(x=step, line_dash="dash", line_color="#DC143C")
+    fig.update_layout(title=f"{metric} by Share of Affected Controls Changed",
+                      xaxis_title="Affected controls changed (%)", yaxis_title=metric)
+    return fig
+
+def display_what_if_simulation(fingerprint, df):
+    """
+    Displays a Monte Carlo what-if simulation of the dataset under a chosen intervention.
+
+    Args:
+        fingerprint (str): Identifies the scored dataset content.
+        df (pd.DataFrame): The scored controls.
+    """
+    col1, col2 = st.columns(2)
+    with col1:
+        intervention = st.selectbox("Intervention", options=list(INTERVENTIONS))
+        step = st.slider("Affected controls changed (%)", 0, 100, 30)
+    with col2:
+        draws = st.number_input("Simulated portfolios per scenario", min_value=10, max_value=1000, value=100,
+                                step=10, help="Portfolios of the dataset's size sampled for each scenario")
+        confidence = st.select_slider("Confidence band", options=[0.8, 0.9, 0.95], value=0.9,
+                                      format_func="{:.0%}".format)
+
+    try:
+        result, seconds = simulate_what_if(fingerprint, intervention, int(draws), df)
+    except ValueError as e:
+        st.error(f"Cannot simulate this dataset: {e}")
+        return
+    bands = result.bands(confidence)
+
+    baseline = bands[bands['Scenario'] == 0].set_index('Metric')
+    scenario = bands[bands['Scenario'] == step].set_index('Metric')
+    for col, (metric, unit) in zip(st.columns(len(SIMULATION_METRICS)), SIMULATION_METRICS.items()):
+        with col:
+            # Expected values, so the delta is free of sampling noise
+            st.metric(metric, f"{scenario.at[metric, 'Expected']:,.1f}",
+                      delta=f"{scenario.at[metric, 'Expected'] - baseline.at[metric, 'Expected']:+,.1f}",
+                      delta_color="inverse" if metric == "Testing Hours" else "normal",
+                      help=f"{unit}; {confidence:.0%} of simulated portfolios between "
+                           f"{scenario.at[metric, 'Lower']:,.1f} and {scenario.at[metric, 'Upper']:,.1f}")
+
+    for metric in ("Average Quality Score", "High-Risk Coverage"):
+        st.plotly_chart(build_simulation_figure(bands, metric, step, confidence), use_container_width=True)
+    st.caption(f"{result.scenarios:,} scenarios x {result.draws:,} portfolios of {result.num_controls:,} "
+               f"controls simulated in {seconds:.2f}s ({result.scenarios / max(seconds, 1e-9):,.0f} scenarios/s)")
+
+@st.cache_resource(max_entries=8, show_spinner="Planning tests...")
+@track_cache_misses
+def plan_dataset_testing(fingerprint, budget, _df):
+    """Cached plan_testing of a scored dataset for one budget; the plan is shared, not copied."""
+    return plan_testing(_df, budget)
+
+def display_test_plan(fingerprint, df, aggregates):
+    """
+    Displays the test plan that gives the most risk-weighted assurance within a testing budget.
+
+    Args:
+        fingerprint (str): Identifies the scored dataset content.
+        df (pd.DataFrame): The scored controls.
+        aggregates (ControlAggregates): Aggregates of df.
+    """
+    suggested_hours = int(summarize_testing_effort(aggregates.method_counts())["Estimated Hours"].sum())
+    budget = st.number_input("Testing budget (hours)", min_value=0, value=suggested_hours // 2, step=10,
+                             help=f"Testing every control by its suggested method takes an estimated "
+                                  f"{suggested_hours:,} hours")
+    test_plan = plan_dataset_testing(fingerprint, budget, df)
+    tested = test_plan.plan['Planned Method'] != NOT_TESTED
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Controls Tested", f"{tested.sum():,} of {len(df):,}")
+    with col2:
+        st.metric("Hours Planned", f"{test_plan.hours:,.0f} of {test_plan.budget:,.0f}")
+    with col3:
+        st.metric("Risk-Weighted Assurance", f"{100 * test_plan.assurance / test_plan.max_assurance:.1f}%",
+                  help=f"Share of the assurance from re-performing every control; no plan within this budget "
+                       f"exceeds {100 * test_plan.upper_bound / test_plan.max_assurance:.2f}%")
+
+    st.dataframe(test_plan.summary(), hide_index=True, use_container_width=True)
+    st.download_button(
+        label="Download Test Plan",
+        data=lambda: test_plan.plan.to_csv(index=False).encode("utf-8"),
+        file_name="control_test_plan.csv",
+        mime="text/csv",
+    )
+
+def display_stored_portfolio(perf):
+    """
+    Analyzes a portfolio from the assessment store without loading it into pandas.
+
+    Args:
+        perf (PerformanceRecorder): Receives a lap at the end of each stage.
+    """
+    store = open_store()
+    portfolios = store.list_portfolios()
+    if portfolios.empty:
+        st.info("The assessment store is empty. Save an analyzed dataset or an evaluated control to add a portfolio.")
+        return
+    labels = {
+        row.portfolio_id: f"{row.name} ({row.assessment_date}, {row.controls:,} controls)"
+        for row in portfolios.itertuples()
+    }
+    portfolio_id = st.selectbox("Portfolio", options=list(labels), format_func=labels.get)
+    aggregates = store.aggregate_portfolio(portfolio_id)
+    perf.lap("store aggregation", rows=aggregates.total)
+
+    st.divider()
+    st.subheader("Dataset Summary")
+    display_dataset_summary(aggregates)
+
+    st.subheader("Data Table")
+    with st.expander("View Portfolio Controls"):
+        display_stored_table(store, portfolio_id, aggregates.total)
+    perf.lap("data table")
+
+    series = portfolios.set_index('portfolio_id').at[portfolio_id, 'name']
+    series_info = store.list_series().set_index('series')
+    if series in series_info.index and series_info.at[series, 'snapshots'] > 1:
+        st.subheader("Trends")
+        with st.expander(f"Snapshots of '{series}'", expanded=True):
+            display_portfolio_trends(store, series, portfolio_id,
+                                     series_info.at[series, 'first_date'], series_info.at[series, 'latest_date'])
+        perf.lap("trends")
+
+    with st.expander("Delete Portfolio"):
+        st.write(f"Removes {labels[portfolio_id]} from the store; later snapshots of its series are compared afresh.")
+        confirmed = st.checkbox("I understand that this cannot be undone")
+        if st.button("Delete Portfolio", type="primary", disabled=not confirmed):
+            store.delete_portfolio(portfolio_id)
+            st.rerun()
+
+    figures = build_dashboard_figures(aggregates.digest(), aggregates)
+    perf.lap("chart building", cache="build_dashboard_figures")
+    display_dashboard(aggregates, figures)
 
 def run_analyze_data():
+    perf = start_performance_recording("Analyze Data")
+    try:
+        analyze_data_page(perf)
+    finally:
+        perf.finish()
+
+def analyze_data_page(perf):
+    """
+    Renders the Analyze Data page.
+
+    Args:
+        perf (PerformanceRecorder): Receives a lap at the end of each stage.
+    """
     st.header("Analyze Control Data")
     
     # Data source selection
@@ -235,32 +1020,59 @@ def run_analyze_data():
     
     data_source = st.radio(
         "Choose your data source:",
-        options=["Generate Synthetic Data", "Upload Your Own Dataset"],
-        help="Select whether to use synthetic data for exploration or upload your own control dataset"
+        options=["Generate Synthetic Data", "Upload Your Own Dataset", "Stored Portfolio"],
+        help="Select whether to use synthetic data for exploration, upload your own control dataset "
+             "or analyze a portfolio saved in the assessment store"
     )
     
     df = None
+    fingerprint = None
+    portfolio_name = None
+    aggregates = None
     
     if data_source == "Generate Synthetic Data":
         # Move the slider to sidebar for synthetic data
         with st.sidebar:
             st.divider()
             st.subheader("Data Generation Settings")
-            num_records = st.slider("Number of records", min_value=5, max_value=1000, value=100, 
+            num_records = st.slider("Number of records", min_value=5, max_value=2_000_000, value=100, 
                                help="Number of synthetic control records to generate. Adjust for performance.")
+            seed = st.number_input("Random seed", min_value=0, value=42, step=1,
+                                   help="The same seed and settings always generate the same dataset.")
+            
+            with st.expander("Attribute Distributions"):
+                preventative_pct = st.slider("Preventative %", 0, 100, 50)
+                key_pct = st.slider("Key %", 0, 100, 50)
+                automated_pct = st.slider("Automated %", 0, 100, 50)
+                high_risk_pct = st.slider("High Risk %", 0, 100, 33,
+                                          help="The remaining controls are split evenly between Medium and Low risk.")
             
             st.info("Using synthetic data for analysis")
         
-        # Create fresh synthetic data when the slider changes
-        if 'previous_num_records' not in st.session_state or st.session_state.previous_num_records != num_records:
-            df = generate_synthetic_control_data(num_records)
-            st.session_state.previous_num_records = num_records
-            st.session_state.current_df = df
-        else:
-            df = st.session_state.current_df
+        distributions = {
+            'Control Type': {'Preventative': preventative_pct, 'Detective': 100 - preventative_pct},
+            'Key/Non-Key': {'Key': key_pct, 'Non-Key': 100 - key_pct},
+            'Manual/Automated': {'Automated': automated_pct, 'Manual': 100 - automated_pct},
+            'Risk Level': {'High': high_risk_pct, 'Medium': (100 - high_risk_pct) / 2, 'Low': (100 - high_risk_pct) / 2},
+        }
+        
+        # Synthetic data is regenerated only when the generation settings change
+        try:
+            df = load_synthetic_control_data(num_records, int(seed), distributions)
+        except ValueError as e:
+            st.error(f"Invalid attribute distributions: {e}")
+            return
+        perf.lap("data generation", rows=len(df), cache="load_synthetic_control_data")
+        fingerprint = scoring_fingerprint(
+            f"synthetic:{num_records}:{int(seed)}:{sorted((col, sorted(w.items())) for col, w in distributions.items())}")
             
-        st.success(f"Generated {num_records} synthetic control records for analysis")
+        portfolio_name = f"Synthetic controls (seed {int(seed)})"
+        st.success(f"Generated {num_records:,} synthetic control records for analysis")
     
+    elif data_source == "Stored Portfolio":
+        display_stored_portfolio(perf)
+        return
+
     else:  # Upload Your Own Dataset
         st.markdown("### File Upload")
         
@@ -268,15 +1080,11 @@ def run_analyze_data():
         st.markdown("**Step 1: Download Sample Template**")
         st.markdown("Download the sample template below, edit it with your data, and upload it back:")
         
-        # Generate sample template with more records for better example
-        sample_template = generate_synthetic_control_data(20)
-        csv_template = sample_template.to_csv(index=False)
-        
         col1, col2 = st.columns([6, 1])
         with col2:
             st.download_button(
                 label="Download Sample Dataset",
-                data=csv_template,
+                data=lambda: build_sample_template_csv(20),
                 file_name="control_data_template.csv",
                 mime="text/csv",
                 help="Download this sample CSV file, edit it with your data, and upload it back",
@@ -295,23 +1103,106 @@ def run_analyze_data():
         # File uploader
         st.markdown("**Step 2: Upload Your Data File**")
         uploaded_file = st.file_uploader(
-            "Upload your control data file (CSV format)",
-            type=['csv'],
-            help="Upload the CSV file with your control data. Make sure it follows the template format exactly."
+            "Upload your control data file (CSV, Parquet or Arrow IPC format)",
+            type=list(FILE_EXTENSIONS),
+            help="Upload the file with your control data. Make sure it follows the template format exactly. "
+                 "Parquet and Arrow files load much faster than CSV for large inventories."
+        )
+        streaming_mode = st.toggle(
+            "Streaming mode for large files",
+            help="Read, validate and score the file in chunks of "
+                 f"{DEFAULT_CHUNK_SIZE:,} rows, keeping only summary statistics in memory. "
+                 "Recommended for files with millions of records."
+        )
+        parallel_mode = st.toggle(
+            "Parallel processing",
+            help="Split the file into partitions that are validated and scored by several worker processes, "
+                 "then merge their summaries. Speeds up multi-million-row files on multi-core machines."
+        )
+        workers = 1
+        if parallel_mode:
+            workers = st.number_input("Worker processes", min_value=2, max_value=64,
+                                      value=max(default_workers(), 2), step=1)
+        background_mode = st.toggle(
+            "Run in background",
+            value=BACKGROUND_JOB_KEY in st.session_state or JOB_QUERY_PARAM in st.query_params,
+            help="Analyze the file in a background job with live progress and a Cancel button. "
+                 "The job keeps running while you use the rest of the app."
         )
         
+        upload_format = None
         if uploaded_file is not None:
+            upload_format = detect_file_format(uploaded_file.name)
+
+        if background_mode:
+            job = display_background_job(uploaded_file, upload_format, workers)
+            if job is None:
+                return
+            df, aggregates = job.result.df, job.result.aggregates
+            fingerprint, portfolio_name = scoring_fingerprint(f"job:{job.job_id}"), job.name
+            if job.result.weights_version != current_weights().version:
+                # The weights were reloaded while or since the job scored the file
+                df = score_dataset(fingerprint, df)
+                aggregates = aggregate_dataset(fingerprint, df)
+            perf.lap("background job", rows=len(df))
+            st.success(f"Analyzed {len(df):,} records from {job.name} in {job.elapsed_seconds:,.1f}s. "
+                       "Your data is ready for analysis.")
+
+        elif uploaded_file is not None and streaming_mode:
+            fingerprint = scoring_fingerprint(f"stream:{hashlib.blake2b(uploaded_file.getvalue(), digest_size=16).hexdigest()}")
+            streamed = st.session_state.setdefault('streamed_uploads', {})
             try:
-                # Read the uploaded file
-                df_uploaded = pd.read_csv(uploaded_file)
+                if fingerprint not in streamed:
+                    with st.status("Streaming your dataset...", expanded=False) as status:
+                        streamed.clear()
+                        ingest = ingest_control_chunks if workers == 1 else functools.partial(
+                            ingest_control_chunks_parallel, workers=workers)
+                        streamed[fingerprint] = ingest(
+                            iter_control_chunks(uploaded_file, DEFAULT_CHUNK_SIZE, upload_format),
+                            on_progress=lambda rows: status.update(label=f"Validated and scored {rows:,} records...")
+                        )
+                        status.update(label="Streaming complete", state="complete" if streamed[fingerprint][0] else "error")
+                is_valid, error_messages, aggregates = streamed[fingerprint]
+                perf.lap("streaming ingest", rows=aggregates.total)
+            except Exception as e:
+                st.error(f"Error reading file: {str(e)}")
+                st.info("Please ensure your file is a valid CSV, Parquet or Arrow file with numeric rating columns and try again.")
+                return
+
+            if not is_valid:
+                st.error("Dataset validation failed. Please fix the following issues:")
+                for i, error in enumerate(error_messages, 1):
+                    st.error(f"{i}. {error}")
+                return
+
+            st.success(f"Streamed {aggregates.total:,} records from {uploaded_file.name}. Your data is ready for analysis.")
+            st.divider()
+            st.subheader("Dataset Summary")
+            display_dataset_summary(aggregates)
+            figures = build_dashboard_figures(aggregates.digest(), aggregates)
+            perf.lap("chart building", cache="build_dashboard_figures")
+            display_dashboard(aggregates, figures)
+            return
+
+        elif uploaded_file is not None:
+            try:
+                # Read and validate the uploaded file, once per distinct file content
+                fingerprint = scoring_fingerprint(f"upload:{hashlib.blake2b(uploaded_file.getvalue(), digest_size=16).hexdigest()}")
+                portfolio_name = uploaded_file.name
+                with st.spinner("Validating your dataset..."):
+                    df_uploaded = load_uploaded_data(fingerprint, uploaded_file, upload_format)
+                    perf.lap("read file", rows=len(df_uploaded), cache="load_uploaded_data")
+                    if parallel_mode:
+                        report, df_processed, aggregates = score_dataset_parallel(fingerprint, workers, df_uploaded)
+                        perf.lap("parallel validation and scoring", rows=len(df_uploaded),
+                                 cache="score_dataset_parallel")
+                    else:
+                        report, df_processed = validate_dataset(fingerprint, df_uploaded)
+                        perf.lap("validation", rows=len(df_uploaded), cache="validate_dataset")
                 
                 st.info(f"File uploaded successfully: {uploaded_file.name} ({len(df_uploaded)} records)")
                 
-                # Validate the uploaded data
-                with st.spinner("Validating your dataset..."):
-                    is_valid, error_messages, df_processed = validate_uploaded_data(df_uploaded)
-                
-                if is_valid:
+                if report.is_valid:
                     st.success("Dataset validation passed! Your data is ready for analysis.")
                     df = df_processed
                     
@@ -322,9 +1213,11 @@ def run_analyze_data():
                 else:
                     st.error("Dataset validation failed. Please fix the following issues:")
                     
-                    for i, error in enumerate(error_messages, 1):
+                    for i, error in enumerate(report.messages, 1):
                         st.error(f"{i}. {error}")
                     
+                    display_validation_report(report, df_uploaded)
+                    
                     st.markdown("### How to Fix These Issues:")
                     
                     # Provide specific guidance based on error types
@@ -363,7 +1256,7 @@ def run_analyze_data():
                     
             except Exception as e:
                 st.error(f"Error reading file: {str(e)}")
-                st.info("Please ensure your file is a valid CSV format and try again.")
+                st.info("Please ensure your file is a valid CSV, Parquet or Arrow file and try again.")
                 st.markdown("""
                 **Common file issues:**
                 - File is not in CSV format
@@ -376,260 +1269,73 @@ def run_analyze_data():
                 return
         
         else:
-            st.info("Please upload a CSV file to begin analysis")
+            st.info("Please upload a CSV, Parquet or Arrow file to begin analysis")
             return
     
     # Continue with analysis only if we have valid data
     if df is not None and not df.empty:
-        # Calculate Control Quality Score
-        try:
-            df['Control Quality Score'] = df.apply(
-                lambda row: calculate_control_quality_score(
-                    row['Control Type'], 
-                    row['Key/Non-Key'], 
-                    row['Manual/Automated'], 
-                    row['Implementation Quality Rating']
-                ), axis=1
-            )
-        except Exception as e:
-            st.error(f"Error calculating Control Quality Score: {e}")
-            return
+        # Calculate Control Quality Score and Substantiation Method, unless done in parallel
+        if aggregates is None:
+            try:
+                df = score_dataset(fingerprint, df)
+            except Exception as e:
+                st.error(f"Error scoring controls: {e}")
+                return
+            perf.lap("scoring", rows=len(df), cache="score_dataset")
+            aggregates = aggregate_dataset(fingerprint, df)
+            perf.lap("aggregation", rows=len(df), cache="aggregate_dataset")
+
+        edit_mode = st.toggle(
+            "Edit controls",
+            help="Edit, add or delete controls; only the changed rows are re-validated and re-scored"
+        )
+        if edit_mode:
+            edits = get_edit_session(fingerprint, df, aggregates)
+            df, aggregates = edits.df, edits.aggregates
+            fingerprint = f"{fingerprint}:edit{edits.version}"
 
         # Show data summary
         st.divider()
         st.subheader("Dataset Summary")
         
-        col1, col2, col3, col4 = st.columns(4)
-        with col1:
-            st.metric("Total Controls", len(df))
-        with col2:
-            st.metric("Avg Quality Score", f"{df['Control Quality Score'].mean():.2f}")
-        with col3:
-            high_risk_pct = (len(df[df['Risk Level'] == 'High']) / len(df)) * 100
-            st.metric("High Risk %", f"{high_risk_pct:.1f}%")
-        with col4:
-            automation_pct = (len(df[df['Manual/Automated'] == 'Automated']) / len(df)) * 100
-            st.metric("Automation %", f"{automation_pct:.1f}%")
+        display_dataset_summary(aggregates)
 
         # Show visualizations
         st.subheader("Data Analysis")
 
         # Data table with option to view
         st.subheader("Data Table")
+        if edit_mode:
+            with st.expander("Edit Controls", expanded=True):
+                display_control_editor(edits)
         with st.expander("View Complete Dataset"):
-            st.dataframe(df, use_container_width=True)
+            index = build_table_index(fingerprint, df)
+            perf.lap("table index", rows=len(df), cache="build_table_index")
+            display_control_table(index)
             
-            # Download processed data option
-            csv_data = df.to_csv(index=False)
+            # Download processed data option; the file is only serialised when the button is clicked
+            export_format = st.selectbox(
+                "Export format",
+                options=list(FILE_MIME_TYPES),
+                format_func={"csv": "CSV", "parquet": "Parquet", "arrow": "Arrow IPC"}.get,
+                help="Parquet and Arrow keep the compact column types and are much smaller than CSV for large datasets"
+            )
             st.download_button(
                 label="Download Processed Data",
-                data=csv_data,
-                file_name="processed_control_data.csv",
-                mime="text/csv",
+                data=lambda: export_dataset(fingerprint, export_format, df),
+                file_name=f"processed_control_data.{export_format}",
+                mime=FILE_MIME_TYPES[export_format],
                 help="Download the processed dataset with calculated scores"
             )
-        
-        try:
-            # 1. Control Types Distribution Chart
-            st.subheader("Control Types Distribution")
-            st.markdown("""
-            **What this chart shows:** The distribution of Preventative vs Detective controls in your dataset.
-            
-            **Key insights:**
-            - **Preventative controls** are designed to prevent issues before they occur (e.g., authorization requirements, segregation of duties)
-            - **Detective controls** identify issues after they happen (e.g., reconciliations, monitoring reports)
-            - A balanced portfolio typically has more preventative controls, but the optimal mix depends on your risk appetite
-            """)
-            
-            control_counts = df['Control Type'].value_counts()
-            fig_bar = px.bar(
-                x=control_counts.index,
-                y=control_counts.values,
-                title="Distribution of Control Types",
-                labels={"x": "Control Type", "y": "Count"},
-                color=control_counts.index,
-                color_discrete_map={'Preventative': '#2E8B57', 'Detective': '#4682B4'}
-            )
-            fig_bar.update_layout(showlegend=False)
-            st.plotly_chart(fig_bar, use_container_width=True)
 
-            # 2. Risk Level Distribution Chart
-            st.subheader("Risk Level Distribution")
-            st.markdown("""
-            **What this chart shows:** The proportion of controls categorized by risk level across your control environment.
-            
-            **Key insights:**
-            - **High Risk** controls require more rigorous testing and monitoring due to their critical nature
-            - **Medium Risk** controls need regular attention but with less intensive procedures
-            - **Low Risk** controls can often be tested less frequently or with lighter procedures
-            - An organization with many high-risk controls may need to invest more in control strengthening
-            """)
-            
-            risk_counts = df['Risk Level'].value_counts()
-            fig_pie = px.pie(
-                values=risk_counts.values,
-                names=risk_counts.index,
-                title="Risk Level Distribution",
-                color_discrete_map={'High': '#DC143C', 'Medium': '#FF8C00', 'Low': '#32CD32'}
-            )
-            st.plotly_chart(fig_pie, use_container_width=True)
-
-            # 3. Control Quality Score Analysis
-            st.subheader("Average Control Quality Score by Type")
-            st.markdown("""
-            **What this chart shows:** The average Control Quality Score for each control type, helping identify which controls are performing better.
-            
-            **How Quality Score is calculated:**
-            - **Control Type:** Preventative (+5 points) vs Detective (+2 points)
-            - **Key vs Non-Key:** Key controls (+3 points) vs Non-Key (+1 point)
-            - **Automation:** Automated (+2 points) vs Manual (+1 point)
-            - **Implementation Quality:** Rating from 1-5 (adds 0-4 points)
-            
-            **Key insights:**
-            - Higher scores indicate more robust and reliable controls
-            - Preventative controls typically score higher due to their proactive nature
-            - Scores help prioritize improvement efforts and resource allocation
-            """)
-            
-            avg_scores = df.groupby('Control Type')['Control Quality Score'].mean().reset_index()
-            fig_quality = px.bar(
-                avg_scores,
-                x='Control Type',
-                y='Control Quality Score',
-                title="Average Control Quality Score by Type",
-                labels={"Control Quality Score": "Average Quality Score"},
-                color='Control Type',
-                color_discrete_map={'Preventative': '#2E8B57', 'Detective': '#4682B4'}
-            )
-            fig_quality.update_layout(showlegend=False)
-            st.plotly_chart(fig_quality, use_container_width=True)
-
-            # 4. Manual vs Automated Controls Distribution
-            st.subheader("Manual vs Automated Controls")
-            st.markdown("""
-            **What this chart shows:** The split between manual and automated controls in your environment.
-            
-            **Key insights:**
-            - **Automated controls** are generally more reliable and less prone to human error
-            - **Manual controls** offer flexibility but require more oversight and training
-            - Higher automation rates typically indicate a more mature control environment
-            - Consider automation opportunities for high-frequency or error-prone manual controls
-            """)
-            
-            automation_counts = df['Manual/Automated'].value_counts()
-            fig_automation = px.pie(
-                values=automation_counts.values,
-                names=automation_counts.index,
-                title="Manual vs Automated Controls Distribution",
-                color_discrete_map={'Automated': '#4CAF50', 'Manual': '#FF9800'}
-            )
-            st.plotly_chart(fig_automation, use_container_width=True)
-
-            # 5. Key vs Non-Key Controls Analysis
-            st.subheader("Key vs Non-Key Controls")
-            st.markdown("""
-            **What this chart shows:** The distribution of key controls versus non-key controls.
-            
-            **Key insights:**
-            - **Key controls** are critical for preventing or detecting material misstatements
-            - **Non-Key controls** provide additional layers of protection but are less critical
-            - Key controls require more rigorous testing and monitoring procedures
-            - A balanced approach ensures comprehensive coverage without over-testing
-            """)
-            
-            key_counts = df['Key/Non-Key'].value_counts()
-            fig_key = px.bar(
-                x=key_counts.index,
-                y=key_counts.values,
-                title="Key vs Non-Key Controls Distribution",
-                labels={"x": "Control Classification", "y": "Count"},
-                color=key_counts.index,
-                color_discrete_map={'Key': '#E91E63', 'Non-Key': '#9C27B0'}
-            )
-            fig_key.update_layout(showlegend=False)
-            st.plotly_chart(fig_key, use_container_width=True)
-
-            # Key metrics in a clean layout
-            st.subheader("Key Performance Indicators")
-            st.markdown("""
-            **Summary metrics** that provide quick insights into your control environment's overall health and characteristics.
-            """)
-            
-            col1, col2, col3, col4 = st.columns(4)
-            
-            with col1:
-                avg_quality = df['Control Quality Score'].mean()
-                st.metric(
-                    "Average Control Quality", 
-                    f"{avg_quality:.2f}",
-                    help="Higher scores indicate more robust controls (Range: 1-15)"
-                )
-                
-            with col2:
-                high_risk_count = len(df[df['Risk Level'] == 'High'])
-                high_risk_pct = (high_risk_count / len(df)) * 100
-                st.metric(
-                    "High Risk Controls", 
-                    f"{high_risk_count} ({high_risk_pct:.1f}%)",
-                    help="Number and percentage of high-risk controls requiring intensive monitoring"
-                )
-                
-            with col3:
-                automated_count = len(df[df['Manual/Automated'] == 'Automated'])
-                automation_rate = (automated_count / len(df)) * 100
-                st.metric(
-                    "Automation Rate", 
-                    f"{automation_rate:.1f}%",
-                    help="Percentage of controls that are automated (higher is generally better)"
-                )
-                
-            with col4:
-                key_controls = len(df[df['Key/Non-Key'] == 'Key'])
-                key_control_pct = (key_controls / len(df)) * 100
-                st.metric(
-                    "Key Controls", 
-                    f"{key_controls} ({key_control_pct:.1f}%)",
-                    help="Number and percentage of key controls critical for risk mitigation"
-                )
-
-            # Additional insights and recommendations
-            st.subheader("Insights & Recommendations")
-            
-            # Calculate some insights
-            total_controls = len(df)
-            preventative_pct = (len(df[df['Control Type'] == 'Preventative']) / total_controls) * 100
-            detective_pct = 100 - preventative_pct
-            
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                st.markdown("#### **Control Mix Analysis**")
-                if preventative_pct > 60:
-                    st.success(f"Good preventative control coverage ({preventative_pct:.1f}%)")
-                elif preventative_pct > 40:
-                    st.warning(f"Moderate preventative control coverage ({preventative_pct:.1f}%)")
-                else:
-                    st.error(f"Low preventative control coverage ({preventative_pct:.1f}%)")
-                
-                if automation_rate > 50:
-                    st.success(f"Good automation rate ({automation_rate:.1f}%)")
-                else:
-                    st.info(f"Consider increasing automation ({automation_rate:.1f}% current)")
-            
-            with col2:
-                st.markdown("#### **Risk Profile**")
-                if high_risk_pct > 30:
-                    st.warning(f"High proportion of high-risk controls ({high_risk_pct:.1f}%)")
-                    st.info("Consider control strengthening initiatives")
-                else:
-                    st.success(f"Balanced risk profile ({high_risk_pct:.1f}% high-risk)")
-                
-                if avg_quality < 8:
-                    st.warning("Below average control quality - focus on improvements")
-                elif avg_quality > 10:
-                    st.success("Strong overall control quality")
-                else:
-                    st.info("Moderate control quality - room for enhancement")
+        with st.expander("Save to Assessment Store"):
+            display_save_portfolio(df, portfolio_name)
+        with st.expander("What-if Simulation"):
+            display_what_if_simulation(fingerprint, df)
+        with st.expander("Test Plan"):
+            display_test_plan(fingerprint, df, aggregates)
+        perf.lap("data table")
 
-        except Exception as e:
-            st.error(f"Error creating visualizations: {e}")
+        figures = build_dashboard_figures(aggregates.digest(), aggregates)
+        perf.lap("chart building", cache="build_dashboard_figures")
+        display_dashboard(aggregates, figures)
@@ -0,0 +1,516 @@
+"""
+Persistent SQLite store of control assessments.
+
+Every scored dataset saved from the Analyze Data page and every single-control
+evaluation becomes a portfolio of assessment rows. The rows are indexed on Control ID,
+Risk Level, Control Type and assessment date, so stored portfolios are filtered, paged
+and aggregated with SQL instead of being loaded into pandas.
+
+Portfolios saved under the same name form a series of snapshots of one control
+inventory. Each new snapshot is compared with the latest known state of every control
+in its series when it is saved, so score changes and trend counts are written once and
+read back without re-scanning earlier snapshots.
+"""
+import datetime
+import functools
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+from application_pages.control_data import ControlAggregates
+from application_pages.scoring import SUBSTANTIATION_ATTRIBUTES
+
+# Where the store lives unless a path is given explicitly
+STORE_PATH_ENV_VAR = "CONTROL_QUALITY_STORE"
+DEFAULT_STORE_PATH = "control_assessments.sqlite3"
+
+# Rows per executemany call when saving a dataset
+WRITE_BATCH_SIZE = 50_000
+
+# Name of the portfolio collecting single-control evaluations
+EVALUATIONS_PORTFOLIO = "Single-control evaluations"
+
+# DataFrame column -> assessments table column
+STORE_COLUMNS = {
+    'Control ID': 'control_id',
+    'Control Type': 'control_type',
+    'Key/Non-Key': 'key_nonkey',
+    'Manual/Automated': 'manual_automated',
+    'Risk Level': 'risk_level',
+    'Implementation Quality Rating': 'implementation_quality_rating',
+    'Implementation Frequency': 'implementation_frequency',
+    'Design Quality Rating': 'design_quality_rating',
+    'Control Quality Score': 'control_quality_score',
+    'Substantiation Method': 'substantiation_method',
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS portfolios (
+    portfolio_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    source TEXT NOT NULL,
+    assessment_date TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS assessments (
+    portfolio_id INTEGER NOT NULL REFERENCES portfolios (portfolio_id) ON DELETE CASCADE,
+    assessment_date TEXT NOT NULL,
+    control_id TEXT NOT NULL,
+    control_type TEXT NOT NULL,
+    key_nonkey TEXT NOT NULL,
+    manual_automated TEXT NOT NULL,
+    risk_level TEXT NOT NULL,
+    implementation_quality_rating REAL NOT NULL,
+    implementation_frequency REAL,
+    design_quality_rating REAL,
+    control_quality_score REAL NOT NULL,
+    substantiation_method TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_assessments_portfolio_control ON assessments (portfolio_id, control_id);
+CREATE INDEX IF NOT EXISTS idx_assessments_control_date ON assessments (control_id, assessment_date);
+CREATE INDEX IF NOT EXISTS idx_assessments_risk_type ON assessments (portfolio_id, risk_level, control_type);
+CREATE TABLE IF NOT EXISTS portfolio_cells (
+    portfolio_id INTEGER NOT NULL REFERENCES portfolios (portfolio_id) ON DELETE CASCADE,
+    control_type TEXT NOT NULL,
+    key_nonkey TEXT NOT NULL,
+    manual_automated TEXT NOT NULL,
+    risk_level TEXT NOT NULL,
+    controls INTEGER NOT NULL,
+    score_sum REAL NOT NULL,
+    min_score REAL,
+    max_score REAL,
+    PRIMARY KEY (portfolio_id, control_type, key_nonkey, manual_automated, risk_level)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS control_state (
+    series TEXT NOT NULL,
+    control_id TEXT NOT NULL,
+    assessment_date TEXT NOT NULL,
+    control_quality_score REAL NOT NULL,
+    PRIMARY KEY (series, control_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS score_changes (
+    portfolio_id INTEGER NOT NULL REFERENCES portfolios (portfolio_id) ON DELETE CASCADE,
+    control_id TEXT NOT NULL,
+    control_type TEXT NOT NULL,
+    previous_date TEXT NOT NULL,
+    previous_score REAL NOT NULL,
+    control_quality_score REAL NOT NULL,
+    score_delta REAL NOT NULL,
+    PRIMARY KEY (portfolio_id, control_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_score_changes_delta ON score_changes (portfolio_id, score_delta);
+CREATE TABLE IF NOT EXISTS snapshot_trends (
+    portfolio_id INTEGER NOT NULL REFERENCES portfolios (portfolio_id) ON DELETE CASCADE,
+    control_type TEXT NOT NULL,
+    new_controls INTEGER NOT NULL,
+    improved INTEGER NOT NULL,
+    dropped INTEGER NOT NULL,
+    PRIMARY KEY (portfolio_id, control_type)
+) WITHOUT ROWID;
+"""
+
+def default_store_path():
+    return os.environ.get(STORE_PATH_ENV_VAR, DEFAULT_STORE_PATH)
+
+class AssessmentStore:
+    """
+    SQLite-backed store of scored control portfolios.
+
+    Next to the assessment rows, each portfolio keeps one portfolio_cells row per attribute
+    combination with its count, score total and score bounds. The cells are written in
+    the same transaction as the rows, so summaries never scan the assessments table.
+    Saving also ingests the portfolio as the next snapshot of its series (see
+    save_portfolio), maintaining control_state, score_changes and snapshot_trends.
+    One connection is shared by all Streamlit sessions; writes are serialised by a lock.
+
+    Args:
+        path (str, optional): Database file; defaults to $CONTROL_QUALITY_STORE or
+            control_assessments.sqlite3. Use ':memory:' for a throwaway store.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or default_store_path()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA foreign_keys=ON")
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _create_portfolio(self, name, source, assessment_date):
+        cursor = self._conn.execute(
+            "INSERT INTO portfolios (name, source, assessment_date, created_at) VALUES (?, ?, ?, ?)",
+            (name, source, _iso_date(assessment_date), datetime.datetime.now().isoformat(timespec="seconds")),
+        )
+        return cursor.lastrowid
+
+    def save_portfolio(self, df, name, assessment_date=None, source="dataset", batch_size=WRITE_BATCH_SIZE):
+        """
+        Writes a scored dataset as a new portfolio in one transaction.
+
+        The portfolio becomes the latest snapshot of the series of portfolios sharing its
+        name: every control is compared with its most recent earlier assessment in the
+        series, and the score changes and per-type trend counts are stored with it.
+        Snapshots must be saved in assessment date order; several on one date are kept
+        in the order they were saved.
+
+        Args:
+            df (pd.DataFrame): Validated controls with score and substantiation method columns.
+            name (str): Display name of the portfolio and key of its snapshot series.
+            assessment_date (date or str, optional): Defaults to today.
+            source (str): Where the portfolio came from, e.g. 'dataset'.
+            batch_size (int): Rows per executemany call.
+
+        Returns:
+            int: The new portfolio_id.
+
+        Raises:
+            ValueError: If the series already has a snapshot after assessment_date.
+        """
+        assessment_date = _iso_date(assessment_date)
+        columns = [col for col in STORE_COLUMNS if col in df.columns]
+        placeholders = ", ".join("?" * (len(columns) + 2))
+        sql = (f"INSERT INTO assessments (portfolio_id, assessment_date, "
+               f"{', '.join(STORE_COLUMNS[col] for col in columns)}) VALUES ({placeholders})")
+        with self._lock, self._conn:
+            latest = self._conn.execute(
+                "SELECT MAX(assessment_date) FROM portfolios WHERE name = ?", (name,)
+            ).fetchone()[0]
+            if latest is not None and assessment_date < latest:
+                raise ValueError(f"'{name}' already has a snapshot dated {latest}; "
+                                 f"snapshots must be saved in assessment date order")
+            portfolio_id = self._create_portfolio(name, source, assessment_date)
+            for start in range(0, len(df), batch_size):
+                batch = df.iloc[start:start + batch_size]
+                values = [_sql_values(batch[col]) for col in columns]
+                self._conn.executemany(
+                    sql, zip([portfolio_id] * len(batch), [assessment_date] * len(batch), *values)
+                )
+            self._write_cells(portfolio_id, df)
+            self._ingest_snapshot(portfolio_id, name)
+        return portfolio_id
+
+    def _ingest_snapshot(self, portfolio_id, series):
+        """
+        Compares a saved portfolio with the latest state of its series, then makes it the state.
+
+        The portfolio's rows and control_state are both keyed by Control ID, so each
+        query is one ordered pass over the new snapshot with primary-key lookups into
+        the state; earlier snapshots are never read.
+        """
+        self._conn.execute(
+            "INSERT INTO score_changes "
+            "SELECT a.portfolio_id, a.control_id, a.control_type, s.assessment_date, s.control_quality_score, "
+            "a.control_quality_score, a.control_quality_score - s.control_quality_score "
+            "FROM assessments a JOIN control_state s ON s.series = ? AND s.control_id = a.control_id "
+            "WHERE a.portfolio_id = ? AND a.control_quality_score != s.control_quality_score",
+            (series, portfolio_id),
+        )
+        self._conn.execute(
+            "INSERT INTO snapshot_trends "
+            "SELECT ?, a.control_type, SUM(s.control_id IS NULL), "
+            "COALESCE(SUM(a.control_quality_score > s.control_quality_score), 0), "
+            "COALESCE(SUM(a.control_quality_score < s.control_quality_score), 0) "
+            "FROM assessments a LEFT JOIN control_state s ON s.series = ? AND s.control_id = a.control_id "
+            "WHERE a.portfolio_id = ? GROUP BY a.control_type",
+            (portfolio_id, series, portfolio_id),
+        )
+        self._conn.execute(
+            "INSERT INTO control_state "
+            "SELECT ?, control_id, assessment_date, control_quality_score FROM assessments "
+            "WHERE portfolio_id = ? "
+            "ON CONFLICT DO UPDATE SET assessment_date = excluded.assessment_date, "
+            "control_quality_score = excluded.control_quality_score",
+            (series, portfolio_id),
+        )
+
+    def _rebuild_series(self, series):
+        """Re-ingests every snapshot of a series in order, e.g. after one was deleted."""
+        snapshots = [row[0] for row in self._conn.execute(
+            "SELECT portfolio_id FROM portfolios WHERE name = ? AND source != 'evaluation' "
+            "ORDER BY assessment_date, portfolio_id",
+            (series,),
+        )]
+        self._conn.execute("DELETE FROM control_state WHERE series = ?", (series,))
+        for portfolio_id in snapshots:
+            self._conn.execute("DELETE FROM score_changes WHERE portfolio_id = ?", (portfolio_id,))
+            self._conn.execute("DELETE FROM snapshot_trends WHERE portfolio_id = ?", (portfolio_id,))
+            self._ingest_snapshot(portfolio_id, series)
+
+    def _write_cells(self, portfolio_id, df):
+        """Adds the per-combination counts, score totals and bounds of df to a portfolio."""
+        scores = df['Control Quality Score']
+        cells = scores.groupby([df[col] for col in SUBSTANTIATION_ATTRIBUTES], observed=True).agg(
+            ["count", "sum", "min", "max"]
+        )
+        self._conn.executemany(
+            "INSERT INTO portfolio_cells VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT DO UPDATE SET controls = controls + excluded.controls, "
+            "score_sum = score_sum + excluded.score_sum, "
+            "min_score = MIN(min_score, excluded.min_score), max_score = MAX(max_score, excluded.max_score)",
+            [(portfolio_id, *map(str, cell), int(count), float(total), float(low), float(high))
+             for cell, (count, total, low, high) in cells.iterrows()],
+        )
+
+    def save_evaluation(self, control, assessment_date=None):
+        """
+        Appends one single-control evaluation to the evaluations portfolio.
+
+        Args:
+            control (dict): Control attributes keyed by DataFrame column name, including
+                'Control ID', 'Control Quality Score' and 'Substantiation Method'.
+            assessment_date (date or str, optional): Defaults to today.
+        """
+        assessment_date = _iso_date(assessment_date)
+        columns = [col for col in STORE_COLUMNS if col in control]
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT portfolio_id FROM portfolios WHERE source = 'evaluation' ORDER BY portfolio_id LIMIT 1"
+            ).fetchone()
+            portfolio_id = row[0] if row else self._create_portfolio(EVALUATIONS_PORTFOLIO, "evaluation",
+                                                                     assessment_date)
+            self._conn.execute(
+                f"INSERT INTO assessments (portfolio_id, assessment_date, "
+                f"{', '.join(STORE_COLUMNS[col] for col in columns)}) "
+                f"VALUES ({', '.join('?' * (len(columns) + 2))})",
+                [portfolio_id, assessment_date, *(control[col] for col in columns)],
+            )
+            self._write_cells(portfolio_id, pd.DataFrame([control]))
+
+    def delete_portfolio(self, portfolio_id):
+        """Deletes a portfolio; the later snapshots of its series are compared afresh."""
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT name, source FROM portfolios WHERE portfolio_id = ?", (portfolio_id,)
+            ).fetchone()
+            for table in ("assessments", "portfolio_cells", "score_changes", "snapshot_trends", "portfolios"):
+                self._conn.execute(f"DELETE FROM {table} WHERE portfolio_id = ?", (portfolio_id,))
+            if row is not None and row[1] != "evaluation":
+                self._rebuild_series(row[0])
+
+    def list_portfolios(self):
+        """Returns the stored portfolios, newest first, with their number of controls."""
+        rows = self._query(
+            "SELECT p.portfolio_id, p.name, p.source, p.assessment_date, p.created_at, "
+            "COALESCE((SELECT SUM(c.controls) FROM portfolio_cells c WHERE c.portfolio_id = p.portfolio_id), 0) "
+            "FROM portfolios p ORDER BY p.assessment_date DESC, p.portfolio_id DESC"
+        )
+        return pd.DataFrame(rows, columns=["portfolio_id", "name", "source", "assessment_date",
+                                           "created_at", "controls"])
+
+    def aggregate_portfolio(self, portfolio_id):
+        """
+        Summarises a stored portfolio from its attribute-combination cells.
+
+        Returns:
+            ControlAggregates: The same summary summarize_controls gives for the dataset.
+        """
+        rows = self._query(
+            "SELECT control_type, key_nonkey, manual_automated, risk_level, controls, score_sum "
+            "FROM portfolio_cells WHERE portfolio_id = ?",
+            (portfolio_id,),
+        )
+        aggregates = ControlAggregates()
+        for *attributes, count, score_sum in rows:
+            cell = tuple(values.index(value) for values, value in zip(SUBSTANTIATION_ATTRIBUTES.values(), attributes))
+            aggregates.counts[cell] = count
+            aggregates.score_sums[cell] = score_sum
+        return aggregates
+
+    def count_controls(self, portfolio_id, control_types=None, risk_levels=None, score_range=None, id_prefix=""):
+        """Number of controls of a portfolio matching the filters of query_portfolio."""
+        condition, params = _portfolio_filter(portfolio_id, control_types, risk_levels, score_range, id_prefix)
+        if score_range is None and not id_prefix:
+            # Only cell-level filters: count from the cells instead of the rows
+            return self._query(f"SELECT COALESCE(SUM(controls), 0) FROM portfolio_cells WHERE {condition}",
+                               params)[0][0]
+        return self._query(f"SELECT COUNT(*) FROM assessments WHERE {condition}", params)[0][0]
+
+    def query_portfolio(self, portfolio_id, control_types=None, risk_levels=None, score_range=None,
+                        id_prefix="", limit=100, offset=0):
+        """
+        Returns one page of a stored portfolio matching the filters, ordered by Control ID.
+
+        Args:
+            portfolio_id (int): The portfolio to read.
+            control_types (list, optional): Control Type values to keep; all if None.
+            risk_levels (list, optional): Risk Level values to keep; all if None.
+            score_range (tuple, optional): Inclusive (low, high) Control Quality Score bounds.
+            id_prefix (str): Keep only Control IDs starting with this text.
+            limit (int): Page size.
+            offset (int): Number of matching rows to skip.
+
+        Returns:
+            pd.DataFrame: The page, with the usual column names.
+        """
+        condition, params = _portfolio_filter(portfolio_id, control_types, risk_levels, score_range, id_prefix)
+        rows = self._query(
+            f"SELECT {', '.join(STORE_COLUMNS.values())} FROM assessments WHERE {condition} "
+            f"ORDER BY control_id LIMIT ? OFFSET ?",
+            [*params, limit, offset],
+        )
+        return pd.DataFrame(rows, columns=list(STORE_COLUMNS))
+
+    def score_bounds(self, portfolio_id):
+        """Lowest and highest Control Quality Score in a portfolio."""
+        return tuple(self._query(
+            "SELECT MIN(min_score), MAX(max_score) FROM portfolio_cells WHERE portfolio_id = ?",
+            (portfolio_id,),
+        )[0])
+
+    def list_series(self):
+        """Names of the snapshot series with their number of snapshots and latest date, most snapshots first."""
+        rows = self._query(
+            "SELECT name, COUNT(*), MIN(assessment_date), MAX(assessment_date) FROM portfolios "
+            "WHERE source != 'evaluation' GROUP BY name ORDER BY COUNT(*) DESC, MAX(assessment_date) DESC"
+        )
+        return pd.DataFrame(rows, columns=["series", "snapshots", "first_date", "latest_date"])
+
+    def trend(self, series):
+        """
+        Per-snapshot trend of a series by Control Type, read from the stored summaries.
+
+        Returns:
+            pd.DataFrame: One row per snapshot and Control Type, in date order, with the
+                number of controls, their average score and how many were new, improved
+                or dropped since the previous snapshot.
+        """
+        rows = self._query(
+            "SELECT p.portfolio_id, p.assessment_date, t.control_type, "
+            "(SELECT SUM(c.controls) FROM portfolio_cells c "
+            " WHERE c.portfolio_id = p.portfolio_id AND c.control_type = t.control_type), "
+            "(SELECT SUM(c.score_sum) FROM portfolio_cells c "
+            " WHERE c.portfolio_id = p.portfolio_id AND c.control_type = t.control_type), "
+            "t.new_controls, t.improved, t.dropped "
+            "FROM portfolios p JOIN snapshot_trends t ON t.portfolio_id = p.portfolio_id "
+            "WHERE p.name = ? ORDER BY p.assessment_date, p.portfolio_id, t.control_type",
+            (series,),
+        )
+        trend = pd.DataFrame(rows, columns=["portfolio_id", "assessment_date", "control_type", "controls",
+                                            "score_sum", "new_controls", "improved", "dropped"])
+        trend.insert(5, "average_score", trend.pop("score_sum") / trend["controls"])
+        return trend
+
+    def score_changes(self, portfolio_id, direction="dropped", limit=100):
+        """
+        Controls whose score changed since their previous assessment in the series.
+
+        Args:
+            portfolio_id (int): The snapshot.
+            direction (str): 'dropped' for the largest drops first, 'improved' for the
+                largest improvements first.
+            limit (int): Maximum number of controls returned.
+
+        Returns:
+            pd.DataFrame: Control ID, Control Type, previous date and score, current
+                score and the change.
+        """
+        if direction not in ("dropped", "improved"):
+            raise ValueError(f"direction must be 'dropped' or 'improved', not {direction!r}")
+        comparison, order = ("<", "ASC") if direction == "dropped" else (">", "DESC")
+        rows = self._query(
+            "SELECT control_id, control_type, previous_date, previous_score, control_quality_score, score_delta "
+            f"FROM score_changes WHERE portfolio_id = ? AND score_delta {comparison} 0 "
+            f"ORDER BY score_delta {order}, control_id LIMIT ?",
+            (portfolio_id, limit),
+        )
+        return pd.DataFrame(rows, columns=['Control ID', 'Control Type', 'Previous Date', 'Previous Score',
+                                           'Control Quality Score', 'Score Change'])
+
+    def controls_as_of(self, series, as_of, control_ids=None):
+        """
+        The latest assessment of each control of a series on or before a date.
+
+        Controls missing from later snapshots keep their last assessment, as in an
+        as-of join of the controls onto the snapshot dates.
+
+        Args:
+            series (str): Name of the snapshot series.
+            as_of (date or str): Assessments after this date are ignored.
+            control_ids (list, optional): Restrict the join to these controls.
+
+        Returns:
+            pd.DataFrame: One row per control, ordered by Control ID, with the usual
+                column names plus 'Assessment Date'.
+        """
+        as_of = _iso_date(as_of)
+        snapshots = [row[0] for row in self._query(
+            "SELECT portfolio_id FROM portfolios WHERE name = ? AND source != 'evaluation' "
+            "AND assessment_date <= ?",
+            (series, as_of),
+        )]
+        in_snapshots = f"IN ({', '.join('?' * len(snapshots))})"
+        if control_ids is None:
+            controls = f"SELECT DISTINCT control_id FROM assessments WHERE portfolio_id {in_snapshots}"
+            params = list(snapshots)
+        else:
+            controls = " UNION ".join(["SELECT ?"] * len(control_ids)) or "SELECT NULL WHERE 0"
+            params = list(control_ids)
+        # For each control, the correlated subquery reads its latest assessment up to the
+        # date backwards off the (control_id, assessment_date) index
+        rows = self._query(
+            f"WITH c (control_id) AS ({controls}) "
+            f"SELECT {', '.join(f'a.{column}' for column in STORE_COLUMNS.values())}, a.assessment_date "
+            f"FROM c JOIN assessments a ON a.rowid = ("
+            f"  SELECT b.rowid FROM assessments b "
+            f"  WHERE b.control_id = c.control_id AND b.assessment_date <= ? AND b.portfolio_id {in_snapshots} "
+            f"  ORDER BY b.assessment_date DESC, b.portfolio_id DESC LIMIT 1"
+            f") ORDER BY a.control_id",
+            [*params, as_of, *snapshots],
+        )
+        return pd.DataFrame(rows, columns=[*STORE_COLUMNS, 'Assessment Date'])
+
+    def control_history(self, series, control_id):
+        """Every assessment of one control in a series, oldest first."""
+        rows = self._query(
+            f"SELECT a.assessment_date, p.portfolio_id, "
+            f"{', '.join(f'a.{column}' for column in STORE_COLUMNS.values())} "
+            f"FROM assessments a JOIN portfolios p ON p.portfolio_id = a.portfolio_id "
+            f"WHERE a.control_id = ? AND p.name = ? AND p.source != 'evaluation' "
+            f"ORDER BY a.assessment_date, p.portfolio_id",
+            (control_id, series),
+        )
+        return pd.DataFrame(rows, columns=['Assessment Date', 'portfolio_id', *STORE_COLUMNS])
+
+@functools.lru_cache(maxsize=None)
+def open_store(path=None):
+    """Returns the process-wide AssessmentStore of a path, opening it on first use."""
+    return AssessmentStore(path)
+
+def _portfolio_filter(portfolio_id, control_types, risk_levels, score_range, id_prefix):
+    """SQL condition and parameters selecting the filtered controls of a portfolio."""
+    where, params = ["portfolio_id = ?"], [portfolio_id]
+    for column, values in (("control_type", control_types), ("risk_level", risk_levels)):
+        if values is not None:
+            where.append(f"{column} IN ({', '.join('?' * len(values))})" if values else "0")
+            params.extend(values)
+    if score_range is not None:
+        where.append("control_quality_score BETWEEN ? AND ?")
+        params.extend(score_range)
+    if id_prefix:
+        # A half-open range rather than LIKE, so the Control ID index is used
+        where.append("control_id >= ? AND control_id < ?")
+        params.extend([id_prefix, id_prefix + "\U0010ffff"])
+    return " AND ".join(where), params
+
+def _iso_date(value):
+    if value is None:
+        return datetime.date.today().isoformat()
+    return value.isoformat() if isinstance(value, (datetime.date, datetime.datetime)) else str(value)
+
+def _sql_values(series):
+    """Column values as Python objects sqlite3 can bind; categoricals become their labels."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return np.asarray(series.cat.categories, dtype=object)[series.cat.codes.to_numpy()].tolist()
+    return series.tolist()
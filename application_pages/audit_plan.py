@@ -0,0 +1,181 @@
+"""
+Budget-constrained test planning across a scored control portfolio.
+
+Testing a control by a substantiation method costs the method's estimated hours
+(EFFORT_HOURS of its SUBSTANTIATION_EFFORT) and yields assurance in proportion to the
+control's risk weight and the method's evidence reliability. Choosing at most one
+method per control within a total hours budget is a multiple-choice knapsack problem.
+
+All controls with the same Risk Level and Key/Non-Key classification share the same
+options, so the greedy solver works per class rather than per control: it takes the
+most efficient upgrades (untested to Inquiry, Inquiry to Examination, ...) of whole
+classes first, for as many of their controls as the budget allows. It is exact up to
+the last partially funded upgrade, and its linear-relaxation bound is reported with
+the plan. Within a class, the controls with the lowest Control Quality Score are
+tested first.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from application_pages.scoring import (
+    EFFORT_HOURS,
+    SUBSTANTIATION_ATTRIBUTES,
+    SUBSTANTIATION_EFFORT,
+    SUBSTANTIATION_METHODS,
+    SUBSTANTIATION_RELIABILITY,
+    category_codes,
+)
+
+# Assurance a test gives, as a share of a full re-performance of the same control
+RELIABILITY_ASSURANCE = {"Highest": 1.0, "Good": 0.7, "Moderate": 0.4}
+
+# Relative importance of assurance over a control
+RISK_WEIGHTS = {"High": 3, "Medium": 2, "Low": 1}
+KEY_WEIGHTS = {"Key": 2, "Non-Key": 1}
+
+NOT_TESTED = "Not Tested"
+PLANNED_METHODS = [NOT_TESTED, *SUBSTANTIATION_METHODS]
+
+@dataclass
+class TestPlan:
+    """
+    A test plan and how close it comes to the best achievable.
+
+    Attributes:
+        plan (pd.DataFrame): One row per control, aligned with the portfolio, with
+            'Planned Method', 'Planned Hours' and 'Assurance' columns.
+        budget (float): Testing hours available.
+        hours (float): Testing hours the plan uses.
+        assurance (float): Risk-weighted assurance of the plan.
+        upper_bound (float): No plan within the budget achieves more assurance.
+        max_assurance (float): Assurance of testing every control by its most reliable
+            method, whatever the budget.
+    """
+    __test__ = False  # not a pytest test class
+
+    plan: pd.DataFrame
+    budget: float
+    hours: float
+    assurance: float
+    upper_bound: float
+    max_assurance: float
+
+    def summary(self):
+        """Controls, hours and assurance per Risk Level and planned method."""
+        return self.plan.groupby(['Risk Level', 'Planned Method'], observed=True).agg(
+            Controls=('Planned Hours', 'size'),
+            Hours=('Planned Hours', 'sum'),
+            Assurance=('Assurance', 'sum'),
+        ).reset_index()
+
+def method_options():
+    """
+    The methods worth considering, cheapest first, on the upper convex hull of cost and reliability.
+
+    A method that costs at least as much as another but is no more reliable, or that is
+    never worth upgrading to before a more reliable one, is dropped.
+
+    Returns:
+        list[tuple]: (method, hours, assurance) per option, starting with NOT_TESTED.
+    """
+    options = [(NOT_TESTED, 0, 0.0)]
+    methods = sorted(SUBSTANTIATION_METHODS, key=lambda method: (
+        EFFORT_HOURS[SUBSTANTIATION_EFFORT[method]],
+        -RELIABILITY_ASSURANCE[SUBSTANTIATION_RELIABILITY[method]],
+    ))
+    for method in methods:
+        hours = EFFORT_HOURS[SUBSTANTIATION_EFFORT[method]]
+        assurance = RELIABILITY_ASSURANCE[SUBSTANTIATION_RELIABILITY[method]]
+        if assurance <= options[-1][2] or hours == options[-1][1]:
+            continue
+        # Drop earlier options whose upgrade is less efficient than skipping past them
+        while len(options) > 1 and (
+            (options[-1][2] - options[-2][2]) * (hours - options[-1][1])
+            <= (assurance - options[-1][2]) * (options[-1][1] - options[-2][1])
+        ):
+            options.pop()
+        options.append((method, hours, assurance))
+    return options
+
+def plan_testing(df, budget):
+    """
+    Chooses which controls to test, and by which method, to maximize risk-weighted assurance.
+
+    Args:
+        df (pd.DataFrame): Scored controls with 'Key/Non-Key', 'Risk Level' and
+            'Control Quality Score' columns.
+        budget (float): Testing hours available.
+
+    Returns:
+        TestPlan: The plan and its totals.
+
+    Raises:
+        ValueError: If the budget is negative or a control has an invalid attribute.
+    """
+    if budget < 0:
+        raise ValueError("Testing budget must not be negative")
+    options = method_options()
+    hours = np.array([option[1] for option in options], dtype=np.float64)
+    reliability = np.array([option[2] for option in options])
+
+    risk_codes = category_codes(df['Risk Level'], SUBSTANTIATION_ATTRIBUTES['Risk Level'])
+    key_codes = category_codes(df['Key/Non-Key'], SUBSTANTIATION_ATTRIBUTES['Key/Non-Key'])
+    if (risk_codes < 0).any() or (key_codes < 0).any():
+        raise ValueError("Every control needs a valid 'Risk Level' and 'Key/Non-Key' classification")
+    class_weights = np.multiply.outer(
+        [RISK_WEIGHTS[risk] for risk in SUBSTANTIATION_ATTRIBUTES['Risk Level']],
+        [KEY_WEIGHTS[key] for key in SUBSTANTIATION_ATTRIBUTES['Key/Non-Key']],
+    ).ravel()
+    classes = risk_codes * len(KEY_WEIGHTS) + key_codes
+    class_sizes = np.bincount(classes, minlength=len(class_weights))
+
+    # Every (class, upgrade) in order of assurance gained per hour; the hull makes each
+    # class's upgrades come in order
+    step_hours = np.diff(hours)
+    step_gains = np.outer(class_weights, np.diff(reliability))
+    efficiency = step_gains / step_hours
+    steps = sorted(np.ndindex(efficiency.shape), key=lambda step: (-efficiency[step], step[1]))
+
+    upgraded = np.zeros(efficiency.shape, dtype=np.int64)
+    remaining = float(budget)
+    assurance = 0.0
+    upper_bound = None
+    for class_code, step in steps:
+        eligible = class_sizes[class_code] if step == 0 else upgraded[class_code, step - 1]
+        funded = min(eligible, int(remaining // step_hours[step]))
+        if funded < eligible and upper_bound is None:
+            upper_bound = assurance + remaining / step_hours[step] * step_gains[class_code, step]
+        upgraded[class_code, step] = funded
+        remaining -= funded * step_hours[step]
+        assurance += funded * step_gains[class_code, step]
+
+    # Within each class, the weakest controls take the funded upgrades
+    order = np.lexsort((df['Control Quality Score'].to_numpy(), classes))
+    class_starts = np.concatenate([[0], np.cumsum(class_sizes)[:-1]])
+    rank = np.empty(len(df), dtype=np.int64)
+    rank[order] = np.arange(len(df)) - class_starts[classes[order]]
+    levels = (upgraded[classes] > rank[:, None]).sum(axis=1)
+
+    method_codes = category_codes([option[0] for option in options], PLANNED_METHODS)[levels]
+    plan = pd.DataFrame({
+        'Control ID': df['Control ID'].to_numpy() if 'Control ID' in df else np.arange(len(df)),
+        'Risk Level': df['Risk Level'].to_numpy(),
+        'Key/Non-Key': df['Key/Non-Key'].to_numpy(),
+        'Control Quality Score': df['Control Quality Score'].to_numpy(),
+        'Planned Method': pd.Categorical.from_codes(method_codes, categories=PLANNED_METHODS),
+        'Planned Hours': hours[levels],
+        'Assurance': class_weights[classes] * reliability[levels],
+    }, index=df.index)
+    if 'Substantiation Method' in df:
+        plan.insert(4, 'Suggested Method', df['Substantiation Method'].to_numpy())
+
+    return TestPlan(
+        plan=plan,
+        budget=float(budget),
+        hours=float(budget - remaining),
+        assurance=assurance,
+        upper_bound=assurance if upper_bound is None else upper_bound,
+        max_assurance=float(class_weights[classes].sum() * reliability[-1]),
+    )
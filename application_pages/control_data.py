@@ -0,0 +1,882 @@
+"""
+Data pipeline of the Control Effectiveness Evaluator: synthetic generation, validation,
+the compact schema, aggregation and chunked ingestion of control datasets.
+
+Depends on NumPy and pandas but not on Streamlit, so it can be used headless.
+"""
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass, field
+from typing import Optional
+
+from application_pages.scoring import (
+    EFFORT_HOURS,
+    SUBSTANTIATION_ATTRIBUTES,
+    SUBSTANTIATION_EFFORT,
+    SUBSTANTIATION_METHOD_TABLE,
+    SUBSTANTIATION_METHODS,
+    SUBSTANTIATION_TABLE_SHAPE,
+    category_codes,
+    score_controls,
+    suggest_substantiation_methods,
+)
+
+# Explicit dtypes for chunked CSV ingestion; unrecognised columns are skipped on read.
+# Ratings are read as text so that validation, not the parser, reports non-numeric cells
+CHUNK_DTYPES = {
+    "Control Type": "category",
+    "Key/Non-Key": "category",
+    "Manual/Automated": "category",
+    "Risk Level": "category",
+    "Implementation Quality Rating": "str",
+    "Implementation Frequency": "str",
+    "Design Quality Rating": "str",
+    "Control ID": "str",
+}
+DEFAULT_CHUNK_SIZE = 100_000
+MIN_RECORDS = 5
+
+# File formats accepted for upload and export, by file extension; Parquet and Arrow IPC need pyarrow
+FILE_EXTENSIONS = {"csv": "csv", "parquet": "parquet", "pq": "parquet", "arrow": "arrow", "feather": "arrow", "ipc": "arrow"}
+FILE_MIME_TYPES = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.file",
+}
+
+# Required columns and their expected data types
+REQUIRED_COLUMNS = {
+    'Control Type': 'categorical',
+    'Key/Non-Key': 'categorical',
+    'Manual/Automated': 'categorical',
+    'Risk Level': 'categorical',
+    'Implementation Quality Rating': 'numeric',
+    'Implementation Frequency': 'numeric',
+    'Design Quality Rating': 'numeric',
+    'Control ID': 'string'
+}
+
+# Expected values for categorical columns
+EXPECTED_VALUES = {
+    'Control Type': ['Preventative', 'Detective'],
+    'Key/Non-Key': ['Key', 'Non-Key'],
+    'Manual/Automated': ['Manual', 'Automated'],
+    'Risk Level': ['High', 'Medium', 'Low']
+}
+
+# Values drawn by generate_synthetic_control_data, in column order
+SYNTHETIC_VALUES = {
+    **EXPECTED_VALUES,
+    'Implementation Quality Rating': [1, 2, 3, 4, 5],
+    'Implementation Frequency': [1, 2, 3, 4, 5],
+    'Design Quality Rating': [1, 2, 3, 4, 5],
+}
+
+# Canonical compact in-memory schema of a control dataset: categorical attribute columns
+# over their fixed vocabularies and int8 ratings and score
+RATING_DTYPE = "int8"
+CONTROL_SCHEMA = {
+    **{col: pd.CategoricalDtype(values) for col, values in EXPECTED_VALUES.items()},
+    'Implementation Quality Rating': RATING_DTYPE,
+    'Implementation Frequency': RATING_DTYPE,
+    'Design Quality Rating': RATING_DTYPE,
+    'Control ID': "str",
+}
+
+def _normalized_probabilities(col, values, weights):
+    """Turns a {value: weight} mapping into probabilities ordered like values."""
+    unknown = set(weights) - set(values)
+    if unknown:
+        raise ValueError(f"Invalid values for '{col}': {sorted(unknown, key=str)}. Must be among {values}")
+    probabilities = np.array([weights.get(value, 0) for value in values], dtype=np.float64)
+    if (probabilities < 0).any() or probabilities.sum() <= 0:
+        raise ValueError(f"Weights for '{col}' must be non-negative and not all zero")
+    return probabilities / probabilities.sum()
+
+def generate_synthetic_control_data(num_records, seed=None, distributions=None):
+    """
+    Generates synthetic control data for simulation purposes.
+
+    Every column is drawn in one vectorized call on a numpy.random.Generator, so the
+    same seed always yields the same dataset and a million records take under a second
+    to produce.
+
+    Args:
+        num_records (int): Number of records to generate.
+        seed (int, optional): Seed of the random generator; fresh entropy if None.
+        distributions (dict, optional): Per-column {value: weight} mappings, e.g.
+            {"Control Type": {"Preventative": 0.7, "Detective": 0.3}}. Columns not
+            listed are drawn uniformly from their values in SYNTHETIC_VALUES.
+
+    Returns:
+        pd.DataFrame: A DataFrame containing synthetic control data, with categorical
+            dtypes for the attribute columns.
+    """
+    distributions = distributions or {}
+    unknown_columns = set(distributions) - set(SYNTHETIC_VALUES)
+    if unknown_columns:
+        raise ValueError(f"Unknown columns in distributions: {sorted(unknown_columns)}")
+
+    rng = np.random.default_rng(seed)
+    data = {}
+    for col, values in SYNTHETIC_VALUES.items():
+        probabilities = None
+        if col in distributions:
+            probabilities = _normalized_probabilities(col, values, distributions[col])
+        codes = rng.choice(len(values), size=num_records, p=probabilities)
+        if col in EXPECTED_VALUES:
+            data[col] = pd.Categorical.from_codes(codes, dtype=CONTROL_SCHEMA[col])
+        else:
+            data[col] = np.asarray(values, dtype=CONTROL_SCHEMA[col])[codes]
+
+    numbers = np.arange(1, num_records + 1).astype(str)
+    data["Control ID"] = np.char.add("CTRL_", np.char.zfill(numbers, 3))
+
+    return pd.DataFrame(data)
+
+def _compact_ratings(values):
+    """
+    Stores 1-5 ratings (or scores) as int8, or float32 when some are fractional.
+
+    Whole numbers outside the int8 range, such as scores under large custom weights,
+    are stored as int32 instead of wrapping around.
+    """
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.integer) or np.all(np.mod(values, 1) == 0):
+        limits = np.iinfo(RATING_DTYPE)
+        if values.size and (values.min() < limits.min or values.max() > limits.max):
+            return values.astype(np.int32)
+        return values.astype(RATING_DTYPE)
+    return values.astype(np.float32)
+
+def to_compact_schema(df):
+    """
+    Converts a validated control dataset to the compact CONTROL_SCHEMA.
+
+    Attribute columns become categoricals over their fixed vocabularies and ratings
+    become int8 (float32 if fractional); any other columns are kept as they are.
+
+    Args:
+        df (pd.DataFrame): Controls that passed validate_controls.
+
+    Returns:
+        pd.DataFrame: A new frame in the compact schema.
+    """
+    compact = {col: df[col].astype(CONTROL_SCHEMA[col]) for col in EXPECTED_VALUES}
+    for col, kind in REQUIRED_COLUMNS.items():
+        if kind == 'numeric':
+            compact[col] = _compact_ratings(pd.to_numeric(df[col]).to_numpy())
+    if 'Control Quality Score' in df.columns:
+        compact['Control Quality Score'] = _compact_ratings(df['Control Quality Score'].to_numpy())
+    return df.assign(**compact)
+
+# Validation rule identifiers used in ValidationReport
+RULE_EMPTY = "empty_dataset"
+RULE_MISSING_COLUMNS = "missing_columns"
+RULE_NULL = "null_values"
+RULE_NON_NUMERIC = "non_numeric"
+RULE_OUT_OF_RANGE = "out_of_range"
+RULE_INVALID_CATEGORY = "invalid_category"
+RULE_DUPLICATE_ID = "duplicate_id"
+RULE_TOO_FEW_RECORDS = "too_few_records"
+RULE_TOO_MANY_RECORDS = "too_many_records"
+
+@dataclass
+class ValidationIssue:
+    """One failed validation rule: how often it fired and the first offending rows."""
+
+    rule: str
+    column: Optional[str]
+    count: int
+    rows: list
+    message: str
+
+@dataclass
+class ValidationReport:
+    """Structured result of validate_controls."""
+
+    num_rows: int
+    issues: list = field(default_factory=list)
+
+    @property
+    def is_valid(self):
+        return not self.issues
+
+    @property
+    def messages(self):
+        return [issue.message for issue in self.issues]
+
+    def add(self, rule, column, mask_or_count, message, rows=()):
+        """Records an issue from a boolean row mask or a plain count, ignoring zero counts."""
+        count = int(mask_or_count) if np.isscalar(mask_or_count) else int(mask_or_count.sum())
+        if count:
+            self.issues.append(ValidationIssue(rule, column, count, list(rows), message.format(count=count)))
+
+    def to_frame(self):
+        """Returns the issues as a DataFrame with one row per failed rule."""
+        return pd.DataFrame(
+            [(issue.rule, issue.column, issue.count, issue.rows) for issue in self.issues],
+            columns=["Rule", "Column", "Count", "Example Rows"],
+        )
+
+def validate_controls(df, max_examples=100, min_records=MIN_RECORDS, max_records=None):
+    """
+    Validates a control dataset in one batched pass and returns a structured report.
+
+    Categorical columns are encoded against EXPECTED_VALUES into one code matrix and the
+    numeric columns are converted once into one float matrix, so each rule is a single
+    vectorized check over a matrix rather than a scan per column.
+
+    Args:
+        df (pd.DataFrame): The dataframe to validate
+        max_examples (int): Number of offending row indices to keep per rule
+        min_records (int): Minimum number of records required
+        max_records (int, optional): Maximum number of records allowed, unlimited if None
+
+    Returns:
+        tuple: (report, df_processed) where df_processed has numeric columns converted,
+            or is None when the report contains issues.
+    """
+    report = ValidationReport(num_rows=0 if df is None else len(df))
+    if df is None or df.empty:
+        report.add(RULE_EMPTY, None, 1, "Dataset is empty")
+        return report, None
+
+    missing_columns = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+    if missing_columns:
+        report.add(RULE_MISSING_COLUMNS, None, len(missing_columns),
+                   f"Missing required columns: {', '.join(missing_columns)}")
+        return report, None
+
+    index = df.index.to_numpy()
+
+    def examples(mask):
+        return index[np.flatnonzero(mask)[:max_examples]].tolist()
+
+    categorical_columns = list(EXPECTED_VALUES)
+    numeric_columns = [col for col, kind in REQUIRED_COLUMNS.items() if kind == 'numeric']
+
+    # One code matrix for the categoricals and one float matrix for the numerics
+    codes = np.column_stack([category_codes(df[col], EXPECTED_VALUES[col]) for col in categorical_columns])
+    converted = {col: pd.to_numeric(df[col], errors='coerce') for col in numeric_columns}
+    numbers = np.column_stack([converted[col].to_numpy(dtype=np.float64, na_value=np.nan) for col in numeric_columns])
+    nulls = df[categorical_columns + numeric_columns + ['Control ID']].isna().to_numpy()
+
+    categorical_nulls = nulls[:, :len(categorical_columns)]
+    numeric_nulls = nulls[:, len(categorical_columns):-1]
+    invalid_categories = (codes < 0) & ~categorical_nulls
+    non_numeric = np.isnan(numbers) & ~numeric_nulls
+    out_of_range = (numbers < 1) | (numbers > 5)
+    duplicates = df['Control ID'].duplicated().to_numpy() & ~nulls[:, -1]
+
+    for j, col in enumerate(categorical_columns + numeric_columns + ['Control ID']):
+        report.add(RULE_NULL, col, nulls[:, j], f"Column '{col}' contains {{count}} null values", examples(nulls[:, j]))
+        if col in EXPECTED_VALUES:
+            mask = invalid_categories[:, j]
+            if mask.any():
+                invalid_values = list(pd.unique(df[col].to_numpy()[mask]))
+                report.add(RULE_INVALID_CATEGORY, col, mask,
+                           f"Column '{col}' contains invalid values: {invalid_values}. Expected: {EXPECTED_VALUES[col]}",
+                           examples(mask))
+        elif col in converted:
+            k = numeric_columns.index(col)
+            report.add(RULE_NON_NUMERIC, col, non_numeric[:, k],
+                       f"Column '{col}' contains {{count}} non-numeric values", examples(non_numeric[:, k]))
+            report.add(RULE_OUT_OF_RANGE, col, out_of_range[:, k],
+                       f"Column '{col}' contains {{count}} values outside range 1-5", examples(out_of_range[:, k]))
+    report.add(RULE_DUPLICATE_ID, 'Control ID', duplicates,
+               "Column 'Control ID' contains {count} duplicate values", examples(duplicates))
+
+    # Additional business logic validations
+    if report.is_valid:
+        if len(df) < min_records:
+            report.add(RULE_TOO_FEW_RECORDS, None, 1, f"Dataset must contain at least {min_records} records")
+        if max_records is not None and len(df) > max_records:
+            report.add(RULE_TOO_MANY_RECORDS, None, 1,
+                       f"Dataset contains too many records (max {max_records:,}). Please reduce dataset size.")
+
+    if not report.is_valid:
+        return report, None
+
+    # Hand back the compact schema, reusing the codes and numbers computed above
+    compact = {
+        col: pd.Categorical.from_codes(codes[:, j], dtype=CONTROL_SCHEMA[col])
+        for j, col in enumerate(categorical_columns)
+    }
+    for k, col in enumerate(numeric_columns):
+        compact[col] = _compact_ratings(numbers[:, k])
+    return report, df.assign(**compact)
+
+def validate_uploaded_data(df, min_records=MIN_RECORDS, max_records=None):
+    """
+    Validates the uploaded dataset for required columns and data types.
+    
+    Args:
+        df (pd.DataFrame): The uploaded dataframe to validate
+        min_records (int): Minimum number of records required
+        max_records (int, optional): Maximum number of records allowed, unlimited if None
+    
+    Returns:
+        tuple: (is_valid, error_messages, df_processed)
+    """
+    report, df_processed = validate_controls(df, min_records=min_records, max_records=max_records)
+    return report.is_valid, report.messages, df_processed
+
+def summarize_testing_effort(method_counts):
+    """
+    Summarizes the substantiation method mix and its estimated testing effort.
+
+    Args:
+        method_counts (pd.Series): Number of controls per substantiation method.
+
+    Returns:
+        pd.DataFrame: One row per method with the number of controls, effort level,
+            estimated hours per control and total estimated hours.
+    """
+    counts = method_counts.reindex(SUBSTANTIATION_METHODS, fill_value=0)
+    summary = pd.DataFrame({
+        "Substantiation Method": SUBSTANTIATION_METHODS,
+        "Controls": counts.to_numpy(),
+        "Effort": [SUBSTANTIATION_EFFORT[method] for method in SUBSTANTIATION_METHODS],
+    })
+    summary["Hours per Control"] = summary["Effort"].map(EFFORT_HOURS)
+    summary["Estimated Hours"] = summary["Controls"] * summary["Hours per Control"]
+    return summary
+
+class ControlAggregates:
+    """
+    Running counts and score totals of a control portfolio, kept per attribute combination.
+
+    The state is one cell per Control Type x Key/Non-Key x Manual/Automated x Risk Level
+    combination, so it stays the same size however many rows are added and every
+    count, category mix and mean (including the substantiation method mix) can be
+    derived from it.
+    """
+
+    def __init__(self):
+        shape = SUBSTANTIATION_TABLE_SHAPE
+        self.counts = np.zeros(shape, dtype=np.int64)
+        self.score_sums = np.zeros(shape, dtype=np.float64)
+
+    def update(self, df, sign=1):
+        """
+        Adds a scored batch of controls to the running totals.
+
+        Args:
+            df (pd.DataFrame): Validated controls with a 'Control Quality Score' column.
+            sign (int): 1 to add the controls, -1 to take previously added controls out again.
+
+        Returns:
+            ControlAggregates: self, for chaining.
+        """
+        codes = [category_codes(df[col], values) for col, values in SUBSTANTIATION_ATTRIBUTES.items()]
+        flat_index = np.ravel_multi_index(codes, self.counts.shape)
+        size = self.counts.size
+        self.counts += sign * np.bincount(flat_index, minlength=size).reshape(self.counts.shape)
+        self.score_sums += sign * np.bincount(
+            flat_index, weights=df["Control Quality Score"].to_numpy(dtype=np.float64), minlength=size
+        ).reshape(self.counts.shape)
+        return self
+
+    def merge(self, other):
+        """Adds the totals of another ControlAggregates to this one and returns self."""
+        self.counts += other.counts
+        self.score_sums += other.score_sums
+        return self
+
+    def digest(self):
+        """Hash of the aggregate state; equal for any two datasets with the same summary."""
+        state = hashlib.blake2b(self.counts.tobytes(), digest_size=16)
+        state.update(self.score_sums.tobytes())
+        return state.hexdigest()
+
+    @property
+    def total(self):
+        return int(self.counts.sum())
+
+    @property
+    def mean_score(self):
+        return self.score_sums.sum() / self.total if self.total else float("nan")
+
+    def _axis(self, col):
+        return list(SUBSTANTIATION_ATTRIBUTES).index(col)
+
+    def _marginal(self, values, col):
+        other_axes = tuple(i for i in range(values.ndim) if i != self._axis(col))
+        return pd.Series(values.sum(axis=other_axes), index=SUBSTANTIATION_ATTRIBUTES[col])
+
+    def value_counts(self, col):
+        """Number of controls for each value of an attribute column."""
+        return self._marginal(self.counts, col).rename("Count")
+
+    def count(self, col, value):
+        """Number of controls whose attribute column equals value."""
+        return int(self.value_counts(col)[value])
+
+    def percentage(self, col, value):
+        """Percentage of controls whose attribute column equals value."""
+        return self.count(col, value) / self.total * 100 if self.total else 0.0
+
+    def mean_score_by(self, col):
+        """Average Control Quality Score for each value of an attribute column."""
+        counts = self._marginal(self.counts, col)
+        return (self._marginal(self.score_sums, col) / counts.where(counts > 0)).rename("Control Quality Score")
+
+    def as_dict(self):
+        """Returns the headline statistics as plain Python values, e.g. for a JSON summary."""
+        return {
+            "total_controls": self.total,
+            "mean_quality_score": round(float(self.mean_score), 4) if self.total else None,
+            "value_counts": {col: self.value_counts(col).astype(int).to_dict() for col in SUBSTANTIATION_ATTRIBUTES},
+            "mean_quality_score_by": {
+                col: {value: None if pd.isna(mean) else round(float(mean), 4)
+                      for value, mean in self.mean_score_by(col).items()}
+                for col in SUBSTANTIATION_ATTRIBUTES
+            },
+            "substantiation_methods": self.method_counts().astype(int).to_dict(),
+        }
+
+    def method_counts(self):
+        """Number of controls assigned to each substantiation method."""
+        methods = np.asarray(SUBSTANTIATION_METHOD_TABLE)
+        counts = self.counts.ravel()
+        return pd.Series(
+            [counts[methods == method].sum() for method in SUBSTANTIATION_METHODS],
+            index=SUBSTANTIATION_METHODS,
+            name="Count",
+        )
+
+def summarize_controls(df):
+    """
+    Aggregates a scored control dataset in a single grouped pass.
+
+    Rows are grouped by their attribute combination once; every count, percentage,
+    mean score and method mix shown on the Analyze Data page is then derived from the
+    resulting ControlAggregates rather than by filtering the frame again.
+
+    Args:
+        df (pd.DataFrame): Validated controls with a 'Control Quality Score' column.
+
+    Returns:
+        ControlAggregates: The summary of the dataset.
+    """
+    return ControlAggregates().update(df)
+
+class ControlTableIndex:
+    """
+    Row-position index over a scored dataset backing the paginated table view.
+
+    Filters are evaluated on category codes and score values, the Control ID prefix search
+    is a binary search over the sorted IDs, and each column's sort order is computed once
+    and reused, so a page request only materialises the rows that are displayed.
+
+    Args:
+        df (pd.DataFrame): Scored controls; treated as read-only.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        ids = df["Control ID"].to_numpy(dtype=str)
+        self._orders = {"Control ID": np.argsort(ids, kind="stable")}
+        self._sorted_ids = ids[self._orders["Control ID"]]
+        scores = df["Control Quality Score"]
+        self.score_bounds = tuple(scores.agg(["min", "max"]).tolist()) if len(df) else (0, 0)
+
+    def __len__(self):
+        return len(self.df)
+
+    def sort_order(self, column):
+        """Row positions of the whole dataset ordered by column, computed on first use."""
+        if column not in self._orders:
+            values = self.df[column]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                key = values.cat.codes.to_numpy()
+            else:
+                key = values.to_numpy()
+            self._orders[column] = np.argsort(key, kind="stable")
+        return self._orders[column]
+
+    def query(self, control_types=None, risk_levels=None, score_range=None, id_prefix="",
+              sort_by=None, descending=False):
+        """
+        Returns the positions of the rows matching every given filter, in display order.
+
+        Args:
+            control_types (list, optional): Control Type values to keep; all if None.
+            risk_levels (list, optional): Risk Level values to keep; all if None.
+            score_range (tuple, optional): Inclusive (low, high) Control Quality Score bounds.
+            id_prefix (str): Keep only Control IDs starting with this text.
+            sort_by (str, optional): Column to order by; dataset order if None.
+            descending (bool): Reverse the sort order.
+
+        Returns:
+            np.ndarray: Row positions into the indexed frame.
+        """
+        mask = np.ones(len(self.df), dtype=bool)
+        for col, wanted in (("Control Type", control_types), ("Risk Level", risk_levels)):
+            if wanted is not None:
+                codes = category_codes(self.df[col], EXPECTED_VALUES[col])
+                mask &= np.isin(codes, [EXPECTED_VALUES[col].index(value) for value in wanted])
+        if score_range is not None:
+            scores = self.df["Control Quality Score"].to_numpy()
+            mask &= (scores >= score_range[0]) & (scores <= score_range[1])
+        if id_prefix:
+            lo = np.searchsorted(self._sorted_ids, id_prefix, side="left")
+            hi = np.searchsorted(self._sorted_ids, id_prefix + "\U0010ffff", side="left")
+            prefix_mask = np.zeros_like(mask)
+            prefix_mask[self._orders["Control ID"][lo:hi]] = True
+            mask &= prefix_mask
+
+        if sort_by is None:
+            return np.flatnonzero(mask)
+        order = self.sort_order(sort_by)
+        if descending:
+            order = order[::-1]
+        return order[mask[order]]
+
+    def page(self, positions, page, page_size):
+        """The rows of one page (1-based) of a query result."""
+        return self.df.iloc[positions[(page - 1) * page_size:page * page_size]]
+
+class ControlEditSession:
+    """
+    An editable copy of a scored dataset that applies row edits, appends and deletions.
+
+    Only the touched rows are validated and scored again. Control ID uniqueness is checked
+    against a maintained ID -> row position hash index, and the aggregates are updated by
+    taking the old version of each touched row out and adding the new one.
+
+    Args:
+        df (pd.DataFrame): Scored controls in the compact schema; copied, not modified.
+        aggregates (ControlAggregates, optional): Summary of df; computed if None.
+    """
+
+    def __init__(self, df, aggregates=None):
+        self.df = df.reset_index(drop=True)
+        self.aggregates = ControlAggregates().merge(aggregates or summarize_controls(df))
+        self._positions = dict(zip(self.df["Control ID"].tolist(), range(len(self.df))))
+        self.version = 0
+
+    def apply_changes(self, edited_rows=None, added_rows=(), deleted_rows=()):
+        """
+        Validates and applies one batch of changes, all or nothing.
+
+        The arguments follow the change format of st.data_editor, with row positions
+        referring to self.df.
+
+        Args:
+            edited_rows (dict, optional): {row position: {column: new value}}.
+            added_rows (list): New rows as {column: value} dicts.
+            deleted_rows (list): Row positions to delete.
+
+        Returns:
+            ValidationReport: The issues found in the touched rows; nothing is applied unless it is valid.
+        """
+        edited_rows = {int(pos): values for pos, values in (edited_rows or {}).items()}
+        deleted = set(int(pos) for pos in deleted_rows)
+        edited_positions = [pos for pos in sorted(edited_rows) if pos not in deleted]
+
+        # The touched rows in their raw form, labelled by the position they will have
+        edited = self.df.iloc[edited_positions].astype(object)
+        for pos in edited_positions:
+            for col, value in edited_rows[pos].items():
+                edited.loc[pos, col] = value
+        added = pd.DataFrame.from_records(list(added_rows), columns=list(REQUIRED_COLUMNS))
+        added.index = pd.RangeIndex(len(self.df), len(self.df) + len(added))
+        candidates = pd.concat([edited[list(REQUIRED_COLUMNS)], added])
+
+        report = ValidationReport(num_rows=len(candidates))
+        if not candidates.empty:
+            report, candidates = validate_controls(candidates, min_records=0)
+        if candidates is not None and not candidates.empty:
+            touched = set(edited_positions) | deleted
+            clashes = np.array([
+                self._positions.get(control_id, -1) not in touched | {-1}
+                for control_id in candidates["Control ID"]
+            ])
+            report.add(RULE_DUPLICATE_ID, 'Control ID', clashes,
+                       "Column 'Control ID' contains {count} values already used by other controls",
+                       candidates.index[clashes].tolist())
+        if len(self.df) - len(deleted) + len(added) < MIN_RECORDS:
+            report.add(RULE_TOO_FEW_RECORDS, None, 1, f"Dataset must contain at least {MIN_RECORDS} records")
+        if not report.is_valid:
+            return report
+
+        # The new totals are worked out on a copy, so a failure leaves the session as it was
+        aggregates = ControlAggregates().merge(self.aggregates)
+        aggregates.update(self.df.iloc[edited_positions + sorted(deleted)], sign=-1)
+        if not candidates.empty:
+            candidates = candidates.assign(**{
+                'Control Quality Score': score_controls(candidates),
+                'Substantiation Method': suggest_substantiation_methods(candidates),
+            })
+            aggregates.update(candidates)
+
+            # Widen numeric columns if the new rows need it, e.g. a fractional rating
+            for col in candidates.columns:
+                if pd.api.types.is_numeric_dtype(self.df[col]) and candidates[col].dtype != self.df[col].dtype:
+                    dtype = np.promote_types(self.df[col].dtype, candidates[col].dtype)
+                    self.df[col] = self.df[col].astype(dtype)
+                    candidates[col] = candidates[col].astype(dtype)
+            candidates["Control ID"] = candidates["Control ID"].astype(self.df["Control ID"].dtype)
+        self.aggregates = aggregates
+
+        if edited_positions:
+            new_edited = candidates.loc[edited_positions]
+            for pos in edited_positions:
+                del self._positions[self.df.at[pos, "Control ID"]]
+            for col in new_edited.columns:
+                self.df.iloc[edited_positions, self.df.columns.get_loc(col)] = new_edited[col].to_numpy()
+            self._positions.update(zip(new_edited["Control ID"], edited_positions))
+        if not added.empty:
+            new_added = candidates.loc[added.index, self.df.columns]
+            self.df = pd.concat([self.df, new_added])
+            self._positions.update(zip(new_added["Control ID"], new_added.index))
+        if deleted:
+            self.df = self.df.drop(index=sorted(deleted)).reset_index(drop=True)
+            self._positions = dict(zip(self.df["Control ID"].tolist(), range(len(self.df))))
+        self.version += 1
+        return report
+
+def detect_file_format(name, fmt=None):
+    """
+    Returns the file format given explicitly or implied by the file extension.
+
+    Args:
+        name (str): File name or path.
+        fmt (str, optional): Explicit format, one of FILE_MIME_TYPES.
+
+    Returns:
+        str: 'csv', 'parquet' or 'arrow'.
+
+    Raises:
+        ValueError: If the format is not supported.
+    """
+    fmt = fmt or FILE_EXTENSIONS.get(os.path.splitext(name)[1].lstrip(".").lower())
+    if fmt not in FILE_MIME_TYPES:
+        raise ValueError(f"Unsupported file format for '{name}'. Use one of: {', '.join(sorted(FILE_EXTENSIONS))}")
+    return fmt
+
+def _import_pyarrow():
+    """Imports pyarrow on first use of a Parquet or Arrow IPC path."""
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("Parquet and Arrow IPC support requires the 'pyarrow' package") from e
+    return pyarrow
+
+def _projected_columns(names, columns):
+    return [name for name in names if name in columns]
+
+def read_control_file(source, fmt="csv", columns=None):
+    """
+    Reads a whole control file, keeping only the columns the app uses.
+
+    Parquet and Arrow IPC columns are projected before they are read and converted
+    without an intermediate copy; dictionary-encoded columns arrive as categoricals and
+    int8 columns stay int8, so they pass straight into the compact schema.
+
+    Args:
+        source: Path or file-like object.
+        fmt (str): 'csv', 'parquet' or 'arrow'.
+        columns (Iterable[str], optional): Columns to read; REQUIRED_COLUMNS by default.
+
+    Returns:
+        pd.DataFrame: The projected file contents.
+    """
+    columns = set(REQUIRED_COLUMNS if columns is None else columns)
+    if fmt == "csv":
+        return pd.read_csv(source, usecols=lambda col: col in columns)
+
+    pa = _import_pyarrow()
+    if fmt == "parquet":
+        parquet_file = pa.parquet.ParquetFile(source)
+        table = parquet_file.read(columns=_projected_columns(parquet_file.schema_arrow.names, columns))
+    else:
+        reader = pa.ipc.open_file(source)
+        table = reader.read_all().select(_projected_columns(reader.schema.names, columns))
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+# Columns written as float32 to Parquet and Arrow IPC, whatever their in-memory dtype
+EXPORT_FLOAT_COLUMNS = [col for col, kind in REQUIRED_COLUMNS.items() if kind == 'numeric'] + ['Control Quality Score']
+
+class ControlFileWriter:
+    """
+    Appends control chunks to a CSV, Parquet or Arrow IPC file as they arrive.
+
+    Parquet gets one row group and Arrow IPC one record batch per chunk, so a dataset is
+    never serialised in one piece. Usable directly as the on_chunk callback of
+    ingest_control_chunks.
+
+    The compact schema stores ratings as int8 or float32 depending on the values of each
+    chunk, so Parquet and Arrow IPC files always hold the ratings and the score as
+    float32 (EXPORT_FLOAT_COLUMNS), and every chunk is written with the first chunk's schema.
+
+    Args:
+        sink: Path or binary file-like object to write to.
+        fmt (str): 'csv', 'parquet' or 'arrow'.
+    """
+
+    def __init__(self, sink, fmt="csv"):
+        self.fmt = fmt
+        self._owns_file = isinstance(sink, (str, os.PathLike))
+        self._file = open(sink, "wb") if self._owns_file else sink
+        self._arrow_writer = None
+        self._schema = None
+        self._rows_written = 0
+
+    def __call__(self, chunk):
+        if self.fmt == "csv":
+            self._file.write(chunk.to_csv(index=False, header=self._rows_written == 0).encode("utf-8"))
+        else:
+            pa = _import_pyarrow()
+            chunk = chunk.astype({col: np.float32 for col in EXPORT_FLOAT_COLUMNS if col in chunk.columns})
+            table = pa.Table.from_pandas(chunk, schema=self._schema, preserve_index=False)
+            if self._arrow_writer is None:
+                self._schema = table.schema
+                if self.fmt == "parquet":
+                    self._arrow_writer = pa.parquet.ParquetWriter(self._file, table.schema)
+                else:
+                    self._arrow_writer = pa.ipc.new_file(self._file, table.schema)
+            self._arrow_writer.write_table(table)
+        self._rows_written += len(chunk)
+
+    def close(self):
+        if self._arrow_writer is not None:
+            self._arrow_writer.close()
+            self._arrow_writer = None
+        if self._owns_file:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def write_control_file(df, fmt="csv", chunksize=DEFAULT_CHUNK_SIZE):
+    """
+    Serialises a control dataset to CSV, Parquet or Arrow IPC bytes.
+
+    The rows are written chunksize at a time through a temporary file, so apart from the
+    returned bytes no full-size copy of the export is held in memory.
+
+    Args:
+        df (pd.DataFrame): The dataset to export.
+        fmt (str): 'csv', 'parquet' or 'arrow'.
+        chunksize (int): Number of rows serialised at a time.
+
+    Returns:
+        bytes: The file contents.
+    """
+    with tempfile.TemporaryFile() as spool:
+        with ControlFileWriter(spool, fmt) as writer:
+            for start in range(0, max(len(df), 1), chunksize):
+                writer(df.iloc[start:start + chunksize])
+        spool.seek(0)
+        return spool.read()
+
+def iter_control_chunks(source, chunksize=DEFAULT_CHUNK_SIZE, fmt="csv"):
+    """
+    Reads a control file lazily in chunks, keeping only the CHUNK_DTYPES columns.
+
+    CSV chunks are parsed with the explicit CHUNK_DTYPES; Parquet is read in record
+    batches of chunksize rows and Arrow IPC one stored record batch at a time.
+
+    Args:
+        source: Path or file-like object holding the file.
+        chunksize (int): Number of rows per chunk.
+        fmt (str): 'csv', 'parquet' or 'arrow'.
+
+    Returns:
+        Iterator[pd.DataFrame]: The chunks of the file, in order.
+    """
+    if fmt == "csv":
+        return pd.read_csv(
+            source,
+            dtype=CHUNK_DTYPES,
+            usecols=lambda col: col in CHUNK_DTYPES,
+            chunksize=chunksize,
+        )
+
+    pa = _import_pyarrow()
+    if fmt == "parquet":
+        parquet_file = pa.parquet.ParquetFile(source)
+        columns = _projected_columns(parquet_file.schema_arrow.names, CHUNK_DTYPES)
+        batches = parquet_file.iter_batches(batch_size=chunksize, columns=columns)
+    else:
+        reader = pa.ipc.open_file(source)
+        columns = _projected_columns(reader.schema.names, CHUNK_DTYPES)
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+    return (pa.Table.from_batches([batch]).select(columns).to_pandas() for batch in batches)
+
+def ingest_control_chunks(chunks, on_progress=None, on_chunk=None):
+    """
+    Streams control chunks through validation and scoring, keeping only running aggregates.
+
+    Each chunk is validated with validate_uploaded_data, checked for Control IDs already
+    seen in earlier chunks, scored and folded into a ControlAggregates, so memory is
+    bounded by the chunk size plus the set of Control IDs. Ingestion stops at the first
+    invalid chunk.
+
+    Args:
+        chunks (Iterable[pd.DataFrame]): The dataset, in order, one chunk at a time.
+        on_progress (callable, optional): Called with the number of rows processed so far
+            after each chunk.
+        on_chunk (callable, optional): Called with each validated chunk once it has its
+            'Control Quality Score' and 'Substantiation Method' columns.
+
+    Returns:
+        tuple: (is_valid, error_messages, aggregates)
+    """
+    aggregates = ControlAggregates()
+    seen_ids = set()
+    rows_read = 0
+
+    for chunk in chunks:
+        first_row = rows_read + 1
+        rows_read += len(chunk)
+        is_valid, error_messages, chunk = validate_uploaded_data(chunk, min_records=0)
+        if is_valid:
+            ids_before = len(seen_ids)
+            seen_ids.update(chunk["Control ID"])
+            duplicate_count = len(chunk) - (len(seen_ids) - ids_before)
+            if duplicate_count > 0:
+                is_valid = False
+                error_messages = [f"Column 'Control ID' contains {duplicate_count} values already used in earlier rows"]
+        if not is_valid:
+            return False, [f"Rows {first_row:,}-{rows_read:,}: {error}" for error in error_messages], aggregates
+
+        chunk["Control Quality Score"] = score_controls(chunk)
+        chunk["Substantiation Method"] = suggest_substantiation_methods(chunk)
+        aggregates.update(chunk)
+        if on_chunk is not None:
+            on_chunk(chunk)
+        if on_progress is not None:
+            on_progress(rows_read)
+
+    if rows_read < MIN_RECORDS:
+        return False, [f"Dataset must contain at least {MIN_RECORDS} records"], aggregates
+    return True, [], aggregates
+
+def ingest_control_data(source, chunksize=DEFAULT_CHUNK_SIZE, on_progress=None, fmt="csv"):
+    """
+    Streams a control file through validation and scoring with ingest_control_chunks.
+
+    Args:
+        source: Path or file-like object holding the file.
+        chunksize (int): Number of rows per chunk.
+        on_progress (callable, optional): Called with the number of rows processed so far
+            after each chunk.
+        fmt (str): 'csv', 'parquet' or 'arrow'.
+
+    Returns:
+        tuple: (is_valid, error_messages, aggregates)
+    """
+    return ingest_control_chunks(iter_control_chunks(source, chunksize, fmt), on_progress=on_progress)
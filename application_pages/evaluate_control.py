@@ -1,8 +1,74 @@
 
+import math
+
 import streamlit as st
-from application_pages.analyze_data import calculate_control_quality_score, suggest_substantiation_method
+from application_pages.assessment_store import open_store
+from application_pages.evaluation import benchmark_scores, evaluation_frame, lookup_evaluation, score_bands
+from application_pages.performance import start_performance_recording
+from application_pages.scoring import SUBSTANTIATION_EFFORT, SUBSTANTIATION_RELIABILITY, current_weights
+
+# How each score rating and benchmark standing is shown
+RATING_DISPLAY = {"Excellent": (st.success, "🌟"), "Good": (st.info, "✅"), "Fair": (st.warning, "⚠️"),
+                  "Poor": (st.error, "❌")}
+BENCHMARK_DISPLAY = {"Exceeds best practice": st.success, "Above average": st.info,
+                     "Meets minimum standards": st.warning, "Below minimum standards": st.error}
+
+# Marker of each rating band in the methodology text
+RATING_MARKERS = {"Excellent": "🟢", "Good": "🟡", "Fair": "🟠", "Poor": "🔴"}
+
+# Labels of the weighted attributes in the methodology table
+WEIGHT_LABELS = {"Control Type": "Control Type", "Key/Non-Key": "Key Classification",
+                 "Manual/Automated": "Automation Level"}
+
+@st.cache_data(show_spinner=False)
+def build_evaluation_table_csv(weights_version):
+    """The evaluations of all attribute combinations as CSV bytes, once per weights version."""
+    return evaluation_frame().to_csv(index=False).encode("utf-8")
+
+def weights_table_rows(weights):
+    """Markdown table rows describing the points awarded by the current scoring weights."""
+    rows = []
+    for col, label in WEIGHT_LABELS.items():
+        points = weights.points[col]
+        details = ", ".join(f"{value} ({value_points:+g})"
+                            for value, value_points in sorted(points.items(), key=lambda item: -item[1]))
+        rows.append(f"| **{label}** | {min(points.values()):+g} to {max(points.values()):+g} | {details} |")
+    low, high = sorted((0, 4 * weights.rating_points))
+    rows.append(f"| **Implementation Quality** | {low:+g} to {high:+g} | Rating 1-5 (adds {low:g}-{high:g} points) |")
+    return rows
+
+def rating_band_lines(weights):
+    """Markdown list items giving the score range of each rating band under the weights."""
+    low, high = weights.score_range
+    whole_scores = all(float(points).is_integer() for points in (*weights.base_points, weights.rating_points))
+    lines = []
+    upper = None
+    for minimum, rating, description in score_bands(weights):
+        minimum = max(minimum, low)
+        if whole_scores:
+            # Whole-number scores: list the first and last score in the band
+            first, last = math.ceil(minimum), high if upper is None else math.ceil(upper) - 1
+            scores = f"{first:g}-{last:g}"
+        else:
+            scores = f"{minimum:g}-{high:g}" if upper is None else f"{minimum:g} to under {upper:g}"
+        lines.append(f"- {RATING_MARKERS[rating]} **{scores}**: {rating} ({description})")
+        upper = minimum
+    return lines
 
 def run_evaluate_control():
+    perf = start_performance_recording("Evaluate Control")
+    try:
+        evaluate_control_page(perf)
+    finally:
+        perf.finish()
+
+def evaluate_control_page(perf):
+    """
+    Renders the Evaluate Control page.
+
+    Args:
+        perf (PerformanceRecorder): Receives a lap at the end of each stage.
+    """
     st.header("Evaluate Control")
     
     # Add comprehensive introduction
@@ -19,24 +85,22 @@ def run_evaluate_control():
     """)
     
     # Add expandable methodology section
+    weights = current_weights()
+    low, high = weights.score_range
+    weights_table = "\n        ".join(weights_table_rows(weights))
+    rating_bands = "\n        ".join(rating_band_lines(weights))
     with st.expander("**Methodology & Scoring Guide**", expanded=False):
-        st.markdown("""
+        st.markdown(f"""
         ### Control Quality Score Calculation
         
         The Control Quality Score is calculated using a weighted scoring system:
         
         | **Attribute** | **Score Range** | **Details** |
         |---------------|-----------------|-------------|
-        | **Control Type** | +2 to +5 | Preventative (+5), Detective (+2) |
-        | **Key Classification** | +1 to +3 | Key (+3), Non-Key (+1) |
-        | **Automation Level** | +1 to +2 | Automated (+2), Manual (+1) |
-        | **Implementation Quality** | +0 to +4 | Rating 1-5 (adds 0-4 points) |
+        {weights_table}
         
-        **Total Score Range: 4-14 points**
-        - 🟢 **12-14**: Excellent (Strong, well-designed controls)
-        - 🟡 **8-11**: Good (Solid controls with minor improvements needed)
-        - 🟠 **6-7**: Fair (Moderate effectiveness, improvement recommended)
-        - 🔴 **4-5**: Poor (Significant weaknesses, immediate attention required)
+        **Total Score Range: {low:g}-{high:g} points**
+        {rating_bands}
         
         ### Substantiation Method Selection
         
@@ -142,11 +206,39 @@ def run_evaluate_control():
     
     st.divider()
     
+    # Optionally keep the evaluation in the assessment store
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        control_id = st.text_input("Control ID", placeholder="e.g. CTRL_001",
+                                   help="Identifies the control in the assessment store")
+    with col2:
+        save_evaluation = st.toggle("Save to assessment store", disabled=not control_id.strip(),
+                                    help="Enter a Control ID to keep this evaluation for later analysis")
+    
     # Enhanced calculation section
-    if st.button("**Calculate Score & Substantiation Method**", type="primary"):
+    calculate = st.button("**Calculate Score & Substantiation Method**", type="primary")
+    perf.lap("input form")
+    if calculate:
         try:
-            control_quality_score = calculate_control_quality_score(control_type, key_nonkey, manual_automated, implementation_quality_rating)
-            substantiation_method = suggest_substantiation_method(control_type, key_nonkey, manual_automated, risk_level)
+            evaluation = lookup_evaluation(control_type, key_nonkey, manual_automated, risk_level,
+                                           implementation_quality_rating)
+            control_quality_score = evaluation.control_quality_score
+            substantiation_method = evaluation.substantiation_method
+            perf.lap("scoring", rows=1)
+            
+            if save_evaluation and control_id.strip():
+                open_store().save_evaluation({
+                    'Control ID': control_id.strip(),
+                    'Control Type': control_type,
+                    'Key/Non-Key': key_nonkey,
+                    'Manual/Automated': manual_automated,
+                    'Risk Level': risk_level,
+                    'Implementation Quality Rating': implementation_quality_rating,
+                    'Control Quality Score': control_quality_score,
+                    'Substantiation Method': substantiation_method,
+                })
+                st.toast(f"Saved the evaluation of {control_id.strip()} to the assessment store")
+                perf.lap("store write", rows=1)
             
             st.divider()
             st.subheader("**Evaluation Results**")
@@ -157,32 +249,16 @@ def run_evaluate_control():
             with col1:
                 st.markdown("#### **Control Quality Score**")
                 
-                # Color-code the score based on ranges
-                if control_quality_score >= 12:
-                    st.success(f"**Score: {control_quality_score}/14** 🌟")
-                    st.success("**Rating: Excellent** - Strong, well-designed control")
-                elif control_quality_score >= 8:
-                    st.info(f"**Score: {control_quality_score}/14** ✅")
-                    st.info("**Rating: Good** - Solid control with minor improvements needed")
-                elif control_quality_score >= 6:
-                    st.warning(f"**Score: {control_quality_score}/14** ⚠️")
-                    st.warning("**Rating: Fair** - Moderate effectiveness, improvement recommended")
-                else:
-                    st.error(f"**Score: {control_quality_score}/14** ❌")
-                    st.error("**Rating: Poor** - Significant weaknesses, immediate attention required")
+                # Color-code the score based on its rating
+                show, icon = RATING_DISPLAY[evaluation.rating]
+                show(f"**Score: {control_quality_score:g}/{high:g}** {icon}")
+                show(f"**Rating: {evaluation.rating}** - {evaluation.rating_description}")
                 
                 # Score breakdown
                 with st.expander("**Score Breakdown**"):
-                    control_points = 5 if control_type == "Preventative" else 2
-                    key_points = 3 if key_nonkey == "Key" else 1
-                    auto_points = 2 if manual_automated == "Automated" else 1
-                    impl_points = implementation_quality_rating - 1
-                    
-                    st.write(f"• **Control Type ({control_type}):** +{control_points} points")
-                    st.write(f"• **Classification ({key_nonkey}):** +{key_points} points")
-                    st.write(f"• **Execution ({manual_automated}):** +{auto_points} points")
-                    st.write(f"• **Implementation Quality:** +{impl_points} points")
-                    st.write(f"**Total Score:** {control_quality_score} points")
+                    for component, points in evaluation.breakdown:
+                        st.write(f"• **{component}:** {points:+g} points")
+                    st.write(f"**Total Score:** {control_quality_score:g} points")
             
             with col2:
                 st.markdown("#### **Recommended Testing Method**")
@@ -202,27 +278,19 @@ def run_evaluate_control():
                 method_explanations = {
                     "Re-performance": {
                         "description": "Execute the control procedure independently to verify it operates as designed.",
-                        "when": "High-risk controls, key manual processes, complex calculations",
-                        "effort": "High",
-                        "reliability": "Highest"
+                        "when": "High-risk controls, key manual processes, complex calculations"
                     },
                     "Examination": {
                         "description": "Review and analyze evidence, documentation, and supporting materials.",
-                        "when": "Automated controls, documented processes, system-generated reports", 
-                        "effort": "Medium",
-                        "reliability": "Good"
+                        "when": "Automated controls, documented processes, system-generated reports"
                     },
                     "Inquiry": {
                         "description": "Interview control performers and review process documentation.",
-                        "when": "Low-risk controls, well-established processes, preliminary assessment",
-                        "effort": "Low", 
-                        "reliability": "Moderate"
+                        "when": "Low-risk controls, well-established processes, preliminary assessment"
                     },
                     "Re-performance / Examination": {
                         "description": "Combination approach using multiple testing methods for comprehensive coverage.",
-                        "when": "Critical controls with high complexity or risk",
-                        "effort": "High",
-                        "reliability": "Highest"
+                        "when": "Critical controls with high complexity or risk"
                     }
                 }
                 
@@ -230,8 +298,8 @@ def run_evaluate_control():
                     details = method_explanations[substantiation_method]
                     st.markdown(f"**Description:** {details['description']}")
                     st.markdown(f"**Best used when:** {details['when']}")
-                    st.markdown(f"**Testing effort:** {details['effort']}")
-                    st.markdown(f"**Evidence reliability:** {details['reliability']}")
+                    st.markdown(f"**Testing effort:** {SUBSTANTIATION_EFFORT[substantiation_method]}")
+                    st.markdown(f"**Evidence reliability:** {SUBSTANTIATION_RELIABILITY[substantiation_method]}")
             
             # Additional insights and recommendations
             st.divider()
@@ -241,42 +309,16 @@ def run_evaluate_control():
             
             with col1:
                 st.markdown("#### **Control Strengths**")
-                strengths = []
-                
-                if control_type == "Preventative":
-                    strengths.append("Proactive risk prevention approach")
-                if key_nonkey == "Key":
-                    strengths.append("Critical control for risk mitigation")
-                if manual_automated == "Automated":
-                    strengths.append("Reduced human error through automation")
-                if implementation_quality_rating >= 4:
-                    strengths.append("High implementation quality")
-                if control_quality_score >= 10:
-                    strengths.append("Strong overall control design")
-
-                if strengths:
-                    for strength in strengths:
+                if evaluation.strengths:
+                    for strength in evaluation.strengths:
                         st.write(strength)
                 else:
                     st.write("Consider the improvement opportunities to enhance control effectiveness.")
             
             with col2:
                 st.markdown("#### **Improvement Opportunities**")
-                improvements = []
-                
-                if control_type == "Detective":
-                    improvements.append("Consider preventative controls to address root causes")
-                if key_nonkey == "Non-Key" and risk_level == "High":
-                    improvements.append("Evaluate if this should be classified as a Key control")
-                if manual_automated == "Manual" and risk_level in ["High", "Medium"]:
-                    improvements.append("Explore automation opportunities")
-                if implementation_quality_rating <= 2:
-                    improvements.append("Address implementation quality issues immediately")
-                if control_quality_score < 8:
-                    improvements.append("Consider control redesign or enhancement")
-                
-                if improvements:
-                    for improvement in improvements:
+                if evaluation.improvements:
+                    for improvement in evaluation.improvements:
                         st.write(improvement)
                 else:
                     st.write("Well-designed control with strong implementation!")
@@ -285,31 +327,29 @@ def run_evaluate_control():
             st.divider() 
             st.subheader("**Benchmarking Context**")
             
-            benchmark_data = {
-                "Industry Average": 8.5,
-                "Best Practice": 12.0,
-                "Regulatory Minimum": 6.0,
-                "Your Control": control_quality_score
-            }
-            
             st.markdown("**How your control compares:**")
-            for label, score in benchmark_data.items():
-                if label == "Your Control":
-                    if score >= benchmark_data["Best Practice"]:
-                        st.success(f"**{label}:** {score} (Exceeds best practice)")
-                    elif score >= benchmark_data["Industry Average"]:
-                        st.info(f"**{label}:** {score} (Above average)")
-                    elif score >= benchmark_data["Regulatory Minimum"]:
-                        st.warning(f"**{label}:** {score} (Meets minimum standards)")
-                    else:
-                        st.error(f"**{label}:** {score} (Below minimum standards)")
-                else:
-                    st.write(f"**{label}:** {score}")
+            for label, score in benchmark_scores(weights).items():
+                st.write(f"**{label}:** {score:.1f}")
+            BENCHMARK_DISPLAY[evaluation.benchmark](
+                f"**Your Control:** {control_quality_score} ({evaluation.benchmark})"
+            )
 
         except Exception as e:
             st.error(f"**An error occurred during calculation:** {e}")
             st.info("Please check your inputs and try again. If the issue persists, contact support.")
-    
+        perf.lap("results")
+
+    # Every possible evaluation, for what-if comparisons and use in other tools
+    with st.expander("**All Attribute Combinations**", expanded=False):
+        st.markdown("The evaluation of each of the 120 combinations of control attributes and implementation quality ratings.")
+        st.dataframe(evaluation_frame(), hide_index=True, use_container_width=True)
+        st.download_button(
+            label="Download Evaluation Table",
+            data=build_evaluation_table_csv(weights.version),
+            file_name="control_evaluation_table.csv",
+            mime="text/csv",
+        )
+
     # Add helpful tips section
     st.divider()
     with st.expander("**Tips for Effective Control Evaluation**", expanded=False):
@@ -0,0 +1,212 @@
+"""
+Complete evaluation of a single control, memoized for every attribute combination.
+
+A control is described by four categorical attributes and an implementation quality
+rating of 1 to 5, so there are only 2 x 2 x 2 x 3 x 5 = 120 distinct evaluations.
+evaluate_control derives one from the canonical scoring functions; evaluation_table
+computes all of them once per version of the scoring weights, after which the
+Evaluate Control page, exports and what-if queries are dictionary lookups.
+"""
+import functools
+from dataclasses import dataclass
+from itertools import product
+
+from application_pages.scoring import (
+    SUBSTANTIATION_ATTRIBUTES,
+    calculate_control_quality_score,
+    current_weights,
+    suggest_substantiation_method,
+)
+
+# Every input of an evaluation, in the order of evaluate_control's arguments
+IMPLEMENTATION_RATINGS = (1, 2, 3, 4, 5)
+EVALUATION_ATTRIBUTES = {**SUBSTANTIATION_ATTRIBUTES, "Implementation Quality Rating": list(IMPLEMENTATION_RATINGS)}
+
+# The thresholds below are set on the scale of the bundled weights, whose scores run from
+# 4 to 14; under other weights they keep their relative position in the score range
+REFERENCE_SCORE_RANGE = (4, 14)
+
+# Lowest score of each rating band, best band first, with its description
+SCORE_RATINGS = (
+    (12, "Excellent", "Strong, well-designed control"),
+    (8, "Good", "Solid control with minor improvements needed"),
+    (6, "Fair", "Moderate effectiveness, improvement recommended"),
+    (4, "Poor", "Significant weaknesses, immediate attention required"),
+)
+
+# Reference scores a control is compared against
+BENCHMARK_SCORES = {"Industry Average": 8.5, "Best Practice": 12.0, "Regulatory Minimum": 6.0}
+
+# Scores from which the overall design counts as a strength, and below which a redesign is suggested
+STRONG_DESIGN_SCORE = 10
+REDESIGN_SCORE = 8
+
+@dataclass(frozen=True)
+class ControlEvaluation:
+    """Everything the Evaluate Control page shows for one attribute combination."""
+    control_quality_score: int
+    rating: str
+    rating_description: str
+    substantiation_method: str
+    breakdown: tuple
+    strengths: tuple
+    improvements: tuple
+    benchmark: str
+
+def scale_score(score, weights=None):
+    """
+    Maps a threshold on REFERENCE_SCORE_RANGE to the same position in the weights' score range.
+
+    Args:
+        score (float): A score under the bundled weights.
+        weights (ScoringWeights, optional): Defaults to current_weights().
+
+    Returns:
+        float: The equivalent score under the weights; unchanged under the bundled weights.
+    """
+    low, high = (weights or current_weights()).score_range
+    reference_low, reference_high = REFERENCE_SCORE_RANGE
+    return low + (score - reference_low) * (high - low) / (reference_high - reference_low)
+
+def score_bands(weights=None):
+    """SCORE_RATINGS with their minimums scaled to the weights' score range."""
+    return tuple((scale_score(minimum, weights), rating, description)
+                 for minimum, rating, description in SCORE_RATINGS)
+
+def benchmark_scores(weights=None):
+    """BENCHMARK_SCORES scaled to the weights' score range."""
+    return {label: scale_score(score, weights) for label, score in BENCHMARK_SCORES.items()}
+
+def score_rating(score, weights=None):
+    """Returns the (rating, description) band of a Control Quality Score."""
+    bands = score_bands(weights)
+    for minimum, rating, description in bands:
+        if score >= minimum:
+            return rating, description
+    return bands[-1][1:]
+
+def benchmark_standing(score, weights=None):
+    """Describes how a Control Quality Score compares with the benchmark scores."""
+    benchmarks = benchmark_scores(weights)
+    if score >= benchmarks["Best Practice"]:
+        return "Exceeds best practice"
+    if score >= benchmarks["Industry Average"]:
+        return "Above average"
+    if score >= benchmarks["Regulatory Minimum"]:
+        return "Meets minimum standards"
+    return "Below minimum standards"
+
+def evaluate_control(control_type, key_nonkey, manual_automated, risk_level, implementation_quality_rating):
+    """
+    Evaluates one control from scratch.
+
+    Args:
+        control_type (str): 'Preventative' or 'Detective'.
+        key_nonkey (str): 'Key' or 'Non-Key'.
+        manual_automated (str): 'Manual' or 'Automated'.
+        risk_level (str): 'High', 'Medium' or 'Low'.
+        implementation_quality_rating (int): 1 to 5.
+
+    Returns:
+        ControlEvaluation: Score, rating, substantiation method, score breakdown,
+            strengths, improvement opportunities and benchmark standing.
+
+    Raises:
+        ValueError: If an attribute is outside its vocabulary.
+    """
+    score = calculate_control_quality_score(control_type, key_nonkey, manual_automated,
+                                            implementation_quality_rating)
+    method = suggest_substantiation_method(control_type, key_nonkey, manual_automated, risk_level)
+    weights = current_weights()
+    breakdown = (
+        (f"Control Type ({control_type})", weights.points["Control Type"][control_type]),
+        (f"Classification ({key_nonkey})", weights.points["Key/Non-Key"][key_nonkey]),
+        (f"Execution ({manual_automated})", weights.points["Manual/Automated"][manual_automated]),
+        ("Implementation Quality", weights.rating_points * (implementation_quality_rating - 1)),
+    )
+
+    strengths = []
+    if control_type == "Preventative":
+        strengths.append("Proactive risk prevention approach")
+    if key_nonkey == "Key":
+        strengths.append("Critical control for risk mitigation")
+    if manual_automated == "Automated":
+        strengths.append("Reduced human error through automation")
+    if implementation_quality_rating >= 4:
+        strengths.append("High implementation quality")
+    if score >= scale_score(STRONG_DESIGN_SCORE, weights):
+        strengths.append("Strong overall control design")
+
+    improvements = []
+    if control_type == "Detective":
+        improvements.append("Consider preventative controls to address root causes")
+    if key_nonkey == "Non-Key" and risk_level == "High":
+        improvements.append("Evaluate if this should be classified as a Key control")
+    if manual_automated == "Manual" and risk_level in ["High", "Medium"]:
+        improvements.append("Explore automation opportunities")
+    if implementation_quality_rating <= 2:
+        improvements.append("Address implementation quality issues immediately")
+    if score < scale_score(REDESIGN_SCORE, weights):
+        improvements.append("Consider control redesign or enhancement")
+
+    return ControlEvaluation(score, *score_rating(score, weights), method, breakdown, tuple(strengths),
+                             tuple(improvements), benchmark_standing(score, weights))
+
+def evaluation_table():
+    """
+    Evaluates every attribute combination once per version of the scoring weights.
+
+    Returns:
+        dict: ControlEvaluation keyed by (control_type, key_nonkey, manual_automated,
+            risk_level, implementation_quality_rating); treat as read-only.
+    """
+    return _evaluation_table(current_weights().version)
+
+@functools.lru_cache(maxsize=4)
+def _evaluation_table(weights_version):
+    return {
+        combination: evaluate_control(*combination)
+        for combination in product(*EVALUATION_ATTRIBUTES.values())
+    }
+
+def lookup_evaluation(control_type, key_nonkey, manual_automated, risk_level, implementation_quality_rating):
+    """
+    Returns the memoized evaluation of a control; same arguments as evaluate_control.
+
+    Raises:
+        ValueError: If the combination is not one of the 120 valid ones.
+    """
+    key = (control_type, key_nonkey, manual_automated, risk_level, implementation_quality_rating)
+    try:
+        return evaluation_table()[key]
+    except (KeyError, TypeError):
+        # Let the canonical functions explain what is invalid
+        evaluate_control(*key)
+        raise ValueError(f"Implementation quality rating must be one of {IMPLEMENTATION_RATINGS}, "
+                         f"not {implementation_quality_rating!r}") from None
+
+def evaluation_frame():
+    """
+    The evaluation table as a DataFrame for export, one row per attribute combination.
+
+    The breakdown becomes one points column per component; strengths and improvements
+    are joined with '; '.
+
+    Returns:
+        pd.DataFrame: The attribute columns followed by the evaluation results.
+    """
+    import pandas as pd
+
+    rows = []
+    for combination, evaluation in evaluation_table().items():
+        rows.append({
+            **dict(zip(EVALUATION_ATTRIBUTES, combination)),
+            'Control Quality Score': evaluation.control_quality_score,
+            'Rating': evaluation.rating,
+            'Substantiation Method': evaluation.substantiation_method,
+            **{f"{component.split(' (')[0]} Points": points for component, points in evaluation.breakdown},
+            'Strengths': "; ".join(evaluation.strengths),
+            'Improvement Opportunities': "; ".join(evaluation.improvements),
+            'Benchmark': evaluation.benchmark,
+        })
+    return pd.DataFrame(rows)
@@ -0,0 +1,263 @@
+"""
+Background jobs for long-running analyses.
+
+A JobRunner runs jobs on its own threads and keeps their state outside any Streamlit
+script run, so a page can start a job, poll its progress and partial results on later
+runs and cancel it. Jobs are plain functions that receive their Job and report progress
+by updating it.
+
+Each job belongs to the owner (e.g. a browser's unguessable token) that submitted it,
+and only that owner finds it again. Once the owner has no further use for a finished
+job it drops it with discard(), and the runner no longer holds its result.
+"""
+import io
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+import pandas as pd
+
+from application_pages.control_data import (
+    DEFAULT_CHUNK_SIZE,
+    ControlAggregates,
+    ingest_control_chunks,
+    iter_control_chunks,
+)
+from application_pages.parallel_scoring import ingest_control_chunks_parallel
+from application_pages.scoring import current_weights
+
+# Job states; the last three are final
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+FINAL_STATES = (JOB_DONE, JOB_FAILED, JOB_CANCELLED)
+
+class JobCancelled(Exception):
+    """Raised inside a job function once the job has been asked to stop."""
+
+@dataclass
+class Job:
+    """
+    State of one background job, shared between its thread and the pages polling it.
+
+    The job function updates the progress fields and partial result as it goes; the
+    runner sets status, result and error. Readers only ever see whole values, since
+    each field is replaced rather than mutated.
+    """
+    job_id: str
+    name: str
+    key: str
+    owner: Optional[str] = None
+    status: str = JOB_QUEUED
+    rows_parsed: int = 0
+    rows_scored: int = 0
+    total_rows: Optional[int] = None
+    partial: Any = None
+    result: Any = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    def __post_init__(self):
+        self._cancel_requested = threading.Event()
+
+    @property
+    def finished(self):
+        return self.status in FINAL_STATES
+
+    @property
+    def progress(self):
+        """Fraction of the expected rows scored so far, or None while the total is unknown."""
+        if self.status == JOB_DONE:
+            return 1.0
+        if not self.total_rows:
+            return None
+        return min(self.rows_scored / self.total_rows, 1.0)
+
+    @property
+    def elapsed_seconds(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def cancel(self):
+        """Asks the job to stop at its next check_cancelled call."""
+        self._cancel_requested.set()
+
+    def check_cancelled(self):
+        """Raises JobCancelled if cancel() was called; job functions call this between steps."""
+        if self._cancel_requested.is_set():
+            raise JobCancelled()
+
+class JobRunner:
+    """
+    Runs jobs on a thread pool and keeps them for polling until their owner takes them.
+
+    Args:
+        max_workers (int): Number of jobs running at the same time; others queue.
+        keep (int): Number of finished jobs kept until their owner takes them; older ones
+            are dropped, so abandoned results do not pile up.
+    """
+
+    def __init__(self, max_workers=2, keep=4):
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="control-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self.keep = keep
+
+    def submit(self, name, key, func, *args, owner=None, **kwargs):
+        """
+        Starts func(job, *args, **kwargs) in the background.
+
+        A job of the same owner that is still running, or finished successfully, for the
+        same key is returned instead of starting a duplicate.
+
+        Args:
+            name (str): Shown to the user, e.g. the file name.
+            key (str): Identifies the work, e.g. a fingerprint of the file content.
+            func (callable): The job function.
+            owner (str, optional): Identifies who may look the job up, e.g. a session ID.
+
+        Returns:
+            Job: The new or existing job.
+        """
+        with self._lock:
+            for job in self._jobs.values():
+                if job.key == key and job.owner == owner and job.status not in (JOB_FAILED, JOB_CANCELLED):
+                    return job
+            job = Job(uuid.uuid4().hex[:12], name, key, owner)
+            self._jobs[job.job_id] = job
+            self._evict()
+        self._executor.submit(self._run, job, func, args, kwargs)
+        return job
+
+    def _run(self, job, func, args, kwargs):
+        job.started_at = time.time()
+        job.status = JOB_RUNNING
+        try:
+            job.check_cancelled()
+            job.result = func(job, *args, **kwargs)
+            job.status = JOB_DONE
+        except JobCancelled:
+            job.status = JOB_CANCELLED
+        except Exception as e:
+            job.error = str(e)
+            job.status = JOB_FAILED
+        finally:
+            job.finished_at = time.time()
+
+    def _evict(self):
+        finished = [job for job in self._jobs.values() if job.finished]
+        for job in sorted(finished, key=lambda job: job.created_at)[:max(len(finished) - self.keep, 0)]:
+            del self._jobs[job.job_id]
+
+    def get(self, job_id, owner=None):
+        """Returns the job with this ID, or None if it is unknown, was dropped or has another owner."""
+        job = self._jobs.get(job_id)
+        return job if job is not None and job.owner == owner else None
+
+    def discard(self, job_id, owner=None):
+        """
+        Drops a finished job once its owner no longer needs it, so the runner no longer holds its result.
+
+        Returns:
+            Job: The dropped job, or None if there is no finished job with this ID and owner.
+        """
+        with self._lock:
+            job = self.get(job_id, owner)
+            if job is None or not job.finished:
+                return None
+            return self._jobs.pop(job_id)
+
+    def jobs(self):
+        """All kept jobs, newest first."""
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda job: job.created_at, reverse=True)
+
+    def shutdown(self):
+        for job in self.jobs():
+            job.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+@dataclass
+class FileAnalysis:
+    """
+    Result of analyze_control_file; df is None when validation failed.
+
+    weights_version is the version of the weights every row was scored with, or None if
+    the weights were reloaded while the job ran.
+    """
+    is_valid: bool
+    errors: list
+    aggregates: ControlAggregates
+    df: Optional[pd.DataFrame] = None
+    weights_version: Optional[str] = None
+
+def estimate_rows(data, fmt="csv"):
+    """
+    Number of records in a control file's bytes, counted without parsing the rows.
+
+    For CSV this counts line breaks, so quoted values spanning several lines make it an
+    overestimate; it only sizes the progress bar, and the job reports the rows it
+    actually parsed.
+    """
+    if fmt == "csv":
+        return max(data.count(b"\n") - 1 + (not data.endswith(b"\n")), 0)
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if fmt == "parquet":
+        return pq.ParquetFile(io.BytesIO(data)).metadata.num_rows
+    reader = pa.ipc.open_file(pa.BufferReader(data))
+    return sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+
+def analyze_control_file(job, data, fmt="csv", chunksize=DEFAULT_CHUNK_SIZE, workers=1):
+    """
+    Job function that reads, validates and scores a control file chunk by chunk.
+
+    Progress is reported as rows parsed and rows scored, and job.partial holds the
+    ControlAggregates of the rows scored so far. The job can be cancelled between
+    chunks.
+
+    Args:
+        job (Job): The job being run.
+        data (bytes): Contents of the file.
+        fmt (str): 'csv', 'parquet' or 'arrow'.
+        chunksize (int): Number of rows per chunk.
+        workers (int): Processes validating and scoring chunks; 1 scores on the job's thread.
+
+    Returns:
+        FileAnalysis: The verdict, aggregates and, when valid, the scored frame.
+    """
+    job.total_rows = estimate_rows(data, fmt)
+    weights_version = current_weights().version
+    scored = []
+
+    def parsed(chunks):
+        for chunk in chunks:
+            job.check_cancelled()
+            job.rows_parsed += len(chunk)
+            yield chunk
+
+    def on_chunk(chunk):
+        scored.append(chunk)
+        job.partial = ControlAggregates().merge(job.partial or ControlAggregates()).update(chunk)
+        job.rows_scored += len(chunk)
+        job.check_cancelled()
+
+    chunks = parsed(iter_control_chunks(io.BytesIO(data), chunksize, fmt))
+    if workers == 1:
+        is_valid, errors, aggregates = ingest_control_chunks(chunks, on_chunk=on_chunk)
+    else:
+        is_valid, errors, aggregates = ingest_control_chunks_parallel(chunks, workers, on_chunk=on_chunk)
+    if current_weights().version != weights_version:
+        weights_version = None
+    if not is_valid:
+        return FileAnalysis(False, errors, aggregates, weights_version=weights_version)
+    return FileAnalysis(True, [], aggregates, pd.concat(scored, ignore_index=True), weights_version)
@@ -0,0 +1,285 @@
+"""
+Map-reduce validation and scoring of large control datasets on a process pool.
+
+A dataset is split into row partitions (slices of a frame, or the chunks of a file).
+Each worker process validates and scores one partition and sends back only what the
+parent cannot cheaply recompute: the validation report, the compact attribute, rating
+and score columns, a ControlAggregates and 64-bit hashes of the Control IDs. The parent
+merges the aggregates and checks the hashes for Control IDs repeated across partitions.
+
+The parent sends its compiled scoring weights with every partition, so the workers score
+with the same weights even if theirs were loaded from another file or at another time.
+"""
+import dataclasses
+import functools
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from application_pages.control_data import (
+    EXPECTED_VALUES,
+    MIN_RECORDS,
+    REQUIRED_COLUMNS,
+    RULE_DUPLICATE_ID,
+    RULE_TOO_FEW_RECORDS,
+    ControlAggregates,
+    ValidationReport,
+    validate_controls,
+)
+from application_pages.scoring import current_weights, score_controls, suggest_substantiation_methods
+
+# Number of worker processes unless given explicitly; defaults to the number of CPUs
+WORKERS_ENV_VAR = "CONTROL_QUALITY_WORKERS"
+
+# Partitions per worker when a frame is split, so that a slow partition does not
+# leave the other workers idle at the end
+PARTITIONS_PER_WORKER = 2
+
+# Columns a worker sends back; the parent already holds everything else
+RESULT_COLUMNS = [*EXPECTED_VALUES, *(col for col, kind in REQUIRED_COLUMNS.items() if kind == 'numeric'),
+                  'Control Quality Score', 'Substantiation Method']
+
+@dataclasses.dataclass
+class PartitionResult:
+    """What a worker returns for one partition; columns and aggregates are None if it is invalid."""
+    report: ValidationReport
+    id_hashes: np.ndarray
+    columns: Optional[pd.DataFrame] = None
+    aggregates: Optional[ControlAggregates] = None
+    weights_version: Optional[str] = None
+
+def default_workers():
+    return int(os.environ.get(WORKERS_ENV_VAR) or os.cpu_count() or 1)
+
+@functools.lru_cache(maxsize=None)
+def process_pool(workers):
+    """
+    Returns the process-wide pool of a size, starting it on first use.
+
+    Workers are spawned rather than forked, since the parent may be a multi-threaded
+    Streamlit server; each pays the pandas import once and is then reused.
+    """
+    return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+
+def hash_control_ids(ids):
+    """64-bit hashes of Control IDs, identical in every process."""
+    return pd.util.hash_array(np.asarray(ids, dtype=object), categorize=False)
+
+def score_partition(df, weights=None):
+    """
+    Validates and scores one partition; the function run by the workers.
+
+    Args:
+        df (pd.DataFrame): A slice of the dataset with the usual columns.
+        weights (ScoringWeights, optional): The parent's scoring weights; current_weights() if None.
+
+    Returns:
+        PartitionResult: The partition's report and Control ID hashes, plus its compact
+            columns, aggregates and the version of the weights it was scored with when
+            it is valid.
+    """
+    report, df_processed = validate_controls(df, min_records=0)
+    ids = df['Control ID'] if 'Control ID' in df else []
+    result = PartitionResult(report, hash_control_ids(ids))
+    if report.is_valid:
+        weights = weights or current_weights()
+        df_processed['Control Quality Score'] = score_controls(df_processed, weights)
+        df_processed['Substantiation Method'] = suggest_substantiation_methods(df_processed)
+        result.columns = df_processed[RESULT_COLUMNS]
+        result.aggregates = ControlAggregates().update(df_processed)
+        result.weights_version = weights.version
+    return result
+
+def score_partitions(partitions, workers=None):
+    """
+    Scores partitions on the process pool, yielding results in input order.
+
+    At most two partitions per worker are in flight, so memory stays bounded when the
+    partitions are read lazily from a file. Every partition is scored with the weights
+    in effect when scoring started.
+
+    Args:
+        partitions (Iterable[pd.DataFrame]): The dataset, one partition at a time.
+        workers (int, optional): Number of worker processes; default_workers() if None.
+            With one worker the partitions are scored in this process.
+
+    Yields:
+        tuple: (partition, PartitionResult)
+
+    Partitions still queued when the generator is closed are cancelled.
+
+    Raises:
+        RuntimeError: If a worker scored a partition with other weights than the parent's.
+    """
+    workers = workers or default_workers()
+    weights = current_weights()
+    if workers == 1:
+        for partition in partitions:
+            yield partition, score_partition(partition, weights)
+        return
+
+    def checked(future):
+        result = future.result()
+        if result.report.is_valid and result.weights_version != weights.version:
+            raise RuntimeError(f"A worker scored with weights {result.weights_version} instead of {weights.version}")
+        return result
+
+    pool = process_pool(workers)
+    pending = deque()
+    try:
+        for partition in partitions:
+            pending.append((partition, pool.submit(score_partition, partition, weights)))
+            if len(pending) >= 2 * workers:
+                partition, future = pending.popleft()
+                yield partition, checked(future)
+        while pending:
+            partition, future = pending.popleft()
+            yield partition, checked(future)
+    finally:
+        # The consumer stopped early, e.g. at an invalid partition, or was cancelled
+        for _, future in pending:
+            future.cancel()
+
+def count_repeated_ids(id_hashes):
+    """
+    Number of Control IDs that repeat one seen in an earlier partition.
+
+    Args:
+        id_hashes (list[np.ndarray]): Hashes of each partition, each free of repeats.
+
+    Returns:
+        tuple: (count, hashes) of the repeated IDs.
+    """
+    hashes = np.sort(np.concatenate(id_hashes)) if id_hashes else np.empty(0, np.uint64)
+    repeats = hashes[1:][hashes[1:] == hashes[:-1]]
+    return len(repeats), np.unique(repeats)
+
+def add_id_hashes(seen, hashes):
+    """
+    Checks a partition's Control ID hashes against those of earlier partitions.
+
+    Args:
+        seen (np.ndarray): Sorted hashes of the earlier partitions.
+        hashes (np.ndarray): Hashes of the partition, free of repeats.
+
+    Returns:
+        tuple: (number of hashes already in seen, sorted hashes of all partitions)
+    """
+    hashes = np.sort(hashes)
+    positions = np.searchsorted(seen, hashes)
+    repeated = int(np.count_nonzero(seen[np.minimum(positions, len(seen) - 1)] == hashes)) if len(seen) else 0
+    # Inserting at the search positions merges the two sorted arrays in one copy
+    return repeated, np.insert(seen, positions, hashes)
+
+def score_controls_parallel(df, workers=None, partition_rows=None, min_records=MIN_RECORDS, max_examples=100):
+    """
+    Validates, scores and aggregates a dataset across a process pool.
+
+    Gives the same result as validate_controls followed by scoring and
+    summarize_controls, except that each issue message names the partition's rows.
+
+    Args:
+        df (pd.DataFrame): The dataset to process.
+        workers (int, optional): Number of worker processes; default_workers() if None.
+        partition_rows (int, optional): Rows per partition; by default the dataset is
+            split into PARTITIONS_PER_WORKER partitions per worker.
+        min_records (int): Minimum number of records required.
+        max_examples (int): Number of example rows kept for the repeated Control ID issue.
+
+    Returns:
+        tuple: (report, df_processed, aggregates); df_processed is the scored frame in
+            the compact schema, or None when the report contains issues.
+    """
+    if df is None or df.empty or any(col not in df.columns for col in REQUIRED_COLUMNS):
+        # Rejected before any row is looked at
+        report, _ = validate_controls(df, min_records=min_records)
+        return report, None, ControlAggregates()
+
+    workers = workers or default_workers()
+    partition_rows = partition_rows or max(-(-len(df) // (workers * PARTITIONS_PER_WORKER)), 1)
+    partitions = (df.iloc[start:start + partition_rows] for start in range(0, len(df), partition_rows))
+
+    report = ValidationReport(num_rows=len(df))
+    aggregates = ControlAggregates()
+    columns = []
+    id_hashes = []
+    for start, (partition, result) in zip(range(0, len(df), partition_rows), score_partitions(partitions, workers)):
+        for issue in result.report.issues:
+            report.issues.append(dataclasses.replace(
+                issue, message=f"Rows {start + 1:,}-{start + len(partition):,}: {issue.message}"))
+        if result.report.is_valid:
+            aggregates.merge(result.aggregates)
+            columns.append(result.columns)
+        id_hashes.append(result.id_hashes)
+
+    if report.is_valid:
+        repeated, repeated_hashes = count_repeated_ids(id_hashes)
+        if repeated:
+            # Confirm on the IDs themselves, so a hash collision is never reported
+            candidates = np.isin(np.concatenate(id_hashes), repeated_hashes)
+            duplicates = df['Control ID'].where(candidates).duplicated().to_numpy() & candidates
+            report.add(RULE_DUPLICATE_ID, 'Control ID', duplicates,
+                       "Column 'Control ID' contains {count} values already used in earlier rows",
+                       df.index[np.flatnonzero(duplicates)[:max_examples]].tolist())
+    if report.is_valid and len(df) < min_records:
+        report.add(RULE_TOO_FEW_RECORDS, None, 1, f"Dataset must contain at least {min_records} records")
+    if not report.is_valid:
+        return report, None, aggregates
+
+    scored = pd.concat(columns).set_axis(df.index)
+    return report, df.assign(**dict(scored.items())), aggregates
+
+def ingest_control_chunks_parallel(chunks, workers=None, on_progress=None, on_chunk=None):
+    """
+    Parallel counterpart of ingest_control_chunks, with the same arguments and result.
+
+    Chunks are read in this process and validated and scored by the pool. Ingestion
+    stops at the first invalid chunk, including one that repeats a Control ID of an
+    earlier chunk, before it reaches on_chunk; the chunks still queued are cancelled.
+    Repeats are found from the ID hashes, since the chunks are not kept, so a 64-bit hash
+    collision (odds of about n**2 / 2**65 for n controls) would be reported as a repeated
+    ID.
+
+    Args:
+        chunks (Iterable[pd.DataFrame]): The dataset, in order, one chunk at a time.
+        workers (int, optional): Number of worker processes; default_workers() if None.
+        on_progress (callable, optional): Called with the number of rows processed so far
+            after each chunk.
+        on_chunk (callable, optional): Called, in order, with each validated chunk once it
+            has its 'Control Quality Score' and 'Substantiation Method' columns.
+
+    Returns:
+        tuple: (is_valid, error_messages, aggregates)
+    """
+    aggregates = ControlAggregates()
+    seen = np.empty(0, np.uint64)
+    rows_read = 0
+
+    results = score_partitions(chunks, workers)
+    try:
+        for chunk, result in results:
+            first_row = rows_read + 1
+            rows_read += len(chunk)
+            error_messages = result.report.messages
+            if result.report.is_valid:
+                repeated, seen = add_id_hashes(seen, result.id_hashes)
+                if repeated:
+                    error_messages = [f"Column 'Control ID' contains {repeated} values already used in earlier rows"]
+            if error_messages:
+                return False, [f"Rows {first_row:,}-{rows_read:,}: {error}" for error in error_messages], aggregates
+            aggregates.merge(result.aggregates)
+            if on_chunk is not None:
+                on_chunk(chunk.assign(**dict(result.columns.set_axis(chunk.index).items())))
+            if on_progress is not None:
+                on_progress(rows_read)
+    finally:
+        results.close()
+
+    if rows_read < MIN_RECORDS:
+        return False, [f"Dataset must contain at least {MIN_RECORDS} records"], aggregates
+    return True, [], aggregates
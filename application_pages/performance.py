@@ -0,0 +1,238 @@
+"""
+Opt-in instrumentation of the Streamlit pages.
+
+A PerformanceRecorder splits one script run into consecutive stages and records, per
+stage, the wall time, row count, peak traced memory and whether a cached step was served
+from Streamlit's cache. The run is logged as one JSON record and shown in the sidebar
+"Performance" panel.
+
+Cache hits and misses are counted per session. tracemalloc traces the whole process, so
+while several sessions record at once each stage's peak memory includes their allocations.
+"""
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from typing import Optional
+
+import pandas as pd
+import streamlit as st
+
+logger = logging.getLogger(__name__)
+
+# Setting this environment variable to 1 switches the Performance panel on by default
+PERFORMANCE_ENV_VAR = "CONTROL_QUALITY_PERFORMANCE"
+
+# Misses are counted per thread: each session runs its script on its own thread, and a
+# cached function's body runs on the thread that called it
+_thread_state = threading.local()
+
+_logging_lock = threading.Lock()
+
+# Recorders currently tracing memory; tracemalloc is stopped when the last one finishes
+_tracing_lock = threading.Lock()
+_tracing_recorders = 0
+_started_tracing = False
+
+def _cache_misses():
+    """Cache misses counted on the current thread."""
+    if not hasattr(_thread_state, "misses"):
+        _thread_state.misses = Counter()
+    return _thread_state.misses
+
+def track_cache_misses(func):
+    """
+    Counts the calls that reach the body of a cached function, i.e. the cache misses.
+
+    Apply it below the st.cache_data / st.cache_resource decorator.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        _cache_misses()[func.__name__] += 1
+        return func(*args, **kwargs)
+    return wrapper
+
+def configure_run_logging():
+    """
+    Makes sure the JSON record of each instrumented run reaches stderr.
+
+    The logger's level is lowered to INFO, and a stderr handler is attached unless the
+    logger or one of its parents already has one. Called whenever a recorder is enabled,
+    so switching the panel on is enough to see the records.
+    """
+    with _logging_lock:
+        if not logger.hasHandlers():
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter("%(asctime)s %(name)s %(message)s"))
+            logger.addHandler(handler)
+        if not logger.isEnabledFor(logging.INFO):
+            logger.setLevel(logging.INFO)
+
+def _acquire_tracing():
+    global _tracing_recorders, _started_tracing
+    with _tracing_lock:
+        if _tracing_recorders == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _started_tracing = True
+        _tracing_recorders += 1
+
+def _release_tracing():
+    global _tracing_recorders, _started_tracing
+    with _tracing_lock:
+        _tracing_recorders -= 1
+        # Tracing started outside this module (e.g. python -X tracemalloc) is left running
+        if _tracing_recorders == 0 and _started_tracing:
+            tracemalloc.stop()
+            _started_tracing = False
+
+@dataclass
+class StageTiming:
+    """Measurements of one stage of a script run."""
+    stage: str
+    seconds: float
+    rows: Optional[int] = None
+    peak_memory_mb: Optional[float] = None
+    cache: Optional[str] = None
+
+@dataclass
+class PerformanceRecorder:
+    """
+    Times consecutive stages of one run of a page.
+
+    Each call to lap() closes the stage that started at the previous lap (or at creation),
+    so a page is instrumented by marking the end of each stage without restructuring it.
+    A disabled recorder ignores every call. An enabled one traces memory until finish().
+
+    Attributes:
+        cache_stats (dict): {cache: {"hits": int, "misses": int}} to add this run's cache
+            hits and misses to, e.g. kept in the session state across runs.
+    """
+    page: str
+    enabled: bool = True
+    stages: list = field(default_factory=list)
+    cache_stats: dict = field(default_factory=dict)
+
+    def __post_init__(self):
+        self._panel = None
+        self._tracing = False
+        if self.enabled:
+            configure_run_logging()
+            _acquire_tracing()
+            self._tracing = True
+        self._start = self._lap_start = time.perf_counter()
+        self._lap_memory = self._traced_memory()
+        self._lap_misses = _cache_misses().copy()
+
+    def _traced_memory(self):
+        if not self.enabled:
+            return 0
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        return current
+
+    def lap(self, stage, rows=None, cache=None):
+        """
+        Ends the current stage and starts the next one.
+
+        Args:
+            stage (str): Name of the stage that just finished.
+            rows (int, optional): Number of rows the stage processed.
+            cache (str, optional): Name of a @track_cache_misses function called in the stage;
+                recorded as a cache hit unless its body ran.
+        """
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        peak = tracemalloc.get_traced_memory()[1]
+        timing = StageTiming(stage, now - self._lap_start, rows, (peak - self._lap_memory) / 1024 ** 2)
+        misses = _cache_misses()
+        if cache is not None:
+            timing.cache = "miss" if misses[cache] > self._lap_misses[cache] else "hit"
+            stats = self.cache_stats.setdefault(cache, {"hits": 0, "misses": 0})
+            stats["hits" if timing.cache == "hit" else "misses"] += 1
+        self.stages.append(timing)
+        self._lap_misses = misses.copy()
+        self._lap_memory = self._traced_memory()
+        self._lap_start = time.perf_counter()
+
+    @property
+    def total_seconds(self):
+        return time.perf_counter() - self._start
+
+    def to_frame(self):
+        """The recorded stages as a DataFrame, one row per stage."""
+        return pd.DataFrame([asdict(timing) for timing in self.stages],
+                            columns=["stage", "seconds", "rows", "peak_memory_mb", "cache"])
+
+    def as_dict(self):
+        return {
+            "page": self.page,
+            "total_seconds": round(self.total_seconds, 6),
+            "peak_memory_mb": max((t.peak_memory_mb for t in self.stages), default=None),
+            "stages": [asdict(timing) for timing in self.stages],
+        }
+
+    def finish(self):
+        """Closes the last stage, stops tracing memory, logs the run and fills the sidebar panel."""
+        if not self.enabled:
+            return
+        try:
+            self.lap("rendering")
+        finally:
+            if self._tracing:
+                self._tracing = False
+                _release_tracing()
+        logger.info(json.dumps({"event": "page_run", **self.as_dict()}))
+        if self._panel is not None:
+            with self._panel:
+                display_performance_panel(self)
+
+def cache_hit_rates(cache_stats):
+    """Hit and miss counts of every tracked cache in cache_stats, with their hit rates."""
+    rows = [
+        {"cache": name, **stats, "hit_rate": stats["hits"] / (stats["hits"] + stats["misses"])}
+        for name, stats in sorted(cache_stats.items())
+    ]
+    return pd.DataFrame(rows, columns=["cache", "hits", "misses", "hit_rate"])
+
+def start_performance_recording(page):
+    """
+    Adds the Performance toggle to the sidebar and returns the recorder for this run.
+
+    Args:
+        page (str): Name of the page being run.
+
+    Returns:
+        PerformanceRecorder: Enabled only when the user switched the panel on.
+    """
+    enabled = st.sidebar.toggle(
+        "Performance panel",
+        value=os.environ.get(PERFORMANCE_ENV_VAR) == "1",
+        key="performance_panel",
+        help="Time each stage of this page and show the timings, memory and cache hit rates here",
+    )
+    cache_stats = st.session_state.setdefault("performance_cache_stats", {})
+    recorder = PerformanceRecorder(page, enabled=enabled, cache_stats=cache_stats)
+    if enabled:
+        recorder._panel = st.sidebar.container()
+    return recorder
+
+def display_performance_panel(recorder):
+    """Shows the stage timings of a run and the cache hit rates in an expander."""
+    with st.expander("Performance", expanded=True):
+        st.metric("Total run time", f"{recorder.total_seconds * 1000:,.0f} ms")
+        stages = recorder.to_frame()
+        stages["seconds"] = stages["seconds"] * 1000
+        st.dataframe(
+            stages.rename(columns={"seconds": "ms", "peak_memory_mb": "peak MB"}),
+            hide_index=True, use_container_width=True,
+        )
+        hit_rates = cache_hit_rates(recorder.cache_stats)
+        if not hit_rates.empty:
+            st.caption("Cache hit rates in this session")
+            st.dataframe(hit_rates, hide_index=True, use_container_width=True)
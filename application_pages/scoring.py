@@ -0,0 +1,354 @@
+"""
+Scoring core of the Control Effectiveness Evaluator.
+
+This module has no third-party imports so that the scoring API loads in milliseconds
+for any consumer (the Streamlit pages, the batch CLI, workers, tests). The batch
+functions import NumPy and pandas lazily, on first call.
+
+The points awarded per attribute value are read from a JSON weights file (see
+current_weights), compiled once into lookup tables shared by the scalar and batch
+scoring paths, and reloaded when the file changes.
+"""
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+import warnings
+from dataclasses import dataclass
+from itertools import product
+
+# Scoring weights file; CONTROL_QUALITY_WEIGHTS overrides the default shipped with the app
+WEIGHTS_ENV_VAR = "CONTROL_QUALITY_WEIGHTS"
+DEFAULT_WEIGHTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scoring_weights.json")
+
+# Seconds between checks of the weights file for changes
+WEIGHTS_CHECK_INTERVAL = 1.0
+
+# Attributes awarding points per value, in the order of the base points table, and the
+# weight giving the points per implementation quality rating step above 1
+POINTS_ATTRIBUTES = {
+    "Control Type": ["Preventative", "Detective"],
+    "Key/Non-Key": ["Key", "Non-Key"],
+    "Manual/Automated": ["Manual", "Automated"],
+}
+RATING_WEIGHT = "Implementation Quality Rating"
+
+# Testing effort of each substantiation method and the estimated hours per control tested
+SUBSTANTIATION_EFFORT = {
+    "Re-performance": "High",
+    "Examination": "Medium",
+    "Inquiry": "Low",
+    "Re-performance / Examination": "High",
+}
+EFFORT_HOURS = {"High": 8, "Medium": 4, "Low": 1}
+
+# Reliability of the evidence each substantiation method gives
+SUBSTANTIATION_RELIABILITY = {
+    "Re-performance": "Highest",
+    "Examination": "Good",
+    "Inquiry": "Moderate",
+    "Re-performance / Examination": "Highest",
+}
+
+# dtype of batch scores computed from integer ratings and weights, when they fit
+SCORE_DTYPE = "int8"
+SCORE_DTYPE_RANGE = (-128, 127)
+
+# Largest Control Quality Score magnitude the weights may produce, so that every score
+# is exact in the int32 and float32 columns of the compact schema
+MAX_SCORE_MAGNITUDE = 10 ** 6
+
+@dataclass(frozen=True)
+class ScoringWeights:
+    """
+    Scoring weights compiled for lookup; build with compile_weights.
+
+    Attributes:
+        points (dict): {attribute: {value: points}} for every attribute of POINTS_ATTRIBUTES.
+        rating_points (int or float): Points per implementation quality rating step above 1.
+        base_points (tuple): Sum of the attribute points of every Control Type x
+            Key/Non-Key x Manual/Automated combination, in row-major order of POINTS_ATTRIBUTES.
+        version (str): Hash of the weights, identifying them in cache keys.
+        source (str): Where the weights were read from.
+    """
+    points: dict
+    rating_points: float
+    base_points: tuple
+    version: str
+    source: str
+
+    @property
+    def score_range(self):
+        """Lowest and highest Control Quality Score these weights can award."""
+        ratings = (0, 4 * self.rating_points)
+        return min(self.base_points) + min(ratings), max(self.base_points) + max(ratings)
+
+def compile_weights(config, source="<config>"):
+    """
+    Validates a weights configuration and compiles it into lookup tables.
+
+    Args:
+        config (dict): {attribute: {value: points}} for every attribute of POINTS_ATTRIBUTES,
+            plus {RATING_WEIGHT: {"points_per_step": points}}.
+        source (str): Where the configuration came from, for messages.
+
+    Returns:
+        ScoringWeights: The compiled weights.
+
+    Raises:
+        ValueError: If an attribute or value is missing or unknown, points are not finite
+            numbers, or the scores could exceed MAX_SCORE_MAGNITUDE.
+    """
+    def number(value, name):
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+            raise ValueError(f"Points for {name} in {source} must be a finite number, not {value!r}")
+        return value
+
+    if not isinstance(config, dict) or set(config) != {*POINTS_ATTRIBUTES, RATING_WEIGHT}:
+        raise ValueError(f"Scoring weights in {source} must list exactly {[*POINTS_ATTRIBUTES, RATING_WEIGHT]}")
+    points = {}
+    for col, values in POINTS_ATTRIBUTES.items():
+        if not isinstance(config[col], dict) or set(config[col]) != set(values):
+            raise ValueError(f"Scoring weights for '{col}' in {source} must list exactly {values}")
+        points[col] = {value: number(config[col][value], f"{col} '{value}'") for value in values}
+    if not isinstance(config[RATING_WEIGHT], dict) or set(config[RATING_WEIGHT]) != {"points_per_step"}:
+        raise ValueError(f"Scoring weights for '{RATING_WEIGHT}' in {source} must be {{\"points_per_step\": points}}")
+    rating_points = number(config[RATING_WEIGHT]["points_per_step"], RATING_WEIGHT)
+
+    base_points = tuple(
+        sum(points[col][value] for col, value in zip(POINTS_ATTRIBUTES, combination))
+        for combination in product(*POINTS_ATTRIBUTES.values())
+    )
+    canonical = json.dumps({**points, RATING_WEIGHT: rating_points}, sort_keys=True)
+    version = hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:12]
+    weights = ScoringWeights(points, rating_points, base_points, version, source)
+    if max(abs(limit) for limit in weights.score_range) > MAX_SCORE_MAGNITUDE:
+        raise ValueError(f"Scoring weights in {source} give scores from {weights.score_range[0]:g} to "
+                         f"{weights.score_range[1]:g}; scores must stay within +/-{MAX_SCORE_MAGNITUDE:,}")
+    return weights
+
+def load_weights(path):
+    """Reads and compiles a JSON weights file; raises ValueError if it is invalid."""
+    with open(path, encoding="utf-8") as f:
+        try:
+            config = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Scoring weights in {path} are not valid JSON: {e}") from None
+    return compile_weights(config, source=path)
+
+def weights_path():
+    return os.environ.get(WEIGHTS_ENV_VAR) or DEFAULT_WEIGHTS_PATH
+
+# (file identity, weights) of the last load, and when to look at the file again
+_weights_lock = threading.Lock()
+_loaded_weights = None
+_next_weights_check = 0.0
+
+def current_weights(check=False):
+    """
+    The scoring weights in effect, reloaded when their file has changed.
+
+    The file is looked at no more than once every WEIGHTS_CHECK_INTERVAL seconds. If an
+    edited file is invalid, the previous weights stay in effect with a warning until it
+    changes again.
+
+    Args:
+        check (bool): Look at the file now, whatever the interval.
+
+    Returns:
+        ScoringWeights: The compiled weights.
+
+    Raises:
+        ValueError: If no valid weights have been loaded yet and the file is invalid.
+        OSError: If no weights have been loaded yet and the file cannot be read.
+    """
+    global _loaded_weights, _next_weights_check
+    now = time.monotonic()
+    if _loaded_weights is not None and not check and now < _next_weights_check:
+        return _loaded_weights[1]
+
+    with _weights_lock:
+        path = weights_path()
+        try:
+            stat = os.stat(path)
+            identity = (path, stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            if _loaded_weights is None:
+                raise
+            identity = (path, None, None)
+        if _loaded_weights is None or _loaded_weights[0] != identity:
+            try:
+                weights = load_weights(path)
+            except (OSError, ValueError) as e:
+                if _loaded_weights is None:
+                    raise
+                warnings.warn(f"Keeping scoring weights {_loaded_weights[1].version}: {e}", stacklevel=2)
+                weights = _loaded_weights[1]
+            _loaded_weights = (identity, weights)
+        _next_weights_check = now + WEIGHTS_CHECK_INTERVAL
+        return _loaded_weights[1]
+
+def calculate_control_quality_score(control_type, key_nonkey, manual_automated, implementation_quality_rating):
+    """Calculates the Control Quality Score based on control attributes and implementation quality."""
+
+    if control_type not in ("Preventative", "Detective"):
+        raise ValueError("Invalid control type")
+    if key_nonkey not in ("Key", "Non-Key"):
+        raise ValueError("Invalid key/non-key type")
+    if manual_automated not in ("Manual", "Automated"):
+        raise ValueError("Invalid manual/automated type")
+    if not isinstance(implementation_quality_rating, (int, float)) or not (1 <= implementation_quality_rating <= 5):
+        raise ValueError("Implementation quality rating must be an integer or float between 1 and 5.")
+
+    weights = current_weights()
+    score = (weights.points["Control Type"][control_type]
+             + weights.points["Key/Non-Key"][key_nonkey]
+             + weights.points["Manual/Automated"][manual_automated])
+    score += weights.rating_points * (implementation_quality_rating - 1)
+    return score
+
+def suggest_substantiation_method(control_type, key_nonkey, manual_automated, risk_level):
+    """Suggests substantiation method based on control attributes and risk level."""
+
+    valid_control_types = ["Preventative", "Detective"]
+    valid_key_nonkey = ["Key", "Non-Key"]
+    valid_manual_automated = ["Manual", "Automated"]
+    valid_risk_levels = ["High", "Medium", "Low"]
+
+    if control_type not in valid_control_types:
+        raise ValueError(f"Invalid control type: {control_type}. Must be one of {valid_control_types}")
+    if key_nonkey not in valid_key_nonkey:
+        raise ValueError(f"Invalid key_nonkey: {key_nonkey}. Must be one of {valid_key_nonkey}")
+    if manual_automated not in valid_manual_automated:
+        raise ValueError(f"Invalid manual_automated: {manual_automated}. Must be one of {valid_manual_automated}")
+    if risk_level not in valid_risk_levels:
+        raise ValueError(f"Invalid risk_level: {risk_level}. Must be one of {valid_risk_levels}")
+
+    if control_type == "Preventative" and key_nonkey == "Key" and manual_automated == "Manual" and risk_level == "High":
+        return "Re-performance"
+    elif control_type == "Detective" and key_nonkey == "Non-Key" and manual_automated == "Automated" and risk_level == "Medium":
+        return "Examination"
+    elif control_type == "Preventative" and key_nonkey == "Key" and manual_automated == "Manual" and risk_level == "Low":
+        return "Inquiry"
+    elif control_type == "Detective" and key_nonkey == "Non-Key" and manual_automated == "Automated" and risk_level == "High":
+        return "Re-performance / Examination"
+    elif control_type == "Preventative" and key_nonkey == "Key" and manual_automated == "Manual" and risk_level == "Medium":
+        return "Examination"
+    else:
+        return "Inquiry"
+
+# Attribute vocabularies in the order used to index the substantiation method table
+SUBSTANTIATION_ATTRIBUTES = {
+    "Control Type": ["Preventative", "Detective"],
+    "Key/Non-Key": ["Key", "Non-Key"],
+    "Manual/Automated": ["Manual", "Automated"],
+    "Risk Level": ["High", "Medium", "Low"],
+}
+
+SUBSTANTIATION_TABLE_SHAPE = tuple(len(values) for values in SUBSTANTIATION_ATTRIBUTES.values())
+
+# suggest_substantiation_method evaluated once for every attribute combination, flattened
+# in row-major order of SUBSTANTIATION_TABLE_SHAPE
+SUBSTANTIATION_METHOD_TABLE = tuple(
+    suggest_substantiation_method(*combination) for combination in product(*SUBSTANTIATION_ATTRIBUTES.values())
+)
+SUBSTANTIATION_METHODS = list(SUBSTANTIATION_EFFORT)
+
+def category_codes(values, categories):
+    """Returns the integer codes of values against a fixed vocabulary (-1 for anything outside it)."""
+    import pandas as pd
+
+    dtype = getattr(values, "dtype", None)
+    if isinstance(dtype, pd.CategoricalDtype) and list(dtype.categories) == list(categories):
+        return values.cat.codes.to_numpy()
+    return pd.Index(categories).get_indexer(values)
+
+def score_controls(df, weights=None):
+    """
+    Calculates the Control Quality Score for every control in a DataFrame at once.
+
+    Columnar equivalent of calculate_control_quality_score: each attribute column is
+    encoded against its fixed vocabulary and the points are read from the current
+    weights' base points table by combined code, so the whole frame is validated and
+    scored without a Python call per row.
+
+    Args:
+        df (pd.DataFrame): Controls with 'Control Type', 'Key/Non-Key', 'Manual/Automated'
+            and 'Implementation Quality Rating' columns.
+        weights (ScoringWeights, optional): Weights to score with; current_weights() if None.
+
+    Returns:
+        pd.Series: The Control Quality Score of each row, aligned with df.index.
+
+    Raises:
+        ValueError: If any row holds a value calculate_control_quality_score would reject.
+    """
+    import numpy as np
+    import pandas as pd
+
+    weights = weights or current_weights()
+    codes = []
+    for col, message in (
+        ("Control Type", "Invalid control type"),
+        ("Key/Non-Key", "Invalid key/non-key type"),
+        ("Manual/Automated", "Invalid manual/automated type"),
+    ):
+        col_codes = category_codes(df[col], POINTS_ATTRIBUTES[col])
+        if (col_codes < 0).any():
+            raise ValueError(message)
+        codes.append(col_codes)
+    shape = tuple(len(values) for values in POINTS_ATTRIBUTES.values())
+    # Widen before the arithmetic: compact int8 ratings times large weights would wrap
+    score = np.asarray(weights.base_points)[np.ravel_multi_index(codes, shape)]
+    score = score.astype(np.int64 if np.issubdtype(score.dtype, np.integer) else np.float64)
+
+    rating = df["Implementation Quality Rating"]
+    if pd.api.types.infer_dtype(rating, skipna=False) not in ("integer", "floating", "mixed-integer-float"):
+        raise ValueError("Implementation quality rating must be an integer or float between 1 and 5.")
+    rating = pd.to_numeric(rating)
+    if not rating.between(1, 5).all():
+        raise ValueError("Implementation quality rating must be an integer or float between 1 and 5.")
+
+    rating = rating.to_numpy()
+    rating = rating.astype(np.int64 if np.issubdtype(rating.dtype, np.integer) else np.float64)
+    score = score + weights.rating_points * (rating - 1)
+    low, high = weights.score_range
+    if np.issubdtype(score.dtype, np.integer) and SCORE_DTYPE_RANGE[0] <= low and high <= SCORE_DTYPE_RANGE[1]:
+        score = score.astype(SCORE_DTYPE)
+    return pd.Series(score, index=df.index, name="Control Quality Score")
+
+def suggest_substantiation_methods(df):
+    """
+    Suggests the substantiation method for every control in a DataFrame at once.
+
+    Batch equivalent of suggest_substantiation_method: the four attribute columns are
+    encoded against their vocabularies and the method is read from
+    SUBSTANTIATION_METHOD_TABLE, which holds every 2x2x2x3 combination.
+
+    Args:
+        df (pd.DataFrame): Controls with 'Control Type', 'Key/Non-Key', 'Manual/Automated'
+            and 'Risk Level' columns.
+
+    Returns:
+        pd.Series: Categorical 'Substantiation Method' of each row, aligned with df.index.
+
+    Raises:
+        ValueError: If any row holds a value suggest_substantiation_method would reject.
+    """
+    import numpy as np
+    import pandas as pd
+
+    codes = []
+    for col, values in SUBSTANTIATION_ATTRIBUTES.items():
+        col_codes = category_codes(df[col], values)
+        if (col_codes < 0).any():
+            invalid = df[col][col_codes < 0].iloc[0]
+            raise ValueError(f"Invalid {col}: {invalid}. Must be one of {values}")
+        codes.append(col_codes)
+
+    flat_index = np.ravel_multi_index(codes, SUBSTANTIATION_TABLE_SHAPE)
+    method_codes = category_codes(SUBSTANTIATION_METHOD_TABLE, SUBSTANTIATION_METHODS)[flat_index]
+    methods = pd.Categorical.from_codes(method_codes, categories=SUBSTANTIATION_METHODS)
+    return pd.Series(methods, index=df.index, name="Substantiation Method")
@@ -0,0 +1,342 @@
+"""
+Monte Carlo what-if simulation of control portfolios.
+
+A portfolio is summarised by the probability of each of the 120 attribute combinations
+of evaluation_table, whose score, substantiation method and testing hours come from
+the canonical scoring functions. A scenario is such a distribution, usually a baseline
+with some Shifts applied (e.g. automate 30% of the manual controls). Portfolios are
+sampled as multinomial counts over the combinations, for every scenario and draw in
+one batched NumPy call, so no control is ever generated row by row and thousands of
+scenarios are simulated per second.
+"""
+import functools
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+
+from application_pages.control_data import SYNTHETIC_VALUES, _normalized_probabilities
+from application_pages.evaluation import EVALUATION_ATTRIBUTES, evaluation_table, score_bands
+from application_pages.scoring import EFFORT_HOURS, SUBSTANTIATION_EFFORT, category_codes, current_weights
+
+# Shape of the attribute combinations; cells are numbered in its row-major order,
+# which is also the order of evaluation_table
+CELL_SHAPE = tuple(len(values) for values in EVALUATION_ATTRIBUTES.values())
+CELL_COUNT = int(np.prod(CELL_SHAPE))
+
+# Reported metrics of a simulated portfolio, with their units
+SIMULATION_METRICS = {
+    "Average Quality Score": "points",
+    "High-Risk Coverage": "% of high-risk controls rated Good or better",
+    "Automation Rate": "% of controls automated",
+    "Testing Hours": "estimated hours",
+}
+
+@dataclass(frozen=True)
+class Shift:
+    """
+    Moves a fraction of the controls from some values of one attribute to others.
+
+    Attributes:
+        column (str): An attribute of EVALUATION_ATTRIBUTES, e.g. 'Manual/Automated'.
+        mapping (dict): {from_value: to_value}, e.g. {'Manual': 'Automated'}. All moves
+            are taken from the distribution before the shift, so {1: 2, 2: 3} raises each
+            rating by one step rather than moving some controls twice.
+        fraction (float or array): Share of the matching controls moved, 0 to 1. An array
+            of fractions gives one scenario per fraction.
+        where (dict, optional): {column: [values]} restricting the shift to some controls,
+            e.g. {'Risk Level': ['High']}.
+    """
+    column: str
+    mapping: dict
+    fraction: Any
+    where: Optional[dict] = None
+
+# Common interventions; set the fraction with dataclasses.replace
+INTERVENTIONS = {
+    "Automate manual controls": Shift('Manual/Automated', {'Manual': 'Automated'}, 1.0),
+    "Automate manual high-risk controls": Shift('Manual/Automated', {'Manual': 'Automated'}, 1.0,
+                                                where={'Risk Level': ['High']}),
+    "Replace detective controls with preventative ones": Shift('Control Type', {'Detective': 'Preventative'}, 1.0),
+    "Classify high-risk non-key controls as key": Shift('Key/Non-Key', {'Non-Key': 'Key'}, 1.0,
+                                                        where={'Risk Level': ['High']}),
+    "Raise implementation quality by one step": Shift('Implementation Quality Rating',
+                                                      {1: 2, 2: 3, 3: 4, 4: 5}, 1.0),
+}
+
+def cell_table():
+    """
+    Per-combination values of the quantities the metrics are built from, under the current weights.
+
+    Returns:
+        pd.DataFrame: One row per cell with the attribute columns, 'Control Quality Score',
+            'Substantiation Method' and 'Testing Hours'; treat as read-only.
+    """
+    return _cell_table(current_weights().version)
+
+@functools.lru_cache(maxsize=4)
+def _cell_table(weights_version):
+    rows = []
+    for combination, evaluation in evaluation_table().items():
+        rows.append({
+            **dict(zip(EVALUATION_ATTRIBUTES, combination)),
+            'Control Quality Score': evaluation.control_quality_score,
+            'Substantiation Method': evaluation.substantiation_method,
+            'Testing Hours': EFFORT_HOURS[SUBSTANTIATION_EFFORT[evaluation.substantiation_method]],
+        })
+    return pd.DataFrame(rows)
+
+@functools.lru_cache(maxsize=4)
+def _metric_groups(weights_version):
+    """
+    Collapses the cells into groups that contribute identically to every metric.
+
+    Summing multinomial cells gives a multinomial over the groups, so sampling the
+    groups is exact and needs fewer binomial draws than sampling all 120 cells.
+
+    Returns:
+        tuple: (cell_groups, totals) where cell_groups maps each cell to its group and
+            totals[g] holds the score, high-risk, high-risk rated Good, automated and
+            hours contribution of one control in group g.
+    """
+    cells = _cell_table(weights_version)
+    good_score = score_bands()[1][0]  # lowest score rated Good or better
+    high_risk = (cells['Risk Level'] == 'High').to_numpy()
+    contributions = np.column_stack([
+        cells['Control Quality Score'].to_numpy(),
+        high_risk,
+        high_risk & (cells['Control Quality Score'] >= good_score).to_numpy(),
+        (cells['Manual/Automated'] == 'Automated').to_numpy(),
+        cells['Testing Hours'].to_numpy(),
+    ]).astype(np.float64)
+    totals, cell_groups = np.unique(contributions, axis=0, return_inverse=True)
+    return cell_groups.ravel(), totals
+
+def attribute_distribution(distributions=None):
+    """
+    Cell probabilities of controls drawn like generate_synthetic_control_data.
+
+    Args:
+        distributions (dict, optional): Per-column {value: weight} mappings in the format
+            of generate_synthetic_control_data. Attributes not listed are uniform;
+            columns that do not affect a control's evaluation are ignored.
+
+    Returns:
+        np.ndarray: Probability of each of the CELL_COUNT cells.
+
+    Raises:
+        ValueError: If a column, value or weight is invalid.
+    """
+    distributions = distributions or {}
+    unknown_columns = set(distributions) - set(SYNTHETIC_VALUES)
+    if unknown_columns:
+        raise ValueError(f"Unknown columns in distributions: {sorted(unknown_columns)}")
+
+    probabilities = np.ones(())
+    for col, values in EVALUATION_ATTRIBUTES.items():
+        if col in distributions:
+            marginal = _normalized_probabilities(col, values, distributions[col])
+        else:
+            marginal = np.full(len(values), 1 / len(values))
+        probabilities = np.multiply.outer(probabilities, marginal)
+    return probabilities.ravel()
+
+def portfolio_distribution(df):
+    """
+    Cell probabilities of an existing portfolio, keeping its correlations between attributes.
+
+    Args:
+        df (pd.DataFrame): Validated controls.
+
+    Returns:
+        np.ndarray: Share of the controls in each of the CELL_COUNT cells.
+
+    Raises:
+        ValueError: If the portfolio is empty or holds fractional ratings.
+    """
+    if df.empty:
+        raise ValueError("Cannot simulate an empty portfolio")
+    codes = [category_codes(df[col], values) for col, values in EVALUATION_ATTRIBUTES.items()]
+    if any((col_codes < 0).any() for col_codes in codes):
+        raise ValueError("Simulation requires whole implementation quality ratings from 1 to 5")
+    counts = np.bincount(np.ravel_multi_index(codes, CELL_SHAPE), minlength=CELL_COUNT)
+    return counts / counts.sum()
+
+def _shift_matrix(shift):
+    """The CELL_COUNT x CELL_COUNT matrix M such that p + fraction * (p @ M) applies the shift."""
+    if shift.column not in EVALUATION_ATTRIBUTES:
+        raise ValueError(f"Cannot shift '{shift.column}'. Must be one of {list(EVALUATION_ATTRIBUTES)}")
+    codes = np.indices(CELL_SHAPE).reshape(len(CELL_SHAPE), -1)
+    axis = list(EVALUATION_ATTRIBUTES).index(shift.column)
+    values = EVALUATION_ATTRIBUTES[shift.column]
+
+    selected = np.ones(CELL_COUNT, dtype=bool)
+    for col, allowed in (shift.where or {}).items():
+        if col not in EVALUATION_ATTRIBUTES:
+            raise ValueError(f"Cannot filter on '{col}'. Must be one of {list(EVALUATION_ATTRIBUTES)}")
+        selected &= np.isin(codes[list(EVALUATION_ATTRIBUTES).index(col)],
+                            category_codes(list(allowed), EVALUATION_ATTRIBUTES[col]))
+
+    matrix = np.zeros((CELL_COUNT, CELL_COUNT))
+    for from_value, to_value in shift.mapping.items():
+        from_code, to_code = category_codes([from_value, to_value], values)
+        if from_code < 0 or to_code < 0:
+            raise ValueError(f"Invalid values for '{shift.column}': {from_value!r} -> {to_value!r}. "
+                             f"Must be among {values}")
+        if from_code == to_code:
+            continue
+        source = np.flatnonzero(selected & (codes[axis] == from_code))
+        target_codes = codes[:, source].copy()
+        target_codes[axis] = to_code
+        matrix[source, source] -= 1
+        np.add.at(matrix, (source, np.ravel_multi_index(target_codes, CELL_SHAPE)), 1)
+    return matrix
+
+def apply_shifts(distribution, shifts):
+    """
+    Applies interventions to a cell distribution, one after the other.
+
+    Args:
+        distribution (np.ndarray): Cell probabilities, shape (CELL_COUNT,) or
+            (scenarios, CELL_COUNT).
+        shifts (Iterable[Shift]): The interventions. Array fractions broadcast against
+            each other and the distribution, giving one scenario per element.
+
+    Returns:
+        np.ndarray: Cell probabilities of shape (..., CELL_COUNT).
+
+    Raises:
+        ValueError: If a shift names an unknown attribute or value, or a fraction is
+            outside 0 to 1.
+    """
+    distribution = np.asarray(distribution, dtype=np.float64)
+    for shift in shifts:
+        fraction = np.asarray(shift.fraction, dtype=np.float64)
+        if ((fraction < 0) | (fraction > 1)).any():
+            raise ValueError("Shift fractions must be between 0 and 1")
+        distribution = distribution + fraction[..., None] * (distribution @ _shift_matrix(shift))
+    # Moving mass never creates or destroys it; clip rounding noise around zero
+    return np.clip(distribution, 0, None)
+
+def expected_metrics(distributions):
+    """
+    Metrics of an infinitely large portfolio with each distribution.
+
+    Args:
+        distributions (np.ndarray): Cell probabilities, shape (..., CELL_COUNT).
+
+    Returns:
+        dict: Array of shape (...) per metric of SIMULATION_METRICS; 'Testing Hours' is
+            per control.
+    """
+    cell_groups, totals = _metric_groups(current_weights().version)
+    return _metrics(np.asarray(distributions, dtype=np.float64) @ totals[cell_groups], 1)
+
+def _metrics(sums, num_controls):
+    """Turns per-portfolio sums of the group contributions into the reported metrics."""
+    score, high, high_good, automated, hours = np.moveaxis(sums, -1, 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        coverage = np.where(high > 0, 100 * high_good / high, np.nan)
+    return {
+        "Average Quality Score": score / num_controls,
+        "High-Risk Coverage": coverage,
+        "Automation Rate": 100 * automated / num_controls,
+        "Testing Hours": hours,
+    }
+
+@dataclass
+class SimulationResult:
+    """
+    Metrics of every simulated portfolio of every scenario.
+
+    Attributes:
+        num_controls (int): Controls per simulated portfolio.
+        metrics (dict): Array of shape (scenarios, draws) per metric of SIMULATION_METRICS;
+            'High-Risk Coverage' is NaN for a portfolio without high-risk controls.
+        expected (dict): Array of shape (scenarios,) per metric, from expected_metrics
+            with the hours scaled to the portfolio size.
+    """
+    num_controls: int
+    metrics: dict
+    expected: dict
+
+    @property
+    def scenarios(self):
+        return next(iter(self.metrics.values())).shape[0]
+
+    @property
+    def draws(self):
+        return next(iter(self.metrics.values())).shape[1]
+
+    def bands(self, confidence=0.9):
+        """
+        Mean and central confidence band of each metric per scenario.
+
+        Args:
+            confidence (float): Share of simulated portfolios inside the band.
+
+        Returns:
+            pd.DataFrame: Columns 'Scenario', 'Metric', 'Expected', 'Mean', 'Lower' and
+                'Upper', one row per scenario and metric.
+        """
+        tail = 100 * (1 - confidence) / 2
+        frames = []
+        for metric, values in self.metrics.items():
+            lower, upper = np.nanpercentile(values, [tail, 100 - tail], axis=1)
+            frames.append(pd.DataFrame({
+                'Scenario': np.arange(self.scenarios),
+                'Metric': metric,
+                'Expected': self.expected[metric],
+                'Mean': np.nanmean(values, axis=1),
+                'Lower': lower,
+                'Upper': upper,
+            }))
+        return pd.concat(frames, ignore_index=True)
+
+    def histogram(self, metric, scenario=0, bins=30):
+        """Returns (counts, bin_edges) of one metric over the portfolios of one scenario."""
+        values = self.metrics[metric][scenario]
+        return np.histogram(values[~np.isnan(values)], bins=bins)
+
+def simulate_portfolios(distributions, num_controls, draws=100, seed=None):
+    """
+    Samples portfolios of num_controls controls for every scenario at once.
+
+    Each portfolio is one multinomial draw of its controls over the cells, so the
+    result has the same distribution as scoring generate_synthetic_control_data output
+    (for attribute_distribution) or resampling a portfolio with replacement (for
+    portfolio_distribution), for every scenario and draw in one batched call.
+
+    Args:
+        distributions (np.ndarray): Cell probabilities, shape (CELL_COUNT,) or
+            (scenarios, CELL_COUNT).
+        num_controls (int): Controls per simulated portfolio.
+        draws (int): Portfolios simulated per scenario.
+        seed (int, optional): Seed of the random generator; fresh entropy if None.
+
+    Returns:
+        SimulationResult: The metrics of every portfolio.
+
+    Raises:
+        ValueError: If num_controls or draws is not positive or a distribution does not
+            sum to 1.
+    """
+    if num_controls < 1 or draws < 1:
+        raise ValueError("Number of controls and draws must be positive")
+    distributions = np.atleast_2d(np.asarray(distributions, dtype=np.float64))
+    if distributions.shape[-1] != CELL_COUNT or not np.allclose(distributions.sum(axis=-1), 1):
+        raise ValueError(f"Distributions must hold {CELL_COUNT} probabilities summing to 1")
+
+    cell_groups, totals = _metric_groups(current_weights().version)
+    group_probabilities = np.zeros((len(distributions), len(totals)))
+    np.add.at(group_probabilities.T, cell_groups, distributions.T)
+    group_probabilities /= group_probabilities.sum(axis=1, keepdims=True)
+
+    rng = np.random.default_rng(seed)
+    counts = rng.multinomial(num_controls, group_probabilities[:, None, :],
+                             size=(len(distributions), draws))
+    metrics = _metrics(counts @ totals, num_controls)
+    expected = expected_metrics(distributions)
+    expected["Testing Hours"] = expected["Testing Hours"] * num_controls
+    return SimulationResult(num_controls, metrics, expected)
@@ -0,0 +1,153 @@
+"""
+Headless batch scoring of control inventories.
+
+Streams a CSV, Parquet or Arrow IPC export through the same validation and scoring used by the
+"Analyze Data" page, writes an enriched file with 'Control Quality Score' and
+'Substantiation Method' columns plus a JSON summary, and reports throughput and
+peak memory.
+
+Usage:
+    python batch_score.py controls.csv --output scored.csv --summary summary.json
+    python batch_score.py controls.parquet --workers 8   # validate and score on 8 processes
+    python batch_score.py controls.csv --weights my_weights.json   # score with other weights
+"""
+import argparse
+import functools
+import json
+import os
+import sys
+import time
+
+from application_pages.control_data import (
+    DEFAULT_CHUNK_SIZE,
+    FILE_MIME_TYPES,
+    ControlFileWriter,
+    detect_file_format,
+    ingest_control_chunks,
+    iter_control_chunks,
+    summarize_testing_effort,
+)
+from application_pages.parallel_scoring import default_workers, ingest_control_chunks_parallel
+from application_pages.scoring import WEIGHTS_ENV_VAR, current_weights
+
+SUPPORTED_FORMATS = tuple(FILE_MIME_TYPES)
+
+def peak_memory_mb():
+    """Peak resident memory of this process in MB, or None where it is not available."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+def format_figure(value, spec="", unit=""):
+    """Formats a summary figure for the log, or 'n/a' where it was not measured."""
+    return "n/a" if value is None else f"{value:{spec}}{unit}"
+
+def score_file(input_path, output_path=None, input_format=None, output_format=None,
+               chunksize=DEFAULT_CHUNK_SIZE, log=None, workers=1):
+    """
+    Validates and scores a control export chunk by chunk.
+
+    Args:
+        input_path (str): CSV, Parquet or Arrow IPC file to score.
+        output_path (str, optional): Where to write the enriched file; nothing is written if None.
+        input_format (str, optional): Overrides the format implied by the input extension.
+        output_format (str, optional): Overrides the format implied by the output extension.
+        chunksize (int): Number of rows per chunk.
+        log (callable, optional): Receives progress messages.
+        workers (int): Number of processes validating and scoring chunks; 1 scores in
+            this process, None uses default_workers().
+
+    Returns:
+        tuple: (is_valid, error_messages, summary) where summary is a JSON-serialisable dict.
+    """
+    input_format = detect_file_format(input_path, input_format)
+    writer = ControlFileWriter(output_path, detect_file_format(output_path, output_format)) if output_path else None
+
+    start = time.perf_counter()
+    is_valid = False
+    try:
+        ingest = ingest_control_chunks if workers == 1 else functools.partial(ingest_control_chunks_parallel,
+                                                                              workers=workers)
+        is_valid, error_messages, aggregates = ingest(
+            iter_control_chunks(input_path, chunksize, input_format),
+            on_chunk=writer,
+            on_progress=(lambda rows: log(f"Scored {rows:,} records")) if log else None,
+        )
+    finally:
+        if writer is not None:
+            writer.close()
+            # No partial output is left behind, whether validation failed or reading raised
+            if not is_valid and os.path.exists(output_path):
+                os.remove(output_path)
+    elapsed = time.perf_counter() - start
+
+    effort = summarize_testing_effort(aggregates.method_counts())
+    summary = {
+        "input": input_path,
+        "output": output_path if is_valid else None,
+        **aggregates.as_dict(),
+        "estimated_testing_hours": int(effort["Estimated Hours"].sum()),
+        "weights_version": current_weights().version,
+        "workers": workers or default_workers(),
+        "elapsed_seconds": round(elapsed, 3),
+        "rows_per_second": round(aggregates.total / elapsed) if elapsed > 0 else None,
+        "peak_memory_mb": peak_memory_mb(),
+    }
+    return is_valid, error_messages, summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a control inventory without the Streamlit UI.")
+    parser.add_argument("input", help="CSV, Parquet or Arrow IPC file of controls")
+    parser.add_argument("-o", "--output", help="Enriched output file (.csv, .parquet or .arrow)")
+    parser.add_argument("-s", "--summary", help="Write the JSON summary to this file instead of stdout")
+    parser.add_argument("--input-format", choices=SUPPORTED_FORMATS, help="Override the input format")
+    parser.add_argument("--output-format", choices=SUPPORTED_FORMATS, help="Override the output format")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNK_SIZE, help="Rows per chunk")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="Processes validating and scoring chunks in parallel (0: one per CPU)")
+    parser.add_argument("--weights", help=f"Scoring weights JSON file (default: ${WEIGHTS_ENV_VAR} or the bundled file)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Do not report progress on stderr")
+    args = parser.parse_args(argv)
+
+    log = None if args.quiet else (lambda message: print(message, file=sys.stderr))
+    if args.weights:
+        # Through the environment, so that worker processes score with the same weights
+        os.environ[WEIGHTS_ENV_VAR] = args.weights
+    try:
+        current_weights(check=True)
+    except (OSError, ValueError) as e:
+        print(f"Error loading scoring weights: {e}", file=sys.stderr)
+        return 2
+    try:
+        is_valid, error_messages, summary = score_file(
+            args.input, args.output, args.input_format, args.output_format, args.chunksize, log,
+            args.workers or None,
+        )
+    except (OSError, ValueError, ImportError) as e:
+        print(f"Error reading {args.input}: {e}", file=sys.stderr)
+        return 2
+
+    if not is_valid:
+        print("Dataset validation failed:", file=sys.stderr)
+        for i, error in enumerate(error_messages, 1):
+            print(f"{i}. {error}", file=sys.stderr)
+        return 1
+
+    summary_json = json.dumps(summary, indent=2)
+    if args.summary:
+        with open(args.summary, "w") as f:
+            f.write(summary_json)
+    else:
+        print(summary_json)
+    if log:
+        log(f"Scored {summary['total_controls']:,} controls in {summary['elapsed_seconds']}s "
+            f"({format_figure(summary['rows_per_second'], ',')} rows/sec, "
+            f"peak memory {format_figure(summary['peak_memory_mb'], '.0f', ' MB')})")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
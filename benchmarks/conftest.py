@@ -0,0 +1,93 @@
+"""
+Shared fixtures of the benchmark suite.
+
+Every benchmark runs at 1e3 and 1e5 rows, and at 1e6 rows with --max-rows 1000000, and
+stores its peak traced memory and throughput next to the timings, so saved runs double
+as time and memory baselines:
+
+    python -m pytest benchmarks --max-rows 1000000 --benchmark-autosave
+    python -m pytest benchmarks --max-rows 1000000 --benchmark-compare --benchmark-compare-fail=mean:20%
+
+Correctness checks, i.e. tests that take no benchmark fixture, run at the sizes up to
+MAX_CHECK_ROWS only.
+"""
+import tracemalloc
+
+import pytest
+
+from application_pages.control_data import generate_synthetic_control_data
+from application_pages.scoring import score_controls, suggest_substantiation_methods
+
+ROW_COUNTS = (1_000, 100_000, 1_000_000)
+DEFAULT_MAX_ROWS = 100_000
+MAX_CHECK_ROWS = 100_000
+SEED = 20240601
+
+def pytest_addoption(parser):
+    parser.addoption("--max-rows", type=int, default=DEFAULT_MAX_ROWS,
+                     help=f"Skip benchmarks on datasets larger than this many rows (default {DEFAULT_MAX_ROWS:,}; "
+                          f"{max(ROW_COUNTS):,} runs every size)")
+
+@pytest.fixture(params=ROW_COUNTS, ids=lambda rows: f"{rows:.0e}".replace("+0", ""))
+def rows(request):
+    if request.param > request.config.getoption("--max-rows"):
+        pytest.skip(f"--max-rows is below {request.param:,}")
+    if request.param > MAX_CHECK_ROWS and "benchmark" not in request.fixturenames:
+        pytest.skip("checked on the smaller datasets")
+    return request.param
+
+@pytest.fixture(scope="session")
+def datasets():
+    """Returns a function giving the synthetic dataset of a size, generated once per session."""
+    cache = {}
+
+    def get(rows):
+        if rows not in cache:
+            cache[rows] = generate_synthetic_control_data(rows, seed=SEED)
+        return cache[rows]
+    return get
+
+@pytest.fixture
+def controls(datasets, rows):
+    """Validated controls in the compact schema; read-only."""
+    return datasets(rows)
+
+@pytest.fixture
+def uploaded_controls(controls):
+    """The controls as pandas reads them from a CSV upload, with plain string columns."""
+    return controls.astype({
+        col: str for col, dtype in controls.dtypes.items() if dtype == "category"
+    }).astype({
+        col: "int64" for col, dtype in controls.dtypes.items() if dtype.kind in "iu"
+    })
+
+@pytest.fixture
+def scored_controls(controls):
+    return controls.assign(**{
+        'Control Quality Score': score_controls(controls),
+        'Substantiation Method': suggest_substantiation_methods(controls),
+    })
+
+@pytest.fixture
+def measure(rows, benchmark):
+    """
+    Benchmarks func(*args) and records its peak traced memory and throughput.
+
+    Memory is measured in one extra call outside the timed rounds, since tracing slows
+    allocation down. Returns the result of the benchmarked call.
+    """
+    def run(func, *args, rounds=None):
+        tracemalloc.start()
+        try:
+            func(*args)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        benchmark.extra_info["rows"] = rows
+        benchmark.extra_info["peak_memory_mb"] = round(peak / 1024 ** 2, 3)
+        result = benchmark.pedantic(func, args=args, rounds=rounds or (5 if rows < 1_000_000 else 1),
+                                    iterations=1, warmup_rounds=0)
+        if benchmark.stats is not None:  # None under --benchmark-disable
+            benchmark.extra_info["rows_per_second"] = round(rows / benchmark.stats.stats.mean)
+        return result
+    return run
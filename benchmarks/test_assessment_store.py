@@ -0,0 +1,115 @@
+"""
+The SQLite assessment store against the in-memory pipeline, and its query times.
+
+Stored portfolios must summarise and filter exactly like the in-memory dataset they
+were saved from, and snapshot trends must match a pandas merge of the snapshots.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from application_pages.assessment_store import AssessmentStore
+from application_pages.control_data import ControlTableIndex, generate_synthetic_control_data, summarize_controls
+from application_pages.scoring import score_controls, suggest_substantiation_methods
+
+def scored(df):
+    return df.assign(**{'Control Quality Score': score_controls(df),
+                        'Substantiation Method': suggest_substantiation_methods(df)})
+
+@pytest.fixture
+def snapshots():
+    """Two quarterly snapshots: the second re-scores most controls, drops some and adds new ones."""
+    first = scored(generate_synthetic_control_data(2_000, seed=1))
+    second = scored(generate_synthetic_control_data(2_400, seed=2)).iloc[300:]
+    return first, second
+
+@pytest.fixture
+def store(tmp_path):
+    store = AssessmentStore(str(tmp_path / "assessments.sqlite3"))
+    yield store
+    store.close()
+
+def test_stored_aggregates_match_dataset(store, scored_controls):
+    portfolio_id = store.save_portfolio(scored_controls, "portfolio", "2026-03-31")
+    aggregates = store.aggregate_portfolio(portfolio_id)
+    expected = summarize_controls(scored_controls)
+    assert np.array_equal(aggregates.counts, expected.counts)
+    np.testing.assert_allclose(aggregates.score_sums, expected.score_sums)
+
+@pytest.mark.parametrize("filters", [
+    {},
+    {"control_types": ["Detective"], "risk_levels": ["High", "Low"]},
+    {"score_range": (6, 9), "id_prefix": "CTRL_1"},
+])
+def test_stored_queries_match_table_index(store, datasets, filters):
+    df = datasets(1_000)
+    df = df.assign(**{'Control Quality Score': score_controls(df),
+                      'Substantiation Method': suggest_substantiation_methods(df)})
+    portfolio_id = store.save_portfolio(df, "portfolio")
+    positions = ControlTableIndex(df).query(**filters, sort_by="Control ID")
+    assert store.count_controls(portfolio_id, **filters) == len(positions)
+    page = store.query_portfolio(portfolio_id, **filters, limit=50, offset=20)
+    assert page["Control ID"].tolist() == df["Control ID"].to_numpy()[positions[20:70]].tolist()
+
+def test_evaluations_accumulate(store):
+    control = {'Control ID': 'CTRL_001', 'Control Type': 'Preventative', 'Key/Non-Key': 'Key',
+               'Manual/Automated': 'Manual', 'Risk Level': 'High', 'Implementation Quality Rating': 4,
+               'Control Quality Score': 12, 'Substantiation Method': 'Re-performance'}
+    store.save_evaluation(control)
+    store.save_evaluation(dict(control, **{'Control ID': 'CTRL_002', 'Control Quality Score': 10}))
+    portfolios = store.list_portfolios()
+    assert portfolios["controls"].tolist() == [2]
+    aggregates = store.aggregate_portfolio(int(portfolios["portfolio_id"].iloc[0]))
+    assert aggregates.total == 2 and aggregates.mean_score == 11
+
+def test_snapshot_trend_matches_pandas_merge(store, snapshots):
+    first, second = snapshots
+    store.save_portfolio(first, "inventory", "2026-03-31")
+    portfolio_id = store.save_portfolio(second, "inventory", "2026-06-30")
+    merged = second.merge(first[['Control ID', 'Control Quality Score']], on='Control ID', how='left',
+                          suffixes=('', ' previous'))
+    delta = merged['Control Quality Score'] - merged['Control Quality Score previous']
+
+    trend = store.trend("inventory").set_index(['portfolio_id', 'control_type']).loc[portfolio_id]
+    by_type = merged['Control Type'].astype(str)
+    assert trend['new_controls'].to_dict() == delta.isna().groupby(by_type).sum().to_dict()
+    assert trend['dropped'].to_dict() == (delta < 0).groupby(by_type).sum().to_dict()
+    assert trend['improved'].to_dict() == (delta > 0).groupby(by_type).sum().to_dict()
+    np.testing.assert_allclose(trend['average_score'],
+                               second.groupby(by_type.to_numpy())['Control Quality Score'].mean()[trend.index])
+
+    drops = store.score_changes(portfolio_id, limit=len(second))
+    assert len(drops) == (delta < 0).sum() and drops['Score Change'].is_monotonic_increasing
+    assert drops['Score Change'].min() == delta.min()
+
+def test_controls_as_of_matches_pandas(store, snapshots):
+    first, second = snapshots
+    store.save_portfolio(first, "inventory", "2026-03-31")
+    store.save_portfolio(second, "inventory", "2026-06-30")
+    expected = pd.concat([first, second]).drop_duplicates('Control ID', keep='last').sort_values('Control ID')
+    as_of = store.controls_as_of("inventory", "2026-07-01")
+    assert as_of['Control ID'].tolist() == expected['Control ID'].tolist()
+    assert as_of['Control Quality Score'].tolist() == expected['Control Quality Score'].tolist()
+    earlier = store.controls_as_of("inventory", "2026-04-01", control_ids=second['Control ID'][:10].tolist())
+    assert (earlier['Assessment Date'] == "2026-03-31").all()
+    assert store.controls_as_of("inventory", "2026-07-01", control_ids=[]).empty
+    assert store.controls_as_of("inventory", "2026-01-01").empty
+
+def test_deleting_a_snapshot_recompares_the_series(store, snapshots):
+    first, second = snapshots
+    store.save_portfolio(first, "inventory", "2026-03-31")
+    middle = store.save_portfolio(second, "inventory", "2026-06-30")
+    last = store.save_portfolio(first, "inventory", "2026-09-30")
+    with pytest.raises(ValueError):
+        store.save_portfolio(second, "inventory", "2026-01-01")
+    store.delete_portfolio(middle)
+    trend = store.trend("inventory")
+    assert trend.loc[trend['portfolio_id'] == last, ['new_controls', 'improved', 'dropped']].to_numpy().sum() == 0
+
+def test_save_portfolio(measure, store, scored_controls):
+    measure(store.save_portfolio, scored_controls, "portfolio", rounds=1)
+
+def test_save_snapshot(measure, store, scored_controls):
+    """Saving the next snapshot of a series, including the comparison with its predecessor."""
+    store.save_portfolio(scored_controls, "inventory", "2026-03-31")
+    measure(store.save_portfolio, scored_controls, "inventory", "2026-06-30", rounds=1)
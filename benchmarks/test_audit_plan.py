@@ -0,0 +1,71 @@
+"""
+Optimality of the budget-constrained test planner, and its run time on large portfolios.
+
+On small portfolios the greedy plan is compared with an exact dynamic program over
+the budget: it may fall short of the optimum by at most one upgrade, and never by more
+than its reported bound allows.
+"""
+import numpy as np
+import pytest
+
+from application_pages.audit_plan import (
+    KEY_WEIGHTS,
+    NOT_TESTED,
+    RISK_WEIGHTS,
+    method_options,
+    plan_testing,
+)
+from application_pages.scoring import score_controls
+
+def optimal_assurance(df, budget):
+    """Best achievable assurance, by dynamic programming over whole hours."""
+    options = method_options()
+    best = np.zeros(budget + 1)
+    for risk, key in zip(df['Risk Level'], df['Key/Non-Key']):
+        weight = RISK_WEIGHTS[risk] * KEY_WEIGHTS[key]
+        best = np.max([
+            np.concatenate([np.full(hours, -np.inf), best[:len(best) - hours] + weight * assurance])
+            for _, hours, assurance in options if hours <= budget
+        ], axis=0)
+    return best[-1]
+
+@pytest.fixture(scope="module")
+def portfolio(datasets):
+    df = datasets(1_000)
+    return df.assign(**{'Control Quality Score': score_controls(df)})
+
+def test_options_are_cheapest_method_per_reliability():
+    methods = [method for method, _, _ in method_options()]
+    assert methods == [NOT_TESTED, 'Inquiry', 'Examination', 'Re-performance']
+
+@pytest.mark.parametrize("budget", [0, 7, 40, 95, 400])
+def test_plan_is_near_optimal(portfolio, budget):
+    df = portfolio.iloc[:40]
+    test_plan = plan_testing(df, budget)
+    optimum = optimal_assurance(df, budget)
+    largest_upgrade = max(RISK_WEIGHTS.values()) * max(KEY_WEIGHTS.values()) * 0.4
+
+    assert test_plan.hours == test_plan.plan['Planned Hours'].sum() <= budget
+    assert test_plan.assurance == pytest.approx(test_plan.plan['Assurance'].sum())
+    assert test_plan.assurance <= optimum + 1e-6
+    assert optimum <= test_plan.upper_bound + 1e-6
+    assert optimum - test_plan.assurance <= largest_upgrade + 1e-6
+
+def test_weakest_controls_are_tested_first(portfolio):
+    plan = plan_testing(portfolio, 50).plan
+    tested = plan['Planned Method'] != NOT_TESTED
+    for _, group in plan.groupby(['Risk Level', 'Key/Non-Key'], observed=True):
+        if tested[group.index].any() and not tested[group.index].all():
+            assert group.loc[tested, 'Control Quality Score'].max() <= group.loc[~tested, 'Control Quality Score'].min()
+
+def test_full_budget_tests_everything_by_the_best_method(portfolio):
+    test_plan = plan_testing(portfolio, 8 * len(portfolio))
+    assert (test_plan.plan['Planned Method'] == 'Re-performance').all()
+    assert test_plan.assurance == pytest.approx(test_plan.max_assurance)
+
+def test_negative_budget_is_rejected(portfolio):
+    with pytest.raises(ValueError):
+        plan_testing(portfolio, -1)
+
+def test_plan_testing(measure, scored_controls):
+    measure(plan_testing, scored_controls, 2 * len(scored_controls))
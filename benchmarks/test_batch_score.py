@@ -0,0 +1,32 @@
+"""
+The headless batch scoring command line.
+"""
+import json
+import types
+
+import pytest
+
+import batch_score
+from application_pages.control_data import write_control_file
+
+@pytest.fixture
+def control_file(tmp_path, datasets):
+    path = tmp_path / "controls.csv"
+    path.write_bytes(write_control_file(datasets(1_000)))
+    return path
+
+def test_summary_and_log(control_file, tmp_path, capsys):
+    output, summary = tmp_path / "scored.csv", tmp_path / "summary.json"
+    assert batch_score.main([str(control_file), "-o", str(output), "-s", str(summary)]) == 0
+    assert output.exists() and json.loads(summary.read_text())["total_controls"] == 1_000
+    assert "rows/sec" in capsys.readouterr().err
+
+def test_unmeasured_figures_are_logged_as_not_available(control_file, tmp_path, capsys, monkeypatch):
+    # No resource module (Windows), and a run too quick for the clock to advance
+    monkeypatch.setattr(batch_score, "peak_memory_mb", lambda: None)
+    monkeypatch.setattr(batch_score, "time", types.SimpleNamespace(perf_counter=lambda: 1.0))
+    summary = tmp_path / "summary.json"
+    assert batch_score.main([str(control_file), "-s", str(summary)]) == 0
+    figures = json.loads(summary.read_text())
+    assert figures["rows_per_second"] is None and figures["peak_memory_mb"] is None
+    assert "(n/a rows/sec, peak memory n/a)" in capsys.readouterr().err
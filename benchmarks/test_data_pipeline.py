@@ -0,0 +1,154 @@
+"""
+Generation, validation, aggregation and streaming of control datasets.
+
+The aggregates behind the Analyze Data page are checked against a plain pandas groupby
+of the same rows, and chunked ingestion against aggregating the whole frame at once.
+"""
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from application_pages.control_data import (
+    REQUIRED_COLUMNS,
+    ControlAggregates,
+    ControlEditSession,
+    ControlFileWriter,
+    generate_synthetic_control_data,
+    ingest_control_chunks,
+    iter_control_chunks,
+    summarize_controls,
+    summarize_testing_effort,
+    validate_uploaded_data,
+    write_control_file,
+)
+from application_pages.scoring import SUBSTANTIATION_ATTRIBUTES
+
+def aggregate_dashboard(df):
+    """Everything the Analyze Data page reads from the aggregates of a scored dataset."""
+    aggregates = summarize_controls(df)
+    return (
+        aggregates.as_dict(),
+        [aggregates.mean_score_by(col) for col in SUBSTANTIATION_ATTRIBUTES],
+        summarize_testing_effort(aggregates.method_counts()),
+    )
+
+def test_aggregates_match_pandas_groupby(scored_controls):
+    aggregates = summarize_controls(scored_controls)
+    assert aggregates.total == len(scored_controls)
+    assert aggregates.mean_score == pytest.approx(scored_controls['Control Quality Score'].mean())
+    for col in SUBSTANTIATION_ATTRIBUTES:
+        expected = scored_controls[col].value_counts().reindex(SUBSTANTIATION_ATTRIBUTES[col], fill_value=0)
+        assert aggregates.value_counts(col).tolist() == expected.tolist()
+        expected_means = scored_controls.groupby(col, observed=False)['Control Quality Score'].mean()
+        np.testing.assert_allclose(aggregates.mean_score_by(col).to_numpy(),
+                                   expected_means.reindex(SUBSTANTIATION_ATTRIBUTES[col]).to_numpy())
+    expected_methods = scored_controls['Substantiation Method'].astype(str).value_counts()
+    method_counts = aggregates.method_counts()
+    assert method_counts[method_counts > 0].sort_index().to_dict() == expected_methods.sort_index().to_dict()
+
+def test_chunked_ingestion_matches_whole_frame(controls, scored_controls, rows):
+    chunks = (controls.iloc[start:start + rows // 7 + 1] for start in range(0, rows, rows // 7 + 1))
+    is_valid, errors, aggregates = ingest_control_chunks(chunks)
+    assert is_valid, errors
+    whole = summarize_controls(scored_controls)
+    assert np.array_equal(aggregates.counts, whole.counts)
+    np.testing.assert_allclose(aggregates.score_sums, whole.score_sums)
+
+def test_streamed_csv_reports_non_numeric_ratings(datasets):
+    df = datasets(1_000).astype({'Design Quality Rating': object})
+    df.loc[600, 'Design Quality Rating'] = 'high'
+    is_valid, errors, _ = ingest_control_chunks(iter_control_chunks(io.BytesIO(write_control_file(df)), 256))
+    assert not is_valid
+    assert errors == ["Rows 513-768: Column 'Design Quality Rating' contains 1 non-numeric values"]
+
+@pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+def test_streamed_export_accepts_mixed_rating_dtypes(datasets, fmt):
+    df = datasets(1_000).astype({'Implementation Quality Rating': float})
+    df.loc[700:, 'Implementation Quality Rating'] = 2.5  # int8 in the first chunks, float32 in the last
+    sink = io.BytesIO()
+    with ControlFileWriter(sink, fmt) as writer:
+        is_valid, errors, _ = ingest_control_chunks((df.iloc[start:start + 256] for start in range(0, 1_000, 256)),
+                                                    on_chunk=writer)
+    assert is_valid, errors
+    sink.seek(0)
+    exported = pd.concat(iter_control_chunks(sink, 1_000, fmt), ignore_index=True)
+    assert exported['Implementation Quality Rating'].tolist() == df['Implementation Quality Rating'].tolist()
+
+def test_merged_aggregates_match_whole_frame(scored_controls):
+    halves = np.array_split(np.arange(len(scored_controls)), 2)
+    merged = ControlAggregates()
+    for positions in halves:
+        merged.merge(summarize_controls(scored_controls.iloc[positions]))
+    whole = summarize_controls(scored_controls)
+    assert np.array_equal(merged.counts, whole.counts)
+    np.testing.assert_allclose(merged.score_sums, whole.score_sums)
+
+def test_edit_session_matches_full_rescore(scored_controls):
+    edits = ControlEditSession(scored_controls)
+    new_control = dict(scored_controls.iloc[0][list(REQUIRED_COLUMNS)], **{'Control ID': 'ADDED_1'})
+    report = edits.apply_changes(
+        edited_rows={1: {'Control Type': 'Detective', 'Implementation Quality Rating': 5}, 2: {'Risk Level': 'Low'}},
+        added_rows=[new_control],
+        deleted_rows=[3],
+    )
+    assert report.is_valid, report.messages
+    rescored = summarize_controls(edits.df)
+    assert np.array_equal(edits.aggregates.counts, rescored.counts)
+    np.testing.assert_allclose(edits.aggregates.score_sums, rescored.score_sums)
+    assert len(edits.df) == len(scored_controls) and edits.df['Control ID'].is_unique
+
+@pytest.mark.parametrize("edited_rows", [None, {4: {'Risk Level': 'Low'}}])
+def test_edit_session_deletes_without_new_rows(scored_controls, edited_rows):
+    edits = ControlEditSession(scored_controls)
+    dtypes = edits.df.dtypes
+    report = edits.apply_changes(edited_rows=edited_rows, deleted_rows=[3, 4])
+    assert report.is_valid, report.messages
+    assert edits.aggregates.total == len(edits.df) == len(scored_controls) - 2
+    rescored = summarize_controls(edits.df)
+    assert np.array_equal(edits.aggregates.counts, rescored.counts)
+    np.testing.assert_allclose(edits.aggregates.score_sums, rescored.score_sums)
+    assert edits.df.dtypes.equals(dtypes)
+
+def test_edit_session_rejects_duplicate_ids(scored_controls):
+    edits = ControlEditSession(scored_controls)
+    report = edits.apply_changes(edited_rows={0: {'Control ID': scored_controls['Control ID'].iloc[1]}})
+    assert not report.is_valid and edits.version == 0
+
+def test_edit(measure, scored_controls):
+    edits = ControlEditSession(scored_controls)
+    changes = {pos: {'Risk Level': 'Low'} for pos in range(0, len(scored_controls), len(scored_controls) // 100)}
+    measure(edits.apply_changes, changes)
+
+def test_validation_accepts_generated_data(uploaded_controls):
+    is_valid, errors, df_processed = validate_uploaded_data(uploaded_controls)
+    assert is_valid, errors
+    assert len(df_processed) == len(uploaded_controls)
+
+def test_validation_reports_each_broken_rule(datasets):
+    df = datasets(1_000).astype({'Control Type': object, 'Implementation Quality Rating': float})
+    df.loc[3, 'Control Type'] = 'Corrective'
+    df.loc[5, 'Implementation Quality Rating'] = 9
+    df.loc[7, 'Control ID'] = df.loc[8, 'Control ID']
+    is_valid, errors, df_processed = validate_uploaded_data(df)
+    assert not is_valid and df_processed is None
+    assert len(errors) == 3, errors
+
+def test_generation_is_reproducible():
+    first = generate_synthetic_control_data(1_000, seed=7)
+    pd.testing.assert_frame_equal(first, generate_synthetic_control_data(1_000, seed=7))
+
+def test_generation_follows_distributions():
+    df = generate_synthetic_control_data(100_000, seed=7,
+                                         distributions={'Control Type': {'Preventative': 80, 'Detective': 20}})
+    assert (df['Control Type'] == 'Preventative').mean() == pytest.approx(0.8, abs=0.01)
+
+def test_generate(measure, rows):
+    measure(generate_synthetic_control_data, rows, 0)
+
+def test_validate_uploaded_data(measure, uploaded_controls):
+    measure(validate_uploaded_data, uploaded_controls)
+
+def test_aggregate(measure, scored_controls):
+    measure(aggregate_dashboard, scored_controls)
@@ -0,0 +1,61 @@
+"""
+The memoized single-control evaluation table, and how long it takes to build.
+
+Every entry of the table must equal a fresh evaluate_control call and agree with the
+scalar scoring functions.
+"""
+import pytest
+
+from application_pages.evaluation import (
+    EVALUATION_ATTRIBUTES,
+    evaluate_control,
+    evaluation_frame,
+    evaluation_table,
+    lookup_evaluation,
+)
+from application_pages.scoring import calculate_control_quality_score, suggest_substantiation_method
+
+EVALUATION_COLUMNS = ['Control Type', 'Key/Non-Key', 'Manual/Automated', 'Risk Level',
+                      'Implementation Quality Rating']
+
+def lookup_evaluations(df):
+    return [lookup_evaluation(*row) for row in zip(*(df[col] for col in EVALUATION_COLUMNS))]
+
+def evaluate_controls(df):
+    return [evaluate_control(*row) for row in zip(*(df[col] for col in EVALUATION_COLUMNS))]
+
+def test_table_matches_canonical_functions():
+    table = evaluation_table()
+    assert len(table) == 120
+    for (control_type, key_nonkey, manual_automated, risk_level, rating), evaluation in table.items():
+        assert evaluation == evaluate_control(control_type, key_nonkey, manual_automated, risk_level, rating)
+        assert evaluation.control_quality_score == calculate_control_quality_score(
+            control_type, key_nonkey, manual_automated, rating)
+        assert evaluation.substantiation_method == suggest_substantiation_method(
+            control_type, key_nonkey, manual_automated, risk_level)
+        assert sum(points for _, points in evaluation.breakdown) == evaluation.control_quality_score
+
+def test_frame_has_one_row_per_combination():
+    frame = evaluation_frame()
+    assert len(frame) == 120
+    assert not frame.duplicated(list(EVALUATION_ATTRIBUTES)).any()
+
+@pytest.mark.parametrize("control", [
+    ('Corrective', 'Key', 'Manual', 'High', 3),
+    ('Preventative', 'Key', 'Manual', 'Critical', 3),
+    ('Preventative', 'Key', 'Manual', 'High', 6),
+    ('Preventative', 'Key', 'Manual', 'High', 2.5),
+])
+def test_lookup_rejects_invalid_controls(control):
+    with pytest.raises(ValueError):
+        lookup_evaluation(*control)
+
+def test_lookup_matches_fresh_evaluation(datasets):
+    df = datasets(1_000)
+    assert lookup_evaluations(df) == evaluate_controls(df)
+
+def test_evaluate_control(measure, uploaded_controls):
+    measure(evaluate_controls, uploaded_controls)
+
+def test_lookup_evaluation(measure, uploaded_controls):
+    measure(lookup_evaluations, uploaded_controls)
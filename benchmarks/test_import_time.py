@@ -0,0 +1,49 @@
+"""
+Import-time guard for the scoring core and the headless modules.
+
+application_pages.scoring and evaluation must stay free of third-party imports so the
+scoring API loads in milliseconds for the CLI, workers and tests, and only the pages
+may import Streamlit. The tests check which modules an import loads rather than timing
+it, which would depend on the machine. Print the import times with:
+
+    python benchmarks/test_import_time.py
+"""
+import pathlib
+import subprocess
+import sys
+
+import pytest
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+HEAVY_MODULES = ("numpy", "pandas", "plotly", "streamlit")
+REPEATS = 5
+
+# Modules that must load without any HEAVY_MODULES, and modules that must load without Streamlit
+LIGHT_MODULES = ("scoring", "evaluation")
+HEADLESS_MODULES = ("control_data", "parallel_scoring", "jobs", "simulation", "audit_plan", "assessment_store")
+
+def import_in_fresh_interpreter(module):
+    """Imports module in a new interpreter and returns (seconds, heavy modules loaded)."""
+    code = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "print(time.perf_counter() - start)\n"
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    seconds, heavy = result.stdout.splitlines()
+    return float(seconds), [m for m in heavy.split(",") if m]
+
+@pytest.mark.parametrize("module", LIGHT_MODULES)
+def test_light_modules_do_not_import_heavy_dependencies(module):
+    assert import_in_fresh_interpreter(f"application_pages.{module}")[1] == []
+
+@pytest.mark.parametrize("module", HEADLESS_MODULES)
+def test_headless_modules_do_not_import_streamlit(module):
+    assert "streamlit" not in import_in_fresh_interpreter(f"application_pages.{module}")[1]
+
+if __name__ == "__main__":
+    for module in ("application_pages.scoring", "application_pages.control_data", "application_pages.analyze_data"):
+        best = min(import_in_fresh_interpreter(module)[0] for _ in range(REPEATS))
+        print(f"{module}: {best * 1000:.1f} ms")
@@ -0,0 +1,139 @@
+"""
+The background job runner and the file analysis it runs.
+
+A background analysis must give the same dataset and aggregates as validating and
+scoring the file in the script run, jobs must be cancellable between chunks, and only
+a page holding the owner token of a job may find it.
+"""
+import sys
+import threading
+import time
+
+import numpy as np
+import pytest
+from streamlit.testing.v1 import AppTest
+
+from application_pages.control_data import summarize_controls, write_control_file
+from application_pages.jobs import (
+    JOB_CANCELLED,
+    JOB_DONE,
+    JOB_FAILED,
+    Job,
+    JobRunner,
+    analyze_control_file,
+    estimate_rows,
+)
+from application_pages.scoring import current_weights
+
+@pytest.fixture
+def runner():
+    runner = JobRunner()
+    yield runner
+    runner.shutdown()
+
+def wait(job, timeout=60):
+    deadline = time.monotonic() + timeout
+    while not job.finished:
+        assert time.monotonic() < deadline, f"{job.name} did not finish"
+        time.sleep(0.01)
+    return job
+
+@pytest.mark.parametrize("fmt", ["csv", "parquet"])
+def test_background_analysis_matches_whole_file(runner, datasets, fmt):
+    df = datasets(1_000)
+    data = write_control_file(df, fmt)
+    assert estimate_rows(data, fmt) == len(df)
+    job = wait(runner.submit("controls", f"test:{fmt}", analyze_control_file, data, fmt, 128))
+    assert job.status == JOB_DONE, job.error
+    assert job.result.is_valid and job.rows_scored == job.rows_parsed == len(df) and job.progress == 1.0
+    expected = summarize_controls(job.result.df)
+    assert np.array_equal(job.result.aggregates.counts, expected.counts)
+    assert np.array_equal(job.partial.counts, expected.counts)
+    assert job.result.df['Control ID'].tolist() == df['Control ID'].tolist()
+    assert job.result.weights_version == current_weights().version
+
+def test_invalid_file_is_reported(runner, datasets):
+    df = datasets(1_000).astype({'Risk Level': object})
+    df.loc[500, 'Risk Level'] = 'Critical'
+    job = wait(runner.submit("controls", "test:invalid", analyze_control_file, write_control_file(df), "csv", 128))
+    assert job.status == JOB_DONE and not job.result.is_valid and job.result.df is None
+    assert job.result.errors[0].startswith("Rows 385-512:")
+
+def test_jobs_can_be_cancelled(runner):
+    started = threading.Event()
+
+    def endless(job):
+        started.set()
+        while True:
+            job.check_cancelled()
+            job.rows_scored += 1
+            time.sleep(0.001)
+
+    job = runner.submit("endless", "test:endless", endless)
+    started.wait(5)
+    job.cancel()
+    assert wait(job).status == JOB_CANCELLED and job.rows_scored > 0
+
+def test_failed_jobs_keep_their_error(runner):
+    def broken(job):
+        raise ValueError("no such column")
+
+    job = wait(runner.submit("broken", "test:broken", broken))
+    assert job.status == JOB_FAILED and job.error == "no such column"
+    assert runner.submit("broken", "test:broken", broken) is not job
+
+def test_running_jobs_are_shared_by_key(runner):
+    release = threading.Event()
+    job = runner.submit("slow", "test:slow", lambda job: release.wait(5))
+    assert runner.submit("slow", "test:slow", lambda job: None) is job
+    assert runner.get(job.job_id) is job and runner.jobs() == [job]
+    release.set()
+    assert wait(job).status == JOB_DONE
+
+def test_jobs_are_scoped_to_their_owner(runner):
+    job = wait(runner.submit("quick", "test:quick", lambda job: "result", owner="session-a"))
+    assert runner.get(job.job_id, "session-b") is None
+    assert runner.submit("quick", "test:quick", lambda job: "other", owner="session-b") is not job
+    assert runner.discard(job.job_id, "session-b") is None
+    assert runner.discard(job.job_id, "session-a") is job and job.result == "result"
+    assert runner.get(job.job_id, "session-a") is None
+
+def background_job_page():
+    """Starts a job unless the URL names one, then shows the job the page finds."""
+    import streamlit as st
+
+    from application_pages.analyze_data import JOB_QUERY_PARAM, get_job_runner, job_owner
+
+    runner = get_job_runner()
+    if JOB_QUERY_PARAM not in st.query_params:
+        job = runner.submit("controls", "test:page", lambda job: "scored", owner=job_owner())
+        st.query_params[JOB_QUERY_PARAM] = job.job_id
+    job = runner.get(st.query_params[JOB_QUERY_PARAM], job_owner())
+    st.text(job.name if job is not None else "not found")
+
+def test_refreshed_page_finds_its_job(monkeypatch):
+    # AppTest runs the page as __main__; spawned worker processes must not re-run it
+    monkeypatch.setitem(sys.modules, "__main__", sys.modules["__main__"])
+    page = AppTest.from_function(background_job_page)
+    page.run()
+    assert page.text[0].value == "controls"
+
+    refreshed = AppTest.from_function(background_job_page)
+    refreshed.query_params.update(page.query_params)
+    refreshed.run()
+    assert refreshed.text[0].value == "controls"
+
+    other_session = AppTest.from_function(background_job_page)
+    other_session.query_params["job"] = page.query_params["job"]
+    other_session.run()
+    assert other_session.text[0].value == "not found"
+
+def test_unread_results_are_bounded(runner):
+    jobs = [wait(runner.submit("quick", f"test:{i}", lambda job: None)) for i in range(runner.keep + 3)]
+    runner.submit("quick", "test:last", lambda job: None)
+    assert len(runner.jobs()) <= runner.keep + 1
+    assert runner.get(jobs[0].job_id) is None
+
+def test_background_analysis(measure, controls):
+    data = write_control_file(controls)
+    measure(lambda: analyze_control_file(Job("benchmark", "controls", "benchmark"), data))
@@ -0,0 +1,119 @@
+"""
+Map-reduce scoring on a process pool against the serial pipeline, and its scaling.
+
+Parallel scoring must give the same frame, aggregates and verdict as the serial
+pipeline. The scaling benchmark runs with 1, 2, 4 and 8 workers, skipping counts above
+the number of CPUs available, and records each count's speed-up over one worker.
+"""
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from application_pages.control_data import ingest_control_chunks, summarize_controls, validate_controls
+from application_pages.parallel_scoring import (
+    ingest_control_chunks_parallel,
+    process_pool,
+    score_controls_parallel,
+)
+from application_pages.scoring import WEIGHTS_ENV_VAR, current_weights, score_controls, suggest_substantiation_methods
+
+WORKER_COUNTS = (1, 2, 4, 8)
+
+# Mean seconds of the one-worker run per dataset size, the baseline of the speed-ups
+SERIAL_SECONDS = {}
+
+def available_cpus():
+    return len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+
+def serial_pipeline(df):
+    report, df_processed = validate_controls(df)
+    df_processed = df_processed.assign(**{'Control Quality Score': score_controls(df_processed),
+                                          'Substantiation Method': suggest_substantiation_methods(df_processed)})
+    return report, df_processed, summarize_controls(df_processed)
+
+@pytest.fixture
+def workers(request):
+    if request.param > available_cpus():
+        pytest.skip(f"only {available_cpus()} CPUs available")
+    if request.param > 1:
+        process_pool(request.param).submit(int).result()  # start the workers outside the timing
+    return request.param
+
+def test_parallel_matches_serial(datasets):
+    df = datasets(1_000).astype({'Control Type': str, 'Risk Level': str})
+    report, df_processed, aggregates = score_controls_parallel(df, workers=2, partition_rows=150)
+    _, expected, expected_aggregates = serial_pipeline(df)
+    assert report.is_valid, report.messages
+    pd.testing.assert_frame_equal(df_processed, expected)
+    assert np.array_equal(aggregates.counts, expected_aggregates.counts)
+    np.testing.assert_allclose(aggregates.score_sums, expected_aggregates.score_sums)
+
+def test_repeated_ids_across_partitions_are_reported(datasets):
+    df = datasets(1_000).copy()
+    df.loc[900, 'Control ID'] = df.loc[10, 'Control ID']
+    report, df_processed, _ = score_controls_parallel(df, workers=2, partition_rows=150)
+    assert df_processed is None
+    assert [(issue.rule, issue.count, issue.rows) for issue in report.issues] == [("duplicate_id", 1, [900])]
+
+def test_invalid_partitions_name_their_rows(datasets):
+    df = datasets(1_000).astype({'Risk Level': object})
+    df.loc[[20, 420], 'Risk Level'] = 'Critical'
+    report, df_processed, _ = score_controls_parallel(df, workers=2, partition_rows=400)
+    assert df_processed is None
+    assert [message.split(":")[0] for message in report.messages] == ["Rows 1-400", "Rows 401-800"]
+
+def test_parallel_chunk_ingestion_matches_serial(datasets):
+    df = datasets(1_000)
+    chunks = [df.iloc[start:start + 128] for start in range(0, len(df), 128)]
+    written = []
+    is_valid, errors, aggregates = ingest_control_chunks_parallel(chunks, workers=2, on_chunk=written.append)
+    _, _, expected = ingest_control_chunks(chunks)
+    assert is_valid, errors
+    assert np.array_equal(aggregates.counts, expected.counts)
+    pd.testing.assert_frame_equal(pd.concat(written), serial_pipeline(df)[1])
+
+    # A repeated Control ID stops ingestion at its chunk, before the chunk reaches on_chunk
+    repeated = [*chunks[:3], df.iloc[[3]], *chunks[3:]]
+    written = []
+    is_valid, errors, aggregates = ingest_control_chunks_parallel(repeated, workers=2, on_chunk=written.append)
+    serial = ingest_control_chunks(repeated)
+    assert (is_valid, errors) == serial[:2] == (
+        False, ["Rows 385-385: Column 'Control ID' contains 1 values already used in earlier rows"])
+    assert len(written) == 3 and np.array_equal(aggregates.counts, serial[2].counts)
+
+def test_workers_score_with_the_parents_weights(datasets, tmp_path, monkeypatch):
+    df = datasets(1_000)
+    process_pool(2).submit(int).result()  # workers load the bundled weights
+    path = tmp_path / "weights.json"
+    path.write_text(json.dumps({
+        "Control Type": {"Preventative": 6, "Detective": 1},
+        "Key/Non-Key": {"Key": 4, "Non-Key": 0},
+        "Manual/Automated": {"Manual": 0, "Automated": 3},
+        "Implementation Quality Rating": {"points_per_step": 2},
+    }))
+    monkeypatch.setenv(WEIGHTS_ENV_VAR, str(path))
+    current_weights(check=True)
+    try:
+        _, df_processed, _ = score_controls_parallel(df, workers=2, partition_rows=150)
+        assert df_processed['Control Quality Score'].tolist() == score_controls(df).tolist()
+    finally:
+        monkeypatch.undo()
+        current_weights(check=True)
+
+@pytest.mark.parametrize("workers", WORKER_COUNTS, indirect=True)
+def test_parallel_score(measure, benchmark, rows, uploaded_controls, workers):
+    report, _, _ = measure(score_controls_parallel, uploaded_controls, workers)
+    assert report.is_valid
+    if benchmark.stats is None:  # None under --benchmark-disable
+        return
+    if workers == 1:
+        SERIAL_SECONDS[rows] = benchmark.stats.stats.mean
+    elif rows not in SERIAL_SECONDS:
+        start = time.perf_counter()
+        score_controls_parallel(uploaded_controls, 1)
+        SERIAL_SECONDS[rows] = time.perf_counter() - start
+    benchmark.extra_info["speedup_vs_1_worker"] = round(SERIAL_SECONDS[rows] / benchmark.stats.stats.mean, 2)
@@ -0,0 +1,48 @@
+"""
+Checks that concurrent runs of the Performance panel do not disturb each other, and that
+every instrumented run is logged.
+"""
+import json
+import logging
+import threading
+import tracemalloc
+
+from application_pages.performance import PerformanceRecorder, logger, track_cache_misses
+
+@track_cache_misses
+def cached_step():
+    return 1
+
+def test_tracing_stops_with_the_last_recorder():
+    first, second = PerformanceRecorder("first"), PerformanceRecorder("second")
+    first.finish()
+    assert tracemalloc.is_tracing()
+    second.finish()
+    assert not tracemalloc.is_tracing()
+
+def test_cache_misses_are_counted_per_session():
+    recorder = PerformanceRecorder("page")
+    other_session = threading.Thread(target=cached_step)
+    other_session.start()
+    other_session.join()
+    recorder.lap("step", cache="cached_step")
+    cached_step()
+    recorder.lap("step", cache="cached_step")
+    recorder.finish()
+    assert [timing.cache for timing in recorder.stages[:2]] == ["hit", "miss"]
+    assert recorder.cache_stats == {"cached_step": {"hits": 1, "misses": 1}}
+
+def test_runs_are_logged_once_recording_is_enabled(monkeypatch, capsys):
+    # As with logging left unconfigured: no handlers and the default WARNING level
+    monkeypatch.setattr(logger, "handlers", [])
+    monkeypatch.setattr(logger, "propagate", False)
+    level = logger.level
+    logger.setLevel(logging.WARNING)
+    try:
+        recorder = PerformanceRecorder("page")
+        recorder.lap("step", rows=10)
+        recorder.finish()
+    finally:
+        logger.setLevel(level)
+    record = json.loads(capsys.readouterr().err.strip().split(f" {logger.name} ", 1)[1])
+    assert record["event"] == "page_run" and record["stages"][0]["rows"] == 10
@@ -0,0 +1,89 @@
+"""
+Agreement and speed of the scalar and batch scoring APIs.
+
+The batch functions must agree with calculate_control_quality_score and
+suggest_substantiation_method on every input, including what they reject.
+"""
+import itertools
+
+import pandas as pd
+import pytest
+
+from application_pages.scoring import (
+    SUBSTANTIATION_ATTRIBUTES,
+    calculate_control_quality_score,
+    score_controls,
+    suggest_substantiation_method,
+    suggest_substantiation_methods,
+)
+
+RATINGS = (1, 2, 3, 4, 5)
+
+def all_attribute_combinations():
+    """Every combination of the four attributes and the implementation quality rating."""
+    rows = itertools.product(*SUBSTANTIATION_ATTRIBUTES.values(), RATINGS)
+    return pd.DataFrame(rows, columns=[*SUBSTANTIATION_ATTRIBUTES, 'Implementation Quality Rating'])
+
+def scalar_scores(df):
+    return [
+        calculate_control_quality_score(*row)
+        for row in zip(df['Control Type'], df['Key/Non-Key'], df['Manual/Automated'],
+                       df['Implementation Quality Rating'])
+    ]
+
+def scalar_methods(df):
+    return [
+        suggest_substantiation_method(*row)
+        for row in zip(df['Control Type'], df['Key/Non-Key'], df['Manual/Automated'], df['Risk Level'])
+    ]
+
+def test_batch_scores_match_scalar_on_every_combination():
+    df = all_attribute_combinations()
+    assert score_controls(df).tolist() == scalar_scores(df)
+
+def test_batch_methods_match_scalar_on_every_combination():
+    df = all_attribute_combinations()
+    assert suggest_substantiation_methods(df).astype(str).tolist() == scalar_methods(df)
+
+def test_batch_scores_match_scalar_on_synthetic_data(datasets):
+    df = datasets(1_000)
+    assert score_controls(df).tolist() == scalar_scores(df)
+    assert suggest_substantiation_methods(df).astype(str).tolist() == scalar_methods(df)
+
+@pytest.mark.parametrize("column, value", [
+    ('Control Type', 'Corrective'),
+    ('Key/Non-Key', 'key'),
+    ('Manual/Automated', 'Semi-automated'),
+    ('Implementation Quality Rating', 6),
+])
+def test_batch_scoring_rejects_what_scalar_rejects(column, value):
+    df = all_attribute_combinations().head(3)
+    df[column] = df[column].astype(object)
+    df.loc[1, column] = value
+    with pytest.raises(ValueError):
+        scalar_scores(df)
+    with pytest.raises(ValueError):
+        score_controls(df)
+
+def test_batch_methods_reject_invalid_risk_level():
+    df = all_attribute_combinations().head(3)
+    df.loc[1, 'Risk Level'] = 'Critical'
+    with pytest.raises(ValueError):
+        scalar_methods(df)
+    with pytest.raises(ValueError):
+        suggest_substantiation_methods(df)
+
+def test_scalar_score(measure, uploaded_controls):
+    measure(scalar_scores, uploaded_controls)
+
+def test_scalar_substantiation_method(measure, uploaded_controls):
+    measure(scalar_methods, uploaded_controls)
+
+def test_batch_score(measure, controls):
+    measure(score_controls, controls)
+
+def test_batch_score_uploaded(measure, uploaded_controls):
+    measure(score_controls, uploaded_controls)
+
+def test_batch_substantiation_method(measure, controls):
+    measure(suggest_substantiation_methods, controls)
@@ -0,0 +1,123 @@
+"""
+Checks of the configurable scoring weights and their hot reload.
+
+The bundled weights must reproduce the original point values, and under any weights
+the scalar, batch and breakdown paths must agree.
+"""
+import json
+import os
+from itertools import product
+
+import pandas as pd
+import pytest
+
+from application_pages.control_data import CONTROL_SCHEMA, to_compact_schema
+from application_pages.evaluation import (
+    BENCHMARK_SCORES,
+    EVALUATION_ATTRIBUTES,
+    SCORE_RATINGS,
+    benchmark_scores,
+    evaluation_table,
+    score_bands,
+)
+from application_pages.scoring import (
+    DEFAULT_WEIGHTS_PATH,
+    WEIGHTS_ENV_VAR,
+    calculate_control_quality_score,
+    compile_weights,
+    current_weights,
+    load_weights,
+    score_controls,
+)
+
+CUSTOM_WEIGHTS = {
+    "Control Type": {"Preventative": 6, "Detective": 1},
+    "Key/Non-Key": {"Key": 4, "Non-Key": 0},
+    "Manual/Automated": {"Manual": 0, "Automated": 3},
+    "Implementation Quality Rating": {"points_per_step": 1.5},
+}
+
+def write_weights(path, config):
+    """Writes a weights file and moves its modification time on, as an editor would."""
+    mtime = os.stat(path).st_mtime_ns if os.path.exists(path) else 0
+    path.write_text(json.dumps(config))
+    os.utime(path, ns=(mtime + 10 ** 9, mtime + 10 ** 9))
+
+@pytest.fixture
+def weights_file(tmp_path, monkeypatch):
+    """A weights file in effect for the test; the bundled weights are restored afterwards."""
+    path = tmp_path / "weights.json"
+    write_weights(path, CUSTOM_WEIGHTS)
+    monkeypatch.setenv(WEIGHTS_ENV_VAR, str(path))
+    current_weights(check=True)
+    yield path
+    monkeypatch.undo()
+    current_weights(check=True)
+
+def all_controls():
+    return pd.DataFrame(list(product(*EVALUATION_ATTRIBUTES.values())), columns=list(EVALUATION_ATTRIBUTES))
+
+def test_bundled_weights_match_original_points():
+    weights = load_weights(DEFAULT_WEIGHTS_PATH)
+    assert weights.score_range == (4, 14)
+    for control_type, key_nonkey, manual_automated, _, rating in product(*EVALUATION_ATTRIBUTES.values()):
+        original = ({"Preventative": 5, "Detective": 2}[control_type] + {"Key": 3, "Non-Key": 1}[key_nonkey]
+                    + {"Automated": 2, "Manual": 1}[manual_automated] + rating - 1)
+        assert calculate_control_quality_score(control_type, key_nonkey, manual_automated, rating) == original
+
+def test_reloaded_weights_apply_to_every_path(weights_file):
+    weights = current_weights()
+    assert weights.version == compile_weights(CUSTOM_WEIGHTS).version
+    controls = all_controls()
+    scalar = [calculate_control_quality_score(*row[:3], row[4]) for row in controls.itertuples(index=False)]
+    assert score_controls(controls).tolist() == scalar
+    for combination, evaluation in evaluation_table().items():
+        assert evaluation.control_quality_score == calculate_control_quality_score(*combination[:3], combination[4])
+        assert sum(points for _, points in evaluation.breakdown) == pytest.approx(evaluation.control_quality_score)
+
+    write_weights(weights_file, {**CUSTOM_WEIGHTS, "Implementation Quality Rating": {"points_per_step": 2}})
+    assert current_weights(check=True).version != weights.version
+    assert calculate_control_quality_score("Detective", "Non-Key", "Manual", 5) == 9
+
+def test_large_integer_weights_on_compact_frames(weights_file):
+    write_weights(weights_file, {**CUSTOM_WEIGHTS, "Implementation Quality Rating": {"points_per_step": 40}})
+    current_weights(check=True)
+    controls = all_controls().assign(**{'Implementation Frequency': 3, 'Design Quality Rating': 3})
+    controls = controls.astype({col: CONTROL_SCHEMA[col] for col in controls})
+    assert controls['Implementation Quality Rating'].dtype == 'int8'
+    scalar = [calculate_control_quality_score(*row[:3], row[4]) for row in controls.itertuples(index=False)]
+    assert max(scalar) == 173
+    scores = score_controls(controls)
+    assert scores.tolist() == scalar
+    compact = to_compact_schema(controls.assign(**{'Control Quality Score': scores}))
+    assert compact['Control Quality Score'].tolist() == scalar
+
+def test_rating_bands_follow_the_score_range(weights_file):
+    assert score_bands(load_weights(DEFAULT_WEIGHTS_PATH)) == SCORE_RATINGS
+    assert benchmark_scores(load_weights(DEFAULT_WEIGHTS_PATH)) == BENCHMARK_SCORES
+
+    low, high = current_weights().score_range
+    assert (low, high) == (1, 19)
+    evaluations = sorted(evaluation_table().values(), key=lambda evaluation: evaluation.control_quality_score)
+    assert (evaluations[0].rating, evaluations[0].benchmark) == ("Poor", "Below minimum standards")
+    assert (evaluations[-1].rating, evaluations[-1].benchmark) == ("Excellent", "Exceeds best practice")
+    assert score_bands()[1][0] == pytest.approx(low + 0.4 * (high - low))
+
+def test_invalid_edit_keeps_previous_weights(weights_file):
+    version = current_weights().version
+    weights_file.write_text('{"Control Type": ')
+    os.utime(weights_file, ns=(0, 0))
+    with pytest.warns(UserWarning):
+        assert current_weights(check=True).version == version
+
+@pytest.mark.parametrize("config", [
+    {**CUSTOM_WEIGHTS, "Risk Level": {"High": 1}},
+    {**CUSTOM_WEIGHTS, "Control Type": {"Preventative": 6}},
+    {**CUSTOM_WEIGHTS, "Key/Non-Key": {"Key": "4", "Non-Key": 0}},
+    {**CUSTOM_WEIGHTS, "Implementation Quality Rating": {"points": 1}},
+    {**CUSTOM_WEIGHTS, "Implementation Quality Rating": {"points_per_step": float("nan")}},
+    {**CUSTOM_WEIGHTS, "Control Type": {"Preventative": 10 ** 7, "Detective": 0}},
+])
+def test_invalid_weights_are_rejected(config):
+    with pytest.raises(ValueError):
+        compile_weights(config)
@@ -0,0 +1,104 @@
+"""
+The Monte Carlo what-if simulation against directly scored portfolios, and its throughput.
+
+Simulated portfolios must behave like scoring generate_synthetic_control_data output,
+and the metrics of a distribution must agree with scoring its portfolio directly.
+"""
+import dataclasses
+
+import numpy as np
+import pytest
+
+from application_pages.control_data import generate_synthetic_control_data
+from application_pages.evaluation import score_bands
+from application_pages.scoring import EFFORT_HOURS, SUBSTANTIATION_EFFORT, score_controls, suggest_substantiation_methods
+from application_pages.simulation import (
+    CELL_COUNT,
+    INTERVENTIONS,
+    Shift,
+    apply_shifts,
+    attribute_distribution,
+    cell_table,
+    expected_metrics,
+    portfolio_distribution,
+    simulate_portfolios,
+)
+
+DISTRIBUTIONS = {
+    "Control Type": {"Preventative": 0.3, "Detective": 0.7},
+    "Manual/Automated": {"Manual": 0.8, "Automated": 0.2},
+    "Risk Level": {"High": 0.5, "Medium": 0.3, "Low": 0.2},
+}
+
+def portfolio_metrics(df):
+    """The simulation metrics computed directly from a portfolio's rows."""
+    score = score_controls(df).astype(float)
+    high = (df['Risk Level'] == 'High').to_numpy()
+    hours = suggest_substantiation_methods(df).map(SUBSTANTIATION_EFFORT).map(EFFORT_HOURS).astype(float)
+    return {
+        "Average Quality Score": score.mean(),
+        "High-Risk Coverage": 100 * (score[high] >= score_bands()[1][0]).mean(),
+        "Automation Rate": 100 * (df['Manual/Automated'] == 'Automated').mean(),
+        "Testing Hours": hours.sum(),
+    }
+
+def test_cell_table_covers_every_combination():
+    cells = cell_table()
+    assert len(cells) == CELL_COUNT
+    assert cells['Control Quality Score'].tolist() == score_controls(cells).tolist()
+
+def test_expected_metrics_match_scored_portfolio(datasets):
+    df = datasets(1_000)
+    expected = expected_metrics(portfolio_distribution(df))
+    for metric, value in portfolio_metrics(df).items():
+        scale = len(df) if metric == "Testing Hours" else 1
+        assert expected[metric] * scale == pytest.approx(value)
+
+def test_simulation_matches_synthetic_portfolios():
+    num_controls, draws = 200, 400
+    result = simulate_portfolios(attribute_distribution(DISTRIBUTIONS), num_controls, draws, seed=1)
+    synthetic = [portfolio_metrics(generate_synthetic_control_data(num_controls, seed=seed, distributions=DISTRIBUTIONS))
+                 for seed in range(draws)]
+    for metric, simulated in result.metrics.items():
+        reference = np.array([metrics[metric] for metrics in synthetic])
+        assert simulated[0].mean() == pytest.approx(reference.mean(), rel=0.02)
+        assert simulated[0].std() == pytest.approx(reference.std(), rel=0.2)
+
+def test_shift_moves_the_requested_share():
+    baseline = attribute_distribution(DISTRIBUTIONS)
+    fractions = np.array([0, 0.3, 1])
+    shifted = apply_shifts(baseline, [dataclasses.replace(INTERVENTIONS["Automate manual controls"],
+                                                          fraction=fractions)])
+    assert shifted.shape == (3, CELL_COUNT)
+    np.testing.assert_allclose(shifted.sum(axis=1), 1)
+    np.testing.assert_allclose(expected_metrics(shifted)["Automation Rate"], 20 + 80 * fractions)
+
+def test_rating_shift_moves_each_control_once():
+    shifted = apply_shifts(attribute_distribution(), [INTERVENTIONS["Raise implementation quality by one step"]])
+    baseline = expected_metrics(attribute_distribution())["Average Quality Score"]
+    assert expected_metrics(shifted)["Average Quality Score"] == pytest.approx(baseline + 0.8)
+
+def test_restricted_shift_leaves_other_controls():
+    shift = Shift('Manual/Automated', {'Manual': 'Automated'}, 1.0, where={'Risk Level': ['High']})
+    cells = cell_table()
+    shifted = apply_shifts(attribute_distribution(), [shift])
+    unchanged = (cells['Risk Level'] != 'High').to_numpy()
+    np.testing.assert_allclose(shifted[unchanged], attribute_distribution()[unchanged])
+
+@pytest.mark.parametrize("shift", [
+    Shift('Risk Level', {'High': 'Critical'}, 0.5),
+    Shift('Frequency', {1: 2}, 0.5),
+    Shift('Manual/Automated', {'Manual': 'Automated'}, 1.5),
+])
+def test_invalid_shifts_are_rejected(shift):
+    with pytest.raises(ValueError):
+        apply_shifts(attribute_distribution(), [shift])
+
+def test_simulate_scenarios(benchmark):
+    scenarios = apply_shifts(attribute_distribution(DISTRIBUTIONS), [
+        dataclasses.replace(INTERVENTIONS["Automate manual controls"], fraction=np.linspace(0, 1, 1_000))
+    ])
+    result = benchmark.pedantic(simulate_portfolios, args=(scenarios, 1_000, 100), rounds=3, iterations=1)
+    assert result.metrics["Average Quality Score"].shape == (1_000, 100)
+    if benchmark.stats is not None:  # None under --benchmark-disable
+        benchmark.extra_info["scenarios_per_second"] = round(1_000 / benchmark.stats.stats.mean)